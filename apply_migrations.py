@@ -24,6 +24,10 @@ def apply_sql():
     pg_url = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
     sqlite_path = 'data/hospital.db'
     sql_filename = 'database/04_create_views.sql'
+    # Migraciones sólo para PostgreSQL (extensiones, funciones e índices)
+    pg_only_filenames = ['database/06_rag_indexes.sql', 'database/07_admin_listing_indexes.sql',
+                         'database/08_historial_partitions.sql', 'database/09_historial_performance.sql',
+                         'database/10_historial_rollups.sql']
     
     if not os.path.exists(sql_filename):
         log(f"SQL file {sql_filename} not found.")
@@ -52,14 +56,29 @@ def apply_sql():
 
     # Apply to PostgreSQL (if reachable)
     log(f"Attempting to apply to PostgreSQL: {DB_HOST}")
+    engine = create_engine(pg_url, connect_args={'connect_timeout': 2})
     try:
-        engine = create_engine(pg_url, connect_args={'connect_timeout': 2})
-        with engine.connect() as conn:
+        conn = engine.connect()
+    except sqlalchemy.exc.OperationalError as e:
+        log(f"PostgreSQL connection failed (expected if not running): {e}")
+        return
+
+    # Un error en los scripts no es "esperado": se registra y se propaga
+    with conn:
+        try:
             conn.execute(text(sql_content))
             conn.commit()
-        log("Successfully applied to PostgreSQL.")
-    except Exception as e:
-        log(f"PostgreSQL connection failed (expected if not running): {e}")
+            for pg_filename in pg_only_filenames:
+                with open(pg_filename, 'r') as f:
+                    # Sin parámetros: los %s/%I/%L de format() en PL/pgSQL llegan
+                    # tal cual al servidor en vez de tomarse como placeholders
+                    conn.execution_options(no_parameters=True).exec_driver_sql(f.read())
+                conn.commit()
+                log(f"Applied {pg_filename}")
+        except Exception as e:
+            log(f"Error applying migrations to PostgreSQL: {e}")
+            raise
+    log("Successfully applied to PostgreSQL.")
 
 if __name__ == "__main__":
     if os.path.exists(LOG_FILE):
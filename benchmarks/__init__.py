@@ -0,0 +1,13 @@
+"""
+Benchmarks offline del asistente Nexa.
+
+- stub_ollama: servidor HTTP que imita a Ollama (/api/tags, /api/generate,
+  /api/chat) con latencia configurable y respuestas predefinidas.
+- seed: base de datos sembrada desde database/init_nexa_full.sql y
+  "ANEXOS HCM.csv" (PostgreSQL o SQLite).
+- run_benchmark: ejecuta RAGAgent.get_answer con varios niveles de
+  concurrencia y guarda p50/p95/p99 por etapa y throughput en JSON.
+
+Uso:
+    python -m benchmarks.run_benchmark --concurrency 1 4 8 --requests 40
+"""
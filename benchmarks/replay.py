@@ -0,0 +1,247 @@
+"""
+Replay de tráfico real desde `historial_consultas`.
+
+Lee las preguntas en orden de `fecha` con un cursor del lado del servidor
+(stream_results + yield_per: en PostgreSQL no se carga la tabla en memoria)
+y las vuelve a enviar a RAGAgent respetando los intervalos originales entre
+llegadas, o comprimidos N veces con --speedup.
+
+Reporta:
+- latencia (total y por etapa) y retraso de cola (inicio real - programado),
+  para planificar capacidad con la forma real de la carga;
+- drift: similitud entre la respuesta nueva y la `respuesta` guardada
+  (difflib), para detectar regresiones.
+
+    python -m benchmarks.replay --since 2025-01-01 --speedup 10 --concurrency 4
+    python -m benchmarks.replay --stub --speedup 0      # sin esperas, sin modelo
+"""
+import argparse
+import difflib
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import create_engine, text
+
+from .run_benchmark import RESULTS_DIR, summarize
+from .seed import register_sqlite_unaccent
+from .stub_ollama import StubOllamaServer, point_ollama_at
+
+
+def stream_history(
+    engine,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: Optional[int] = None,
+    batch_size: int = 500,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Filas de historial_consultas en orden cronológico, leídas por lotes.
+    """
+    sql = "SELECT id, fecha, pregunta, respuesta FROM historial_consultas WHERE 1 = 1"
+    params: Dict[str, Any] = {}
+    if since:
+        sql += " AND fecha >= :since"
+        params["since"] = since
+    if until:
+        sql += " AND fecha < :until"
+        params["until"] = until
+    sql += " ORDER BY fecha, id"
+    if limit:
+        sql += " LIMIT :lim"
+        params["lim"] = limit
+
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(
+            text(sql), params
+        )
+        for row in result:
+            yield dict(row._mapping)
+
+
+def _as_datetime(value: Any) -> datetime:
+    # SQLite devuelve texto; PostgreSQL, datetime con zona horaria
+    return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+
+
+def _normalize(answer: str) -> str:
+    return re.sub(r"\s+", " ", (answer or "")).strip().casefold()
+
+
+def answer_similarity(new: str, stored: str) -> float:
+    """Similitud 0..1 entre dos respuestas (ignora mayúsculas y espacios)."""
+    return difflib.SequenceMatcher(None, _normalize(new), _normalize(stored)).ratio()
+
+
+def replay(
+    rows: Iterator[Dict[str, Any]],
+    agent_factory,
+    speedup: float = 1.0,
+    concurrency: int = 1,
+    max_gap_s: Optional[float] = None,
+    drift_threshold: float = 0.6,
+    worst: int = 10,
+) -> Dict[str, Any]:
+    """
+    Reenviar `rows` al agente y devolver el reporte.
+
+    Args:
+        agent_factory: crea un RAGAgent por hilo trabajador.
+        speedup: 1 = ritmo original, N = N veces más rápido, 0 = sin esperas.
+        max_gap_s: tope (ya escalado) para pausas largas, p. ej. de noche.
+        drift_threshold: similitud bajo la cual una respuesta cuenta como drift.
+    """
+    local = threading.local()
+    lock = threading.Lock()
+    samples: List[Dict[str, Any]] = []
+
+    def handle(row: Dict[str, Any], scheduled: float) -> None:
+        agent = getattr(local, "agent", None)
+        if agent is None:
+            agent = local.agent = agent_factory()
+        queue_delay_ms = (time.perf_counter() - scheduled) * 1000
+        result = agent.get_answer(row["pregunta"])
+        sample = {
+            "id": str(row["id"]),
+            "pregunta": row["pregunta"],
+            "respuesta": row["respuesta"],
+            "answer": result["answer"],
+            "outcome": result["outcome"],
+            "error": result["error"],
+            "timings": result["timings"],
+            "queue_delay_ms": queue_delay_ms,
+            "similarity": answer_similarity(result["answer"], row["respuesta"]),
+        }
+        with lock:
+            samples.append(sample)
+
+    start = time.perf_counter()
+    offset = 0.0
+    previous: Optional[datetime] = None
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="replay") as pool:
+        for row in rows:
+            fecha = _as_datetime(row["fecha"])
+            if previous is not None and speedup > 0:
+                gap = max(0.0, (fecha - previous).total_seconds()) / speedup
+                offset += min(gap, max_gap_s) if max_gap_s is not None else gap
+            previous = fecha
+            scheduled = start + offset
+            wait = scheduled - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            pool.submit(handle, row, scheduled)
+    wall_s = time.perf_counter() - start
+
+    stage_samples: Dict[str, List[float]] = {}
+    for sample in samples:
+        for stage, ms in sample["timings"].items():
+            stage_samples.setdefault(stage, []).append(ms)
+    similarities = [s["similarity"] for s in samples]
+    drifted = sorted(
+        (s for s in samples if s["similarity"] < drift_threshold),
+        key=lambda s: s["similarity"],
+    )
+    outcomes: Dict[str, int] = {}
+    for sample in samples:
+        outcomes[sample["outcome"]] = outcomes.get(sample["outcome"], 0) + 1
+
+    return {
+        "requests": len(samples),
+        "wall_s": round(wall_s, 3),
+        "throughput_rps": round(len(samples) / wall_s, 3) if wall_s else None,
+        "outcomes": outcomes,
+        "errors": sorted({s["error"] for s in samples if s["error"]}),
+        "queue_delay_ms": summarize([s["queue_delay_ms"] for s in samples]),
+        "stages_ms": {stage: summarize(v) for stage, v in sorted(stage_samples.items())},
+        "drift": {
+            "threshold": drift_threshold,
+            "similarity": summarize(similarities),
+            "exact": sum(1 for v in similarities if v == 1.0),
+            "drifted": len(drifted),
+            "worst": [
+                {k: s[k] for k in ("id", "pregunta", "respuesta", "answer")}
+                | {"similarity": round(s["similarity"], 3)}
+                for s in drifted[:worst]
+            ],
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay de historial_consultas contra RAGAgent.")
+    parser.add_argument("--source-url", default=None,
+                        help="Base con historial_consultas (por defecto DATABASE_URL).")
+    parser.add_argument("--db-url", default=None,
+                        help="Base que consulta el agente (por defecto la de origen).")
+    parser.add_argument("--since", type=datetime.fromisoformat, default=None)
+    parser.add_argument("--until", type=datetime.fromisoformat, default=None)
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--speedup", type=float, default=1.0,
+                        help="1 = ritmo original, N = N veces más rápido, 0 = sin esperas.")
+    parser.add_argument("--max-gap-s", type=float, default=None)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--mode", choices=("sql", "tools"), default="sql")
+    parser.add_argument("--drift-threshold", type=float, default=0.6)
+    parser.add_argument("--stub", action="store_true",
+                        help="Usar el stub de Ollama en vez del modelo real.")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--ms-per-token", type=float, default=0.0)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    stub = None
+    if args.stub:
+        stub = StubOllamaServer(latency_ms=args.latency_ms, ms_per_token=args.ms_per_token).start()
+        point_ollama_at(stub.url)
+
+    # Importar tarde: el cliente `ollama` debe apuntar ya al stub
+    from src.application.rag_agent import RAGAgent
+    from src.infrastructure.database import DATABASE_URL, get_engine
+
+    source_url = args.source_url or DATABASE_URL
+    db_url = args.db_url or source_url
+    register_sqlite_unaccent(get_engine(db_url))
+    source = create_engine(source_url)
+    try:
+        rows = stream_history(source, args.since, args.until, args.limit)
+        report = replay(
+            rows,
+            lambda: RAGAgent(database_uri=db_url, mode=args.mode),
+            speedup=args.speedup,
+            concurrency=args.concurrency,
+            max_gap_s=args.max_gap_s,
+            drift_threshold=args.drift_threshold,
+        )
+    finally:
+        source.dispose()
+        if stub:
+            stub.stop()
+
+    report["meta"] = {
+        "started_at": datetime.now().isoformat(),
+        "speedup": args.speedup,
+        "concurrency": args.concurrency,
+        "mode": args.mode,
+        "stub": bool(stub),
+    }
+    total = report["stages_ms"].get("total", {})
+    print(f"🔁 {report['requests']} preguntas en {report['wall_s']} s "
+          f"-> {report['throughput_rps']} preg/s  {report['outcomes']}")
+    print(f"   total p50/p95/p99: {total.get('p50')} / {total.get('p95')} / {total.get('p99')} ms; "
+          f"cola p95: {report['queue_delay_ms']['p95']} ms")
+    print(f"   drift: {report['drift']['drifted']} respuestas con similitud < "
+          f"{args.drift_threshold} ({report['drift']['exact']} idénticas)")
+
+    output = args.output or RESULTS_DIR / f"replay-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False, default=str), encoding="utf-8")
+    print(f"💾 Resultados guardados en {output}")
+
+
+if __name__ == "__main__":
+    main()
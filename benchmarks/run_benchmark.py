@@ -0,0 +1,238 @@
+"""
+Benchmark end-to-end de RAGAgent.get_answer sin modelo real.
+
+Levanta el stub de Ollama, siembra la base (SQLite temporal por defecto) y
+ejecuta la carga de benchmarks/workload.py con cada nivel de concurrencia.
+Cada hilo trabajador tiene su propio RAGAgent, como cada sesión de Streamlit.
+
+Reporta throughput y p50/p95/p99 por etapa (a partir de result["timings"])
+y guarda todo en JSON para comparar corridas:
+
+    python -m benchmarks.run_benchmark --concurrency 1 4 8 --requests 40 \\
+        --latency-ms 120 --ms-per-token 8
+    python -m benchmarks.run_benchmark --compare benchmarks/results/anterior.json
+"""
+import argparse
+import itertools
+import json
+import platform
+import subprocess
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from .seed import default_sqlite_url, register_sqlite_unaccent, seed_database
+from .stub_ollama import StubOllamaServer, point_ollama_at
+from .workload import WORKLOAD
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values: Sequence[float], pct: float) -> Optional[float]:
+    """Percentil con interpolación lineal (mismo criterio que numpy)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(samples: Sequence[float]) -> Dict[str, Any]:
+    summary: Dict[str, Any] = {
+        "count": len(samples),
+        "mean": round(sum(samples) / len(samples), 3) if samples else None,
+        "max": round(max(samples), 3) if samples else None,
+    }
+    for pct in PERCENTILES:
+        value = percentile(samples, pct)
+        summary[f"p{pct}"] = round(value, 3) if value is not None else None
+    return summary
+
+
+def run_level(agents: List[Any], questions: Sequence[str]) -> Dict[str, Any]:
+    """Responder `questions` repartidas entre un hilo por agente."""
+    pending = iter(questions)
+    lock = threading.Lock()
+    results: List[Dict[str, Any]] = []
+
+    def worker(agent):
+        while True:
+            with lock:
+                question = next(pending, None)
+            if question is None:
+                return
+            result = agent.get_answer(question)
+            with lock:
+                results.append(result)
+
+    threads = [threading.Thread(target=worker, args=(agent,)) for agent in agents]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall_s = time.perf_counter() - start
+
+    stage_samples: Dict[str, List[float]] = {}
+    for result in results:
+        for stage, ms in result["timings"].items():
+            stage_samples.setdefault(stage, []).append(ms)
+
+    # Aciertos del prefijo fijo en la caché KV, por llamada al modelo
+    prefix_cache: Dict[str, Dict[str, Any]] = {}
+    for result in results:
+        for call, stats in result["llm_stats"].items():
+            if "prefix_hit" not in stats:
+                continue
+            entry = prefix_cache.setdefault(call, {"calls": 0, "hits": 0, "tokens_saved": 0,
+                                                   "ms_saved": 0.0, "prompt_eval": []})
+            entry["calls"] += 1
+            entry["hits"] += int(stats["prefix_hit"])
+            entry["tokens_saved"] += stats["prefix_tokens_saved"]
+            entry["ms_saved"] += stats["prefix_ms_saved"]
+            entry["prompt_eval"].append(stats["prompt_eval_count"])
+    for entry in prefix_cache.values():
+        entry["hit_rate"] = round(entry["hits"] / entry["calls"], 3)
+        entry["ms_saved"] = round(entry["ms_saved"], 2)
+        entry["prompt_eval"] = summarize(entry.pop("prompt_eval"))
+
+    return {
+        "concurrency": len(agents),
+        "requests": len(results),
+        "wall_s": round(wall_s, 3),
+        "throughput_rps": round(len(results) / wall_s, 3) if wall_s else None,
+        "outcomes": dict(Counter(r["outcome"] for r in results)),
+        "errors": sorted({r["error"] for r in results if r["error"]}),
+        "stages_ms": {stage: summarize(samples) for stage, samples in sorted(stage_samples.items())},
+        "prefix_cache": prefix_cache,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(
+    db_url: str,
+    concurrency: Sequence[int] = (1, 4),
+    requests: int = 28,
+    mode: str = "sql",
+    warmup: int = 1,
+    stub: Optional[StubOllamaServer] = None,
+) -> Dict[str, Any]:
+    """
+    Ejecutar todos los niveles contra un stub ya iniciado y devolver el reporte.
+    """
+    # Importar tarde: el cliente `ollama` debe apuntar ya al stub
+    from src.application.rag_agent import RAGAgent
+    from src.infrastructure.database import get_engine
+
+    register_sqlite_unaccent(get_engine(db_url))
+    questions = [item["question"] for item in WORKLOAD]
+    report: Dict[str, Any] = {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "database": db_url.split(":", 1)[0],
+            "mode": mode,
+            "requests_per_level": requests,
+            "stub": {
+                "latency_ms": stub.latency_ms,
+                "ms_per_token": stub.ms_per_token,
+                "jitter_ms": stub.jitter_ms,
+                "ms_per_prompt_token": stub.ms_per_prompt_token,
+                "num_slots": stub.num_slots,
+            } if stub else None,
+        },
+        "levels": [],
+    }
+    for level in concurrency:
+        agents = [RAGAgent(database_uri=db_url, mode=mode) for _ in range(level)]
+        for agent in agents:  # conexión, reflexión del esquema, etc.
+            for question in questions[:warmup]:
+                agent.get_answer(question)
+        workload = list(itertools.islice(itertools.cycle(questions), requests))
+        report["levels"].append(run_level(agents, workload))
+    if stub:
+        report["meta"]["stub"]["requests"] = dict(stub.requests)
+    return report
+
+
+def print_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> None:
+    base_levels = {lvl["concurrency"]: lvl for lvl in (baseline or {}).get("levels", [])}
+    for level in report["levels"]:
+        print(f"\n📊 Concurrencia {level['concurrency']}: {level['requests']} preguntas en "
+              f"{level['wall_s']} s -> {level['throughput_rps']} preg/s  {level['outcomes']}")
+        print(f"   {'etapa':<10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}  (ms)")
+        base_stages = base_levels.get(level["concurrency"], {}).get("stages_ms", {})
+        for stage, s in level["stages_ms"].items():
+            line = f"   {stage:<10}{s['p50']:>10.1f}{s['p95']:>10.1f}{s['p99']:>10.1f}{s['max']:>10.1f}"
+            base = base_stages.get(stage)
+            if base and base.get("p50"):
+                line += f"   Δp50 {100 * (s['p50'] - base['p50']) / base['p50']:+.1f}%"
+            print(line)
+        for call, cache in level["prefix_cache"].items():
+            print(f"   🧠 prefijo {call}: {cache['hits']}/{cache['calls']} en caché, "
+                  f"{cache['tokens_saved']} tokens (~{cache['ms_saved']} ms) sin re-evaluar")
+        for error in level["errors"]:
+            print(f"   ⚠️ {error}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark offline de RAGAgent.get_answer.")
+    parser.add_argument("--db-url", default=None,
+                        help="URL SQLAlchemy. Por defecto, SQLite temporal sembrada.")
+    parser.add_argument("--no-seed", action="store_true",
+                        help="No sembrar: usar la base de --db-url tal cual.")
+    parser.add_argument("--mode", choices=("sql", "tools"), default="sql")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--requests", type=int, default=40, help="Preguntas por nivel.")
+    parser.add_argument("--warmup", type=int, default=1, help="Preguntas de calentamiento por agente.")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--ms-per-token", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--ms-per-prompt-token", type=float, default=0.0)
+    parser.add_argument("--num-slots", type=int, default=2,
+                        help="Slots de caché de prefijos del stub (OLLAMA_NUM_PARALLEL); 0 = sin caché.")
+    parser.add_argument("--seed", type=int, default=0, help="Semilla del jitter.")
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument("--compare", type=Path, default=None,
+                        help="Reporte JSON anterior para mostrar diferencias de p50.")
+    args = parser.parse_args()
+
+    db_url = args.db_url or default_sqlite_url()
+    if not args.no_seed:
+        print(f"🌱 Sembrando {db_url} ...")
+        seed_database(db_url)
+
+    with StubOllamaServer(latency_ms=args.latency_ms, ms_per_token=args.ms_per_token,
+                          jitter_ms=args.jitter_ms, ms_per_prompt_token=args.ms_per_prompt_token,
+                          num_slots=args.num_slots, seed=args.seed) as stub:
+        point_ollama_at(stub.url)
+        report = run_benchmark(db_url, args.concurrency, args.requests,
+                               mode=args.mode, warmup=args.warmup, stub=stub)
+
+    baseline = json.loads(args.compare.read_text(encoding="utf-8")) if args.compare else None
+    print_report(report, baseline)
+
+    output = args.output or RESULTS_DIR / f"bench-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"\n💾 Resultados guardados en {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Base de datos sembrada para benchmarks.
+
+Ejecuta los mismos scripts que la instalación real (database/init_nexa_full.sql,
+la vista de 04_create_views.sql y 05_audit_log.sql; en PostgreSQL también
+06_rag_indexes.sql) y carga el directorio completo desde "ANEXOS HCM.csv",
+igual que cargar_anexos.py.
+
+- PostgreSQL: la URL debe apuntar a una base VACÍA (los índices del script
+  maestro no usan IF NOT EXISTS).
+- SQLite: el DDL se traduce con unas pocas sustituciones y se registra una
+  función `f_unaccent` para que las búsquedas sin acentos funcionen igual.
+"""
+import argparse
+import os
+import re
+import sqlite3
+import tempfile
+import unicodedata
+from pathlib import Path
+from typing import List
+
+import pandas as pd
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+
+ROOT = Path(__file__).resolve().parent.parent
+INIT_SCRIPT = ROOT / "database" / "init_nexa_full.sql"
+VIEWS_SCRIPT = ROOT / "database" / "04_create_views.sql"
+AUDIT_LOG_SCRIPT = ROOT / "database" / "05_audit_log.sql"
+RAG_INDEXES_SCRIPT = ROOT / "database" / "06_rag_indexes.sql"
+ANEXOS_CSV = ROOT / "ANEXOS HCM.csv"
+
+# Sustituciones PostgreSQL -> SQLite para el DDL del script maestro
+_SQLITE_REWRITES = [
+    (re.compile(r"\bSERIAL PRIMARY KEY\b", re.I), "INTEGER PRIMARY KEY AUTOINCREMENT"),
+    (re.compile(r"\bUUID PRIMARY KEY DEFAULT uuid_generate_v4\(\)", re.I),
+     "TEXT PRIMARY KEY DEFAULT (lower(hex(randomblob(16))))"),
+    (re.compile(r"\bTIMESTAMP WITH TIME ZONE\b", re.I), "TIMESTAMP"),
+    (re.compile(r"\bCREATE OR REPLACE VIEW\b", re.I), "CREATE VIEW IF NOT EXISTS"),
+]
+
+
+def strip_accents(value):
+    if value is None:
+        return None
+    return "".join(
+        c for c in unicodedata.normalize("NFKD", value) if not unicodedata.combining(c)
+    )
+
+
+def _register_sqlite_unaccent(dbapi_connection, _):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function("f_unaccent", 1, strip_accents, deterministic=True)
+
+
+def register_sqlite_unaccent(engine: Engine) -> Engine:
+    """
+    Registrar `f_unaccent` en las conexiones nuevas de `engine` (sólo SQLite).
+    Para el RAGAgent, pasar get_engine(url): es el engine que comparte. Debe
+    hacerse antes de que el engine abra su primera conexión.
+    """
+    if engine.dialect.name == "sqlite" and not event.contains(engine, "connect", _register_sqlite_unaccent):
+        event.listen(engine, "connect", _register_sqlite_unaccent)
+    return engine
+
+
+def split_statements(script: str) -> List[str]:
+    """Separar un script en sentencias (sin comentarios `--`)."""
+    script = re.sub(r"--[^\n]*", "", script)
+    return [stmt.strip() for stmt in script.split(";") if stmt.strip()]
+
+
+def to_sqlite(statement: str) -> str:
+    """Adaptar una sentencia del script maestro a SQLite ("" = omitir)."""
+    if re.match(r"CREATE\s+EXTENSION", statement, re.I):
+        return ""
+    for pattern, replacement in _SQLITE_REWRITES:
+        statement = pattern.sub(replacement, statement)
+    return statement
+
+
+def load_anexos(conn, csv_path: Path = ANEXOS_CSV) -> int:
+    """Reemplazar el directorio telefónico por el contenido del CSV."""
+    df = pd.read_csv(csv_path, encoding="utf-8-sig")
+    df = df.dropna(subset=["DISPLAY"])
+    df["DISPLAY"] = df["DISPLAY"].astype(str).str.strip()
+    df_final = df[["ANEXO", "DISPLAY"]].copy()
+    df_final.columns = ["numero_anexo", "nombre_referencia"]
+
+    conn.execute(text("DELETE FROM directorio_telefonico"))
+    df_final.to_sql("directorio_telefonico", con=conn, if_exists="append", index=False)
+    return len(df_final)
+
+
+def default_sqlite_url() -> str:
+    return "sqlite:///" + os.path.join(tempfile.gettempdir(), "nexa_bench.sqlite")
+
+
+def seed_database(url: str) -> int:
+    """
+    Crear el esquema, los datos semilla y el directorio completo en `url`.
+    Una base SQLite existente se recrea desde cero.
+
+    Returns:
+        Número de anexos cargados desde el CSV.
+    """
+    is_sqlite = url.startswith("sqlite")
+    if is_sqlite:
+        path = url.split("///", 1)[-1]
+        if path and path != ":memory:" and os.path.exists(path):
+            os.remove(path)
+
+    scripts = [INIT_SCRIPT, VIEWS_SCRIPT, AUDIT_LOG_SCRIPT] + ([] if is_sqlite else [RAG_INDEXES_SCRIPT])
+    engine = register_sqlite_unaccent(create_engine(url))
+    try:
+        with engine.begin() as conn:
+            for script in scripts:
+                for statement in split_statements(script.read_text(encoding="utf-8")):
+                    if is_sqlite:
+                        statement = to_sqlite(statement)
+                        if not statement:
+                            continue
+                    conn.exec_driver_sql(statement)
+            return load_anexos(conn)
+    finally:
+        engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Sembrar la base de benchmarks.")
+    parser.add_argument("--db-url", default=default_sqlite_url(),
+                        help="URL SQLAlchemy (PostgreSQL vacía o SQLite).")
+    args = parser.parse_args()
+    count = seed_database(args.db_url)
+    print(f"✅ Base sembrada en {args.db_url} ({count} anexos)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""
+Generador de carga multi-sesión para la app Streamlit (src/ui/main.py).
+
+Cada sesión es un `streamlit.testing.v1.AppTest` propio (session_state
+independiente, mismo proceso y mismas cachés, como en `streamlit run`) y
+recorre: carga inicial -> login -> N preguntas en el chat -> Panel de Control
+(todas las pestañas se renderizan en el mismo rerun) -> volver al chat.
+
+Con varias sesiones en hilos paralelos se reporta, por nivel de concurrencia:
+- latencia de rerun por página (p50/p95/p99);
+- RSS del proceso (muestreado durante el nivel);
+- conexiones a la base: conexiones físicas abiertas por los pools del
+  proceso y, en PostgreSQL, las filas de pg_stat_activity de la base.
+
+AppTest ejecuta el script sin el servidor tornado ni el websocket, así que
+las latencias son el costo del lado servidor (cota inferior de lo que ve el
+navegador).
+
+La app usa la base configurada por POSTGRES_* (ver database.py); el LLM es
+el stub de benchmarks/stub_ollama.py:
+
+    python -m benchmarks.streamlit_load --email admin@nexa.ai --password ... \\
+        --create-user --sessions 1 5 10 20 --questions 3 --latency-ms 150
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .run_benchmark import RESULTS_DIR, summarize
+from .stub_ollama import StubOllamaServer, point_ollama_at
+from .workload import WORKLOAD
+
+APP_SCRIPT = Path(__file__).resolve().parent.parent / "src" / "ui" / "main.py"
+ADMIN_BUTTON = "⚙️ Panel de Control"
+BACK_TO_CHAT_BUTTON = "💬 Volver al Chat"
+
+
+def rss_mb() -> float:
+    """RSS actual del proceso (MB); pico de getrusage si no hay /proc."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class SessionDriver:
+    """Una sesión de navegador simulada sobre AppTest."""
+
+    def __init__(self, email: str, password: str, timeout: float = 120.0):
+        from streamlit.testing.v1 import AppTest
+
+        self.email = email
+        self.password = password
+        self.app = AppTest.from_file(str(APP_SCRIPT), default_timeout=timeout)
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: List[str] = []
+
+    def _rerun(self, page: str, action=None) -> None:
+        start = time.perf_counter()
+        try:
+            if action is not None:
+                action()
+            self.app.run()
+        except Exception as e:  # timeout u otra falla del script
+            self.errors.append(f"{page}: {e}")
+            return
+        finally:
+            self.latencies.setdefault(page, []).append((time.perf_counter() - start) * 1000)
+        for exc in self.app.exception:
+            self.errors.append(f"{page}: {exc.message}")
+
+    def _sidebar_button(self, label: str):
+        for button in self.app.sidebar.button:
+            if button.label == label:
+                return button
+        raise LookupError(f"No se encontró el botón {label!r}")
+
+    def open(self) -> None:
+        self._rerun("login_page")
+
+    def login(self) -> None:
+        def fill():
+            self.app.text_input[0].input(self.email)
+            self.app.text_input[1].input(self.password)
+            self.app.button[0].click()
+        self._rerun("login", fill)
+        if not self.app.session_state["authenticated"]:
+            self.errors.append("login: credenciales rechazadas")
+
+    def ask(self, question: str) -> None:
+        self._rerun("chat", lambda: self.app.chat_input[0].set_value(question))
+
+    def open_admin(self) -> None:
+        self._rerun("admin_panel", lambda: self._sidebar_button(ADMIN_BUTTON).click())
+
+    def back_to_chat(self) -> None:
+        self._rerun("chat_page", lambda: self._sidebar_button(BACK_TO_CHAT_BUTTON).click())
+
+
+def _run_session(driver: SessionDriver, questions: List[str], admin: bool) -> None:
+    driver.open()
+    driver.login()
+    if driver.errors:
+        return
+    for question in questions:
+        driver.ask(question)
+    if admin:
+        driver.open_admin()
+        driver.back_to_chat()
+
+
+class _ResourceSampler(threading.Thread):
+    """Muestrea RSS y conexiones a la base mientras corre un nivel."""
+
+    def __init__(self, count_db_connections, interval_s: float = 0.5):
+        super().__init__(name="load-sampler", daemon=True)
+        self.count_db_connections = count_db_connections
+        self.interval_s = interval_s
+        self.rss: List[float] = []
+        self.db_connections: List[int] = []
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            self.sample()
+            self._stop_event.wait(self.interval_s)
+
+    def sample(self) -> None:
+        self.rss.append(rss_mb())
+        count = self.count_db_connections()
+        if count is not None:
+            self.db_connections.append(count)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+        self.sample()
+
+
+def _pg_connection_counter(database_url: str):
+    """Función que cuenta conexiones a la base en pg_stat_activity (o None)."""
+    if not database_url.startswith("postgresql"):
+        return lambda: None
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.pool import NullPool
+
+    # NullPool: la conexión de monitoreo no queda abierta entre muestras
+    engine = create_engine(database_url, poolclass=NullPool)
+
+    def count() -> Optional[int]:
+        try:
+            with engine.connect() as conn:
+                return conn.execute(text(
+                    "SELECT count(*) FROM pg_stat_activity "
+                    "WHERE datname = current_database() AND pid <> pg_backend_pid()"
+                )).scalar()
+        except Exception:
+            return None
+    return count
+
+
+def run_level(sessions: int, questions: List[str], email: str, password: str,
+              admin: bool, count_db_connections) -> Dict[str, Any]:
+    from src.infrastructure.database import DB_POOL_CONNECTS, pool_stats
+
+    pool_opened = DB_POOL_CONNECTS.labels()
+    opened_before = pool_opened.value
+
+    drivers = [SessionDriver(email, password) for _ in range(sessions)]
+    sampler = _ResourceSampler(count_db_connections)
+    sampler.start()
+    threads = [
+        threading.Thread(target=_run_session, args=(driver, questions, admin))
+        for driver in drivers
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall_s = time.perf_counter() - start
+    sampler.stop()
+
+    pages: Dict[str, List[float]] = {}
+    errors: List[str] = []
+    for driver in drivers:
+        errors.extend(driver.errors)
+        for page, samples in driver.latencies.items():
+            pages.setdefault(page, []).extend(samples)
+
+    return {
+        "sessions": sessions,
+        "wall_s": round(wall_s, 3),
+        "reruns": sum(len(v) for v in pages.values()),
+        "pages_ms": {page: summarize(v) for page, v in sorted(pages.items())},
+        "rss_mb": {"max": round(max(sampler.rss), 1), "end": round(sampler.rss[-1], 1)},
+        "db_connections": {
+            "pool_opened": int(pool_opened.value - opened_before),
+            "server_max": max(sampler.db_connections) if sampler.db_connections else None,
+            "pools": pool_stats(),
+        },
+        "errors": errors[:20],
+        "error_count": len(errors),
+    }
+
+
+def _ensure_user(email: str, password: str) -> None:
+    """Crear (si no existe) un usuario ADMIN para la prueba de carga."""
+    from src.infrastructure.admin_repository import AdminRepository
+
+    repo = AdminRepository()
+    admin_role = next((r for r in repo.get_roles() if r["nombre_rol"].upper() == "ADMIN"), None)
+    try:
+        repo.save_user(rut="11.111.111-1", nombre_completo="Carga Streamlit",
+                       email=email, password=password,
+                       rol_id=admin_role["id"] if admin_role else None)
+    except ValueError:
+        pass  # ya existe
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Carga multi-sesión sobre la app Streamlit.")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--create-user", action="store_true",
+                        help="Crear el usuario ADMIN de prueba si no existe.")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 5, 10])
+    parser.add_argument("--questions", type=int, default=3, help="Preguntas por sesión.")
+    parser.add_argument("--no-admin", action="store_true", help="No abrir el Panel de Control.")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--ms-per-token", type=float, default=0.0)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    # La app importa módulos con rutas relativas a la raíz del repo
+    root = APP_SCRIPT.parent.parent.parent
+    os.chdir(root)
+    if str(root) not in sys.path:
+        sys.path.insert(0, str(root))
+
+    with StubOllamaServer(latency_ms=args.latency_ms, ms_per_token=args.ms_per_token) as stub:
+        point_ollama_at(stub.url)
+        from src.infrastructure.database import DATABASE_URL
+
+        if args.create_user:
+            _ensure_user(args.email, args.password)
+
+        questions = [item["question"] for item in WORKLOAD][:args.questions]
+        count_db_connections = _pg_connection_counter(DATABASE_URL)
+        report: Dict[str, Any] = {
+            "meta": {
+                "started_at": datetime.now().isoformat(),
+                "questions_per_session": len(questions),
+                "admin": not args.no_admin,
+                "stub": {"latency_ms": args.latency_ms, "ms_per_token": args.ms_per_token},
+            },
+            "levels": [],
+        }
+        for sessions in args.sessions:
+            level = run_level(sessions, questions, args.email, args.password,
+                              not args.no_admin, count_db_connections)
+            report["levels"].append(level)
+            print(f"\n👥 {sessions} sesiones: {level['reruns']} reruns en {level['wall_s']} s, "
+                  f"RSS máx {level['rss_mb']['max']} MB, conexiones {level['db_connections']}, "
+                  f"errores {level['error_count']}")
+            for page, s in level["pages_ms"].items():
+                print(f"   {page:<12} p50 {s['p50']:>8.1f}  p95 {s['p95']:>8.1f}  p99 {s['p99']:>8.1f} ms")
+
+    output = args.output or RESULTS_DIR / f"streamlit-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"\n💾 Resultados guardados en {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""
+Servidor HTTP que imita a Ollama para medir el pipeline sin un modelo real.
+
+Implementa los endpoints que usa OllamaClient:
+    GET  /api/tags      (is_available)
+    POST /api/generate  (sql_gen con `format` -> intent JSON; formateo -> texto)
+    POST /api/chat      (con `tools` -> tool_calls; sin tools -> texto)
+
+La latencia de cada llamada es
+`latency_ms + ms_per_prompt_token * tokens_evaluados + ms_per_token * tokens ± jitter_ms`
+y se reporta en los campos *_duration (ns) igual que Ollama, así que
+OllamaClient.last_stats se llena con valores coherentes. Soporta stream=true
+(NDJSON, un fragmento por palabra).
+
+Como Ollama, guarda el último prompt de cada slot (`num_slots`, equivalente a
+OLLAMA_NUM_PARALLEL) y sólo "evalúa" lo que no comparte con el slot más
+parecido: prompt_eval_count refleja los aciertos del prefijo en caché.
+
+Uso independiente:
+    python -m benchmarks.stub_ollama --port 11435 --latency-ms 150
+    OLLAMA_HOST=http://127.0.0.1:11435 streamlit run src/ui/main.py
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from .workload import DEFAULT_ANSWER, match_question
+
+
+def estimate_tokens(text: str) -> int:
+    """Aproximación de tokens (~4 caracteres por token)."""
+    return max(1, len(text) // 4)
+
+
+class StubOllamaServer:
+    """
+    Stub de Ollama en un hilo daemon.
+
+    Args:
+        host/port: dirección de escucha (port=0 elige uno libre).
+        latency_ms: costo fijo por llamada (carga + evaluación del prompt).
+        ms_per_token: costo por token generado.
+        jitter_ms: variación uniforme ± aplicada a cada llamada.
+        ms_per_prompt_token: costo por token de prompt evaluado (fuera de caché).
+        num_slots: prompts recordados para la caché de prefijos (0 = sin caché).
+        model: nombre que devuelve /api/tags.
+        seed: semilla del jitter, para corridas reproducibles.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency_ms: float = 0.0,
+        ms_per_token: float = 0.0,
+        jitter_ms: float = 0.0,
+        ms_per_prompt_token: float = 0.0,
+        num_slots: int = 2,
+        model: str = "qwen2.5-coder:1.5b",
+        seed: Optional[int] = None,
+    ):
+        self.latency_ms = latency_ms
+        self.ms_per_token = ms_per_token
+        self.jitter_ms = jitter_ms
+        self.ms_per_prompt_token = ms_per_prompt_token
+        self.num_slots = num_slots
+        self._slots: List[str] = []
+        self.model = model
+        self.requests: Dict[str, int] = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+
+    # ------------------------------------------------------------------
+    #  Ciclo de vida
+    # ------------------------------------------------------------------
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubOllamaServer":
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="stub-ollama", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StubOllamaServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    # ------------------------------------------------------------------
+    #  Respuestas
+    # ------------------------------------------------------------------
+    def _count(self, endpoint: str) -> None:
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    def _delay_ms(self, prompt_tokens: int, eval_count: int) -> float:
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(0.0, self.latency_ms + self.ms_per_prompt_token * prompt_tokens
+                   + self.ms_per_token * eval_count + jitter)
+
+    def evaluate_prompt(self, prompt: str) -> int:
+        """
+        Tokens de `prompt` que hay que evaluar dado lo que ya está en caché
+        (prefijo común más largo con algún slot).
+
+        Como Ollama, si el prompt extiende por completo a ese slot se reutiliza
+        el slot; si sólo comparte una parte, el prefijo se copia al slot menos
+        reciente para no destruir lo que el otro tenía en caché.
+        """
+        with self._lock:
+            if self.num_slots <= 0:
+                return estimate_tokens(prompt)
+            best, shared = None, 0
+            for i, cached in enumerate(self._slots):
+                common = len(os.path.commonprefix([cached, prompt]))
+                if common > shared:
+                    best, shared = i, common
+            if best is not None and shared == len(self._slots[best]):
+                self._slots.pop(best)
+            elif len(self._slots) >= self.num_slots:
+                self._slots.pop(0)  # el menos reciente
+            self._slots.append(prompt)
+        return estimate_tokens(prompt[shared:])
+
+    def _stats(self, prompt_tokens: int, output: str, elapsed_ms: float) -> Dict[str, Any]:
+        eval_count = estimate_tokens(output) if output else 0
+        total_ns = int(elapsed_ms * 1_000_000)
+        eval_ns = int(self.ms_per_token * eval_count * 1_000_000)
+        return {
+            "model": self.model,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": total_ns,
+            "load_duration": 0,
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": max(0, total_ns - eval_ns),
+            "eval_count": eval_count,
+            "eval_duration": eval_ns,
+        }
+
+    def _intent(self, item: Optional[Dict[str, Any]]) -> str:
+        intent = item["intent"] if item else {"table": "directorio_telefonico", "term": "central"}
+        return json.dumps(intent, ensure_ascii=False)
+
+    def generate_reply(self, body: Dict[str, Any]) -> str:
+        prompt = body.get("prompt") or ""
+        item = match_question(prompt)
+        if body.get("format"):
+            return self._intent(item)
+        return item["answer"] if item else DEFAULT_ANSWER
+
+    def chat_reply(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        item = match_question(render_messages(body.get("messages") or []))
+        if body.get("tools"):
+            calls = [{"function": item["tool"]}] if item else []
+            return {"role": "assistant", "content": "", "tool_calls": calls}
+        if body.get("format"):
+            return {"role": "assistant", "content": self._intent(item)}
+        return {"role": "assistant", "content": item["answer"] if item else DEFAULT_ANSWER}
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):  # silencio: el runner reporta
+                pass
+
+            def _send_json(self, payload: Dict[str, Any], status: int = 200) -> None:
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _read_body(self) -> Dict[str, Any]:
+                length = int(self.headers.get("Content-Length") or 0)
+                return json.loads(self.rfile.read(length) or b"{}")
+
+            def do_GET(self):
+                if self.path == "/api/tags":
+                    stub._count("tags")
+                    self._send_json({"models": [{
+                        "name": stub.model, "model": stub.model,
+                        "modified_at": datetime.now(timezone.utc).isoformat(),
+                        "size": 0, "digest": "stub",
+                    }]})
+                elif self.path == "/api/version":
+                    self._send_json({"version": "stub"})
+                else:
+                    self._send_json({"error": "not found"}, 404)
+
+            def do_HEAD(self):
+                self.send_response(200)
+                self.end_headers()
+
+            def do_POST(self):
+                try:
+                    body = self._read_body()
+                except ValueError:
+                    self._send_json({"error": "invalid json"}, 400)
+                    return
+
+                if self.path == "/api/generate":
+                    stub._count("generate")
+                    output = stub.generate_reply(body)
+                    self._respond(body, body.get("prompt") or "", output,
+                                  lambda text: {"response": text})
+                elif self.path == "/api/chat":
+                    stub._count("chat")
+                    message = stub.chat_reply(body)
+                    prompt = render_messages(body.get("messages") or [])
+                    output = message["content"] or json.dumps(message.get("tool_calls"))
+                    self._respond(body, prompt, output,
+                                  lambda text: {"message": {**message, "content": text}},
+                                  stream_parts=not message.get("tool_calls"))
+                else:
+                    self._send_json({"error": "not found"}, 404)
+
+            def _respond(self, body, prompt, output, wrap, stream_parts: bool = True) -> None:
+                prompt_tokens = stub.evaluate_prompt(prompt)
+                delay_ms = stub._delay_ms(prompt_tokens, estimate_tokens(output))
+                start = time.perf_counter()
+                if body.get("stream", True):  # como Ollama: stream por defecto
+                    self._stream(prompt_tokens, output, wrap, delay_ms, stream_parts)
+                    return
+                time.sleep(delay_ms / 1000)
+                elapsed = (time.perf_counter() - start) * 1000
+                final = wrap(output if stream_parts else "")
+                self._send_json({**stub._stats(prompt_tokens, output, elapsed), **final})
+
+            def _stream(self, prompt_tokens, output, wrap, delay_ms, stream_parts) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.end_headers()
+                start = time.perf_counter()
+                parts: List[str] = output.split(" ") if stream_parts and output else []
+                step = delay_ms / 1000 / max(1, len(parts) + 1)
+                for i, part in enumerate(parts):
+                    time.sleep(step)
+                    chunk = {"model": stub.model, "done": False,
+                             **wrap(part if i == 0 else " " + part)}
+                    self.wfile.write((json.dumps(chunk, ensure_ascii=False) + "\n").encode("utf-8"))
+                    self.wfile.flush()
+                time.sleep(step)
+                elapsed = (time.perf_counter() - start) * 1000
+                final = {**stub._stats(prompt_tokens, output, elapsed), **wrap("")}
+                self.wfile.write((json.dumps(final, ensure_ascii=False) + "\n").encode("utf-8"))
+
+        return Handler
+
+
+def render_messages(messages: List[Dict[str, Any]]) -> str:
+    """Aplanar mensajes de chat como lo haría la plantilla del modelo."""
+    return "".join(f"<|{m.get('role')}|>\n{m.get('content') or ''}\n" for m in messages)
+
+
+def point_ollama_at(url: str) -> None:
+    """
+    Dirigir el cliente `ollama` (y por tanto OllamaClient) al stub.
+
+    El módulo `ollama` crea su cliente al importarse leyendo OLLAMA_HOST; si ya
+    fue importado se actualiza la URL base del cliente existente.
+    """
+    os.environ["OLLAMA_HOST"] = url
+    module = sys.modules.get("ollama")
+    if module is not None:
+        module._client._client.base_url = url
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stub HTTP de Ollama para benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--ms-per-token", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--ms-per-prompt-token", type=float, default=0.0)
+    parser.add_argument("--num-slots", type=int, default=2)
+    args = parser.parse_args()
+
+    server = StubOllamaServer(args.host, args.port, args.latency_ms,
+                              args.ms_per_token, args.jitter_ms,
+                              args.ms_per_prompt_token, args.num_slots)
+    print(f"🧪 Stub de Ollama escuchando en {server.url} (Ctrl+C para salir)")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Preguntas de la carga de benchmark y las salidas "perfectas" del modelo.
+
+Cada entrada define lo que el stub de Ollama responde para esa pregunta:
+- intent: JSON del paso sql_gen (modo "sql").
+- tool: llamada a herramienta (modo "tools").
+- answer: texto del paso de formateo.
+
+Los términos existen en el seed (o no, a propósito) para cubrir resultados
+con filas, vacíos y ambos modos del agente.
+"""
+from typing import Any, Dict, List, Optional
+
+WORKLOAD: List[Dict[str, Any]] = [
+    {
+        "question": "¿Cuál es el anexo de informática?",
+        "intent": {"table": "directorio_telefonico", "term": "informatica"},
+        "tool": {"name": "search_directory", "arguments": {"name": "informatica"}},
+        "answer": "Informática: anexo 613088 (jefatura) y 613089 (soporte).",
+    },
+    {
+        "question": "¿Dónde está la cafetería?",
+        "intent": {"table": "vista_ubicaciones_maestra", "term": "cafeteria"},
+        "tool": {"name": "find_location", "arguments": {"unit_name": "cafeteria"}},
+        "answer": "La Cafetería está en el Zócalo del Edificio B (Beta).",
+    },
+    {
+        "question": "Necesito el anexo de farmacia",
+        "intent": {"table": "directorio_telefonico", "term": "farmacia"},
+        "tool": {"name": "search_directory", "arguments": {"name": "farmacia"}},
+        "answer": "Farmacia Central: anexo 613028.",
+    },
+    {
+        "question": "¿En qué piso queda Imagenología?",
+        "intent": {"table": "vista_ubicaciones_maestra", "term": "imagenologia"},
+        "tool": {"name": "find_location", "arguments": {"unit_name": "imagenologia"}},
+        "answer": "Imagenología está en el Piso 1 del Edificio B (Beta).",
+    },
+    {
+        "question": "¿Qué hay en el zócalo de la torre B?",
+        "intent": {"table": "vista_ubicaciones_maestra", "term": "zocalo"},
+        "tool": {"name": "list_units_on_floor", "arguments": {"floor_level": -1, "building": "TORRE_B"}},
+        "answer": "En el Zócalo están Anatomía Patológica, Auditorio, Cafetería y Radioterapia.",
+    },
+    {
+        "question": "anexo de urgencia",
+        "intent": {"table": "directorio_telefonico", "term": "urgencia"},
+        "tool": {"name": "search_directory", "arguments": {"name": "urgencia"}},
+        "answer": "Urgencia: Admisión 613200, Laboratorio 613020.",
+    },
+    {
+        "question": "¿Cuál es el anexo de astronomía?",
+        "intent": {"table": "directorio_telefonico", "term": "astronomia"},
+        "tool": {"name": "search_directory", "arguments": {"name": "astronomia"}},
+        "answer": "No encontré ese anexo.",
+    },
+]
+
+DEFAULT_ANSWER = "Respuesta de prueba."
+
+
+def match_question(text: str) -> Optional[Dict[str, Any]]:
+    """Entrada de WORKLOAD cuya pregunta aparece en el prompt (o None)."""
+    for item in WORKLOAD:
+        if item["question"] in text:
+            return item
+    return None
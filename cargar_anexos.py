@@ -1,44 +1,41 @@
-import pandas as pd
-from sqlalchemy import text
-from src.infrastructure.database import engine
+import argparse
+
+from src.infrastructure.admin_repository import AdminRepository
+
 
 def cargar_datos():
-    archivo_csv = "ANEXOS HCM.csv"
-    
-    print(f"📂 Leyendo archivo: {archivo_csv}...")
-    try:
-        # 1. Leer el CSV
-        df = pd.read_csv(archivo_csv)
-        
-        # 2. Limpieza básica
-        df = df.dropna(subset=['DISPLAY'])  # Borrar filas vacías
-        df['DISPLAY'] = df['DISPLAY'].astype(str).str.strip() # Quitar espacios extra
-        
-        # 3. Mapear columnas del CSV a la Base de Datos
-        # CSV: ANEXO, DISPLAY  ->  DB: numero_anexo, nombre_referencia
-        df_final = df[['ANEXO', 'DISPLAY']].copy()
-        df_final.columns = ['numero_anexo', 'nombre_referencia']
-        
-        print(f"🔄 Preparando {len(df_final)} registros...")
+    parser = argparse.ArgumentParser(
+        description="Sincroniza directorio_telefonico con el/los archivos de anexos."
+    )
+    parser.add_argument("archivos", nargs="*", default=["ANEXOS HCM.csv"],
+                        help="archivos .csv o .xlsx con columnas ANEXO y DISPLAY")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="mostrar los cambios sin aplicarlos")
+    args = parser.parse_args()
 
-        # 4. Conectar y Cargar
-        with engine.connect() as connection:
-            # Opcional: Limpiar la tabla primero para evitar duplicados de pruebas anteriores
-            print("🧹 Limpiando tabla antigua...")
-            connection.execute(text("TRUNCATE TABLE directorio_telefonico RESTART IDENTITY;"))
-            connection.commit()
-            
-            # Inserción masiva usando Pandas
-            print("🚀 Insertando datos en PostgreSQL...")
-            df_final.to_sql('directorio_telefonico', con=connection, if_exists='append', index=False)
-            connection.commit()
-            
-        print("✅ ¡Carga Completa! Verifica en BeeKeeper Studio.")
-        
-    except FileNotFoundError:
-        print("❌ Error: No encuentro el archivo .csv en esta carpeta.")
+    print(f"📂 Leyendo: {', '.join(args.archivos)}...")
+    try:
+        # Diferencias por numero_anexo en una transacción: la tabla nunca queda
+        # vacía y los contactos que no cambian conservan su id
+        result = AdminRepository().import_directorio(*args.archivos, dry_run=args.dry_run)
+    except FileNotFoundError as e:
+        print(f"❌ Error: No encuentro el archivo {e.filename}.")
+        return
+    except ValueError as e:
+        print(str(e))
+        return
     except Exception as e:
         print(f"❌ Error inesperado: {e}")
+        return
+
+    print(f"➕ Nuevos: {result.added}  ✏️ Modificados: {result.changed}  "
+          f"🗑️ Eliminados: {result.removed}  ＝ Sin cambios: {result.unchanged}  "
+          f"⏭️ Descartados: {result.skipped}")
+    if args.dry_run:
+        print(f"🔍 Simulación ({result.elapsed_ms:.0f} ms): no se aplicó ningún cambio.")
+    else:
+        print(f"✅ ¡Carga Completa! ({result.elapsed_ms:.0f} ms)")
+
 
 if __name__ == "__main__":
-    cargar_datos()
\ No newline at end of file
+    cargar_datos()
@@ -0,0 +1,27 @@
+-- ==================================================================================
+-- PROYECTO NEXA - Índices para las búsquedas del agente
+-- Búsquedas parciales sin tildes (unaccent + ILIKE '%term%') servidas por índices
+-- trigram en vez de recorrer las tablas completas.
+-- ==================================================================================
+
+CREATE EXTENSION IF NOT EXISTS unaccent;
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- unaccent() es STABLE y no se puede indexar; este envoltorio IMMUTABLE fija el
+-- diccionario para poder usarlo en índices de expresión.
+CREATE OR REPLACE FUNCTION f_unaccent(text)
+RETURNS text
+LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+AS $$ SELECT public.unaccent('public.unaccent', $1) $$;
+
+-- search_directory(name)
+CREATE INDEX IF NOT EXISTS idx_directorio_nombre_trgm
+    ON directorio_telefonico USING gin (f_unaccent(nombre_referencia) gin_trgm_ops);
+
+-- find_location(unit_name)
+CREATE INDEX IF NOT EXISTS idx_unidades_nombre_trgm
+    ON unidades_hospitalarias USING gin (f_unaccent(nombre_unidad) gin_trgm_ops);
+
+-- list_units_on_floor(floor_level, building) y los JOIN de vista_ubicaciones_maestra
+CREATE INDEX IF NOT EXISTS idx_pisos_nivel ON pisos(nivel_numero, edificio_id);
+CREATE INDEX IF NOT EXISTS idx_unidades_piso ON unidades_hospitalarias(piso_id);
@@ -0,0 +1,28 @@
+-- ==================================================================================
+-- PROYECTO NEXA - Índices para los listados paginados del Panel de Control
+-- Cada listado se ordena por (claves..., id) y pagina por keyset; estos índices
+-- cubren ese orden para que cada página sea un recorrido corto del índice.
+-- Requiere 06_rag_indexes.sql (f_unaccent, pg_trgm).
+-- ==================================================================================
+
+-- get_users_page(sort="nombre" | "email" | "rut") y búsqueda
+CREATE INDEX IF NOT EXISTS idx_usuarios_nombre_id ON usuarios(nombre_completo, id);
+CREATE INDEX IF NOT EXISTS idx_usuarios_nombre_trgm
+    ON usuarios USING gin (f_unaccent(nombre_completo) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_usuarios_email_trgm
+    ON usuarios USING gin (f_unaccent(email) gin_trgm_ops);
+
+-- get_pisos_page / get_unidades_page (orden por edificio, nivel)
+CREATE INDEX IF NOT EXISTS idx_edificios_nombre ON edificios(nombre_edificio, id);
+CREATE INDEX IF NOT EXISTS idx_unidades_nombre_id ON unidades_hospitalarias(nombre_unidad, id);
+
+-- get_directorio_page(sort="anexo" | "nombre")
+CREATE INDEX IF NOT EXISTS idx_directorio_anexo_id ON directorio_telefonico(numero_anexo, id);
+CREATE INDEX IF NOT EXISTS idx_directorio_nombre_id ON directorio_telefonico(nombre_referencia, id);
+
+-- get_logs_page (más recientes primero, por usuario) y búsqueda en la pregunta
+CREATE INDEX IF NOT EXISTS idx_historial_fecha_id ON historial_consultas(fecha DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_historial_usuario_fecha
+    ON historial_consultas(usuario_id, fecha DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_historial_pregunta_trgm
+    ON historial_consultas USING gin (f_unaccent(pregunta) gin_trgm_ops);
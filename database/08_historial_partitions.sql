@@ -0,0 +1,130 @@
+-- ==================================================================================
+-- PROYECTO NEXA - Particionado mensual de historial_consultas
+-- historial_consultas pasa a estar particionada por RANGE (fecha), una partición
+-- por mes más una DEFAULT de respaldo. Cada partición tiene el btree
+-- (fecha DESC, id DESC) heredado del padre y un BRIN sobre fecha, así los
+-- listados recientes y los filtros por rango sólo tocan los meses pedidos.
+--
+-- Mantenimiento (AdminRepository.maintain_logs / mantener_historial.py):
+--   SELECT nexa_historial_crear_particiones(3);           -- mes actual + 3
+--   SELECT nexa_historial_retencion('2025-10-01', false); -- DETACH anteriores
+-- Requiere 05_audit_log.sql y 07_admin_listing_indexes.sql. Idempotente.
+-- ==================================================================================
+
+-- Crea (si falta) la partición del mes de `mes` y devuelve su nombre
+CREATE OR REPLACE FUNCTION nexa_historial_particion(mes date) RETURNS text AS $$
+DECLARE
+    desde date := date_trunc('month', mes)::date;
+    hasta date := (date_trunc('month', mes) + interval '1 month')::date;
+    nombre text := format('historial_consultas_%s', to_char(desde, 'YYYY_MM'));
+BEGIN
+    IF to_regclass(nombre) IS NOT NULL THEN
+        RETURN nombre;
+    END IF;
+
+    -- Filas de ese mes que cayeron en DEFAULT: se sacan antes de crear la partición
+    CREATE TEMP TABLE _historial_mover ON COMMIT DROP AS
+        SELECT * FROM historial_consultas_default WHERE fecha >= desde AND fecha < hasta;
+    DELETE FROM historial_consultas_default WHERE fecha >= desde AND fecha < hasta;
+
+    EXECUTE format(
+        'CREATE TABLE %I PARTITION OF historial_consultas FOR VALUES FROM (%L) TO (%L)',
+        nombre, desde, hasta
+    );
+    EXECUTE format('CREATE INDEX IF NOT EXISTS %I ON %I USING brin (fecha)',
+                   nombre || '_fecha_brin', nombre);
+
+    INSERT INTO historial_consultas SELECT * FROM _historial_mover;
+    DROP TABLE _historial_mover;
+    RETURN nombre;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Asegura las particiones del mes actual y los `meses_adelante` siguientes
+CREATE OR REPLACE FUNCTION nexa_historial_crear_particiones(meses_adelante integer DEFAULT 3)
+RETURNS SETOF text AS $$
+BEGIN
+    FOR i IN 0..meses_adelante LOOP
+        RETURN NEXT nexa_historial_particion(
+            (date_trunc('month', CURRENT_DATE) + make_interval(months => i))::date
+        );
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Retira las particiones de meses anteriores a `corte` (DETACH, o DROP si `borrar`)
+-- y borra de DEFAULT lo anterior a `corte`. Devuelve las particiones retiradas.
+CREATE OR REPLACE FUNCTION nexa_historial_retencion(corte date, borrar boolean DEFAULT false)
+RETURNS SETOF text AS $$
+DECLARE
+    part record;
+BEGIN
+    FOR part IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'historial_consultas'::regclass
+          AND c.relname ~ '^historial_consultas_[0-9]{4}_[0-9]{2}$'
+        ORDER BY c.relname
+    LOOP
+        IF to_date(right(part.relname, 7), 'YYYY_MM') < date_trunc('month', corte)::date THEN
+            EXECUTE format('ALTER TABLE historial_consultas DETACH PARTITION %I', part.relname);
+            IF borrar THEN
+                EXECUTE format('DROP TABLE %I', part.relname);
+            END IF;
+            RETURN NEXT part.relname;
+        END IF;
+    END LOOP;
+    DELETE FROM historial_consultas_default WHERE fecha < corte;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Conversión de la tabla original (sólo la primera vez)
+DO $$
+DECLARE
+    mes date;
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_partitioned_table
+               WHERE partrelid = 'historial_consultas'::regclass) THEN
+        RETURN;
+    END IF;
+
+    ALTER TABLE historial_consultas RENAME TO historial_consultas_heap;
+    ALTER TABLE historial_consultas_heap
+        RENAME CONSTRAINT historial_consultas_pkey TO historial_consultas_heap_pkey;
+    -- Libera los nombres de 07_admin_listing_indexes.sql para recrearlos en el padre
+    DROP INDEX IF EXISTS idx_historial_fecha_id, idx_historial_usuario_fecha,
+                         idx_historial_pregunta_trgm;
+
+    -- La clave de partición debe formar parte de la PK
+    CREATE TABLE historial_consultas (
+        id UUID NOT NULL DEFAULT uuid_generate_v4(),
+        usuario_id UUID REFERENCES usuarios(id) ON DELETE SET NULL,
+        pregunta TEXT NOT NULL,
+        respuesta TEXT NOT NULL,
+        fecha TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (id, fecha)
+    ) PARTITION BY RANGE (fecha);
+    CREATE TABLE historial_consultas_default PARTITION OF historial_consultas DEFAULT;
+
+    FOR mes IN
+        SELECT DISTINCT date_trunc('month', fecha)::date
+        FROM historial_consultas_heap WHERE fecha IS NOT NULL
+    LOOP
+        PERFORM nexa_historial_particion(mes);
+    END LOOP;
+
+    INSERT INTO historial_consultas (id, usuario_id, pregunta, respuesta, fecha)
+    SELECT id, usuario_id, pregunta, respuesta, COALESCE(fecha, CURRENT_TIMESTAMP)
+    FROM historial_consultas_heap;
+    DROP TABLE historial_consultas_heap;
+END $$;
+
+-- Índices en el padre: PostgreSQL los crea en cada partición (actual y futura)
+CREATE INDEX IF NOT EXISTS idx_historial_fecha_id ON historial_consultas(fecha DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_historial_usuario_fecha
+    ON historial_consultas(usuario_id, fecha DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_historial_pregunta_trgm
+    ON historial_consultas USING gin (f_unaccent(pregunta) gin_trgm_ops);
+
+SELECT nexa_historial_crear_particiones(3);
@@ -0,0 +1,43 @@
+-- ==================================================================================
+-- PROYECTO NEXA - Columnas de rendimiento en historial_consultas
+-- Se llenan desde el paquete de RAGAgent.get_answer (ver performance_params en
+-- src/infrastructure/admin_repository.py). En la tabla particionada el ALTER
+-- se propaga a todas las particiones. Requiere 08_historial_partitions.sql.
+-- ==================================================================================
+
+ALTER TABLE historial_consultas
+    ADD COLUMN IF NOT EXISTS sql_generado TEXT,
+    ADD COLUMN IF NOT EXISTS sql_fingerprint VARCHAR(16),   -- sha1 de la consulta normalizada
+    ADD COLUMN IF NOT EXISTS modelo VARCHAR(100),
+    ADD COLUMN IF NOT EXISTS duraciones_ms JSONB,           -- {"sql_gen": 812.4, "exec": 3.2, ...}
+    ADD COLUMN IF NOT EXISTS duracion_total_ms DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS tokens_prompt INTEGER,
+    ADD COLUMN IF NOT EXISTS tokens_respuesta INTEGER,
+    ADD COLUMN IF NOT EXISTS filas INTEGER,
+    ADD COLUMN IF NOT EXISTS cache_hit BOOLEAN,
+    ADD COLUMN IF NOT EXISTS resultado VARCHAR(20),         -- ok | empty | invalid | error | unavailable
+    ADD COLUMN IF NOT EXISTS error_clase VARCHAR(100);
+
+-- Agrupar por consulta en una ventana de fechas
+CREATE INDEX IF NOT EXISTS idx_historial_fingerprint_fecha
+    ON historial_consultas(sql_fingerprint, fecha DESC);
+
+-- Consultas más lentas por huella (últimos 7 días), p. ej.:
+--   SELECT * FROM vista_consultas_lentas ORDER BY p95_ms DESC LIMIT 20;
+CREATE OR REPLACE VIEW vista_consultas_lentas AS
+SELECT
+    sql_fingerprint,
+    MIN(sql_generado) AS sql_ejemplo,
+    COUNT(*) AS ejecuciones,
+    ROUND(AVG(duracion_total_ms)::numeric, 1) AS promedio_ms,
+    ROUND((percentile_cont(0.95) WITHIN GROUP (ORDER BY duracion_total_ms))::numeric, 1) AS p95_ms,
+    ROUND(MAX(duracion_total_ms)::numeric, 1) AS max_ms,
+    ROUND(AVG((duraciones_ms->>'sql_gen')::double precision)::numeric, 1) AS sql_gen_ms,
+    ROUND(AVG((duraciones_ms->>'exec')::double precision)::numeric, 1) AS exec_ms,
+    ROUND(AVG(filas)::numeric, 1) AS filas_promedio,
+    COUNT(*) FILTER (WHERE resultado = 'error') AS errores,
+    COUNT(*) FILTER (WHERE cache_hit) AS aciertos_cache
+FROM historial_consultas
+WHERE sql_fingerprint IS NOT NULL
+  AND fecha >= CURRENT_TIMESTAMP - INTERVAL '7 days'
+GROUP BY sql_fingerprint;
@@ -0,0 +1,29 @@
+-- ==================================================================================
+-- PROYECTO NEXA - Resumen por hora del historial de consultas
+-- AdminRepository.refresh_rollups suma aquí las filas nuevas de
+-- historial_consultas (posteriores a la marca de agua) y el tab Auditoría lee
+-- sólo este resumen. Sobrevive a la retención de particiones.
+-- Requiere 09_historial_performance.sql.
+-- ==================================================================================
+
+CREATE TABLE IF NOT EXISTS historial_resumen_hora (
+    hora TIMESTAMP WITH TIME ZONE NOT NULL,
+    sql_fingerprint VARCHAR(16) NOT NULL DEFAULT '',   -- '' = sin consulta SQL
+    consultas INTEGER NOT NULL DEFAULT 0,
+    errores INTEGER NOT NULL DEFAULT 0,
+    vacias INTEGER NOT NULL DEFAULT 0,
+    aciertos_cache INTEGER NOT NULL DEFAULT 0,
+    medidas INTEGER NOT NULL DEFAULT 0,                -- filas con duracion_total_ms
+    duracion_total_ms DOUBLE PRECISION NOT NULL DEFAULT 0,
+    duracion_max_ms DOUBLE PRECISION,
+    tokens_prompt BIGINT NOT NULL DEFAULT 0,
+    tokens_respuesta BIGINT NOT NULL DEFAULT 0,
+    pregunta_ejemplo TEXT,
+    PRIMARY KEY (hora, sql_fingerprint)
+);
+
+-- Hasta qué `fecha` del historial ya está sumado el resumen
+CREATE TABLE IF NOT EXISTS historial_resumen_marca (
+    nombre VARCHAR(50) PRIMARY KEY,
+    procesado_hasta TIMESTAMP WITH TIME ZONE
+);
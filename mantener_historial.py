@@ -0,0 +1,47 @@
+"""
+Mantenimiento del historial de consultas (programar a diario, p. ej. con cron).
+
+Actualiza el resumen por hora, crea las particiones mensuales de los próximos
+meses y retira las que superan la retención (NEXA_HISTORIAL_RETENTION_MONTHS).
+Por defecto sólo hace DETACH: la partición queda como tabla suelta para
+archivarla; con --drop se borra.
+"""
+import argparse
+
+from src.infrastructure.admin_repository import (
+    HISTORIAL_MONTHS_AHEAD, HISTORIAL_RETENTION_MONTHS, AdminRepository
+)
+
+
+def mantener_historial():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--keep-months", type=int, default=HISTORIAL_RETENTION_MONTHS,
+                        help="meses completos a conservar además del actual (0 = sin límite)")
+    parser.add_argument("--months-ahead", type=int, default=HISTORIAL_MONTHS_AHEAD)
+    parser.add_argument("--drop", action="store_true", help="borrar en vez de DETACH")
+    args = parser.parse_args()
+
+    print("🗄️ Manteniendo historial_consultas...")
+    try:
+        repo = AdminRepository()
+        # Primero el resumen: así las filas que se retiran ya están sumadas
+        print(f"📈 Filas nuevas resumidas: {repo.refresh_rollups()}")
+        late = repo.late_rollup_rows()
+        if late:
+            print(f"⚠️ {late} filas del historial llegaron detrás de la marca de agua y no "
+                  f"están en el resumen: aumente NEXA_AUDIT_ROLLUP_LAG_S por sobre la "
+                  f"espera de nexa_audit_delay_seconds.")
+        result = repo.maintain_logs(args.keep_months, args.months_ahead, args.drop)
+    except Exception as e:
+        print(f"❌ Error inesperado: {e}")
+        raise SystemExit(1)
+
+    print(f"✅ Particiones vigentes: {', '.join(result['partitions']) or '-'}")
+    if result["cutoff"] is not None:
+        print(f"🧹 Corte de retención: {result['cutoff']}")
+    for name in result["retired"]:
+        print(f"   {'Borrada' if args.drop else 'Desacoplada'}: {name}")
+
+
+if __name__ == "__main__":
+    mantener_historial()
@@ -0,0 +1,115 @@
+"""
+Resolución de preguntas de seguimiento ("¿y su anexo?", "¿en qué piso?").
+
+El agente guarda por sesión un contexto compacto con la última entidad
+respondida (tabla, término buscado y filas). Una pregunta que sólo pide un
+atributo, sin nombrar nada nuevo, se responde desde esas filas o con una
+consulta indexada sobre el mismo término, sin pasar por el modelo.
+"""
+import re
+import unicodedata
+from typing import List, Optional, Tuple
+
+DIRECTORY_TABLE = "directorio_telefonico"
+LOCATION_TABLE = "vista_ubicaciones_maestra"
+
+# Palabras que piden un atributo -> tabla que lo tiene
+FOLLOW_UP_ATTRIBUTES = {
+    DIRECTORY_TABLE: {
+        "anexo", "anexos", "telefono", "telefonos", "fono", "numero", "numeros",
+        "interno", "llamar", "llamo", "contacto",
+    },
+    LOCATION_TABLE: {
+        "piso", "pisos", "donde", "ubicacion", "ubicado", "ubicada", "ubica",
+        "queda", "quedan", "edificio", "torre", "nivel", "llego", "llegar",
+    },
+}
+
+# Palabras que no nombran una entidad nueva (referencias a la anterior incluidas)
+FOLLOW_UP_FILLER = {
+    "y", "e", "o", "su", "sus", "el", "la", "los", "las", "lo", "le", "les",
+    "de", "del", "en", "a", "al", "que", "cual", "cuales", "es", "son", "esta",
+    "estan", "ese", "esa", "eso", "esos", "esas", "este", "ahi", "alli", "alla",
+    "me", "mi", "por", "favor", "tiene", "tienen", "hay", "con", "como", "puedo",
+    "puedes", "dame", "dime", "das", "sabes", "tambien", "un", "una", "mismo",
+    "misma", "ellos", "ellas", "se", "para", "cuanto", "exactamente",
+}
+
+# Largo máximo de una pregunta de seguimiento (en palabras)
+MAX_FOLLOW_UP_WORDS = 8
+
+
+def _normalize(text: str) -> List[str]:
+    text = "".join(
+        c for c in unicodedata.normalize("NFKD", text.casefold())
+        if not unicodedata.combining(c)
+    )
+    return re.findall(r"[a-z0-9]+", text)
+
+
+def detect_follow_up(question: str) -> Optional[str]:
+    """
+    Tabla cuyo atributo pide `question` si es un seguimiento, o None.
+
+    Es seguimiento si es corta, pide un atributo conocido y todas las demás
+    palabras son de relleno: "¿y su anexo?" lo es, "¿y el anexo de farmacia?"
+    no (nombra una entidad nueva y va por el flujo completo).
+    """
+    words = _normalize(question)
+    if not words or len(words) > MAX_FOLLOW_UP_WORDS:
+        return None
+    asked = {
+        table for table, keywords in FOLLOW_UP_ATTRIBUTES.items()
+        if any(word in keywords for word in words)
+    }
+    if len(asked) != 1:
+        return None
+    keywords = FOLLOW_UP_ATTRIBUTES[DIRECTORY_TABLE] | FOLLOW_UP_ATTRIBUTES[LOCATION_TABLE]
+    if any(word not in keywords and word not in FOLLOW_UP_FILLER for word in words):
+        return None
+    return asked.pop()
+
+
+def render_rows(table: str, rows: List[Tuple]) -> str:
+    """Filas de `table` como viñetas (mismo formato que el flujo completo)."""
+    if table == DIRECTORY_TABLE:
+        return "\n".join(f"• {name} - anexo {ext}" for name, ext in rows)
+    return "\n".join(
+        f"• {unit} está en {building}, {floor}" for unit, floor, building in rows
+    )
+
+
+class ConversationContext:
+    """
+    Última entidad respondida en la sesión.
+
+    Attributes:
+        table: tabla de las filas (directorio_telefonico o vista_ubicaciones_maestra).
+        term: término buscado; None si la consulta no fue por nombre.
+        rows: filas devueltas, en el orden de columnas de QUERYABLE_TABLES.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self) -> None:
+        self.table: Optional[str] = None
+        self.term: Optional[str] = None
+        self.rows: List[Tuple] = []
+
+    def remember(self, table: str, term: Optional[str], rows: List[Tuple]) -> None:
+        self.table = table
+        self.term = term
+        self.rows = [tuple(row) for row in rows]
+
+    @property
+    def subject(self) -> Optional[str]:
+        """Término para buscar el atributo en otra tabla."""
+        if self.term:
+            return self.term
+        if len(self.rows) == 1:
+            return str(self.rows[0][0])
+        return None
+
+    def __bool__(self) -> bool:
+        return bool(self.table and self.rows)
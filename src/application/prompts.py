@@ -22,20 +22,119 @@ Rules:
 Question: {question}"""
 )
 
+# 1b. SQL INTENT (salida estructurada)
+# El modelo ya no escribe SQL: sólo emite {table, term} validado contra
+# SQL_INTENT_SCHEMA (parámetro `format` de Ollama). La consulta se arma en
+# RAGAgent.build_query con las columnas fijas de cada tabla.
+#
+# El texto fijo va en SQL_INTENT_SYSTEM_PROMPT (mensaje system) y sólo la
+# pregunta en el mensaje user: Ollama reutiliza de su caché KV el prefijo
+# idéntico y sólo evalúa los tokens de la pregunta.
+SQL_INTENT_SYSTEM_PROMPT = """Role: Hospital directory router. Reply with JSON only.
+
+Tables:
+- directorio_telefonico: people, offices and phone extensions (anexos)
+- vista_ubicaciones_maestra: units, services and where they are (building, floor)
+
+Fields:
+- table: "directorio_telefonico" for PEOPLE/PHONES, "vista_ubicaciones_maestra" for PLACES
+- term: the shortest name to search for (no accents needed, no articles)"""
+
+SQL_INTENT_USER_TEMPLATE = PromptTemplate.from_template("Question: {question}")
+
+SQL_INTENT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "table": {
+            "type": "string",
+            "enum": ["directorio_telefonico", "vista_ubicaciones_maestra"],
+        },
+        "term": {"type": "string", "maxLength": 60},
+    },
+    "required": ["table", "term"],
+}
+
+# Límites de generación para la etapa SQL: el JSON esperado cabe de sobra
+# en 64 tokens. Sin "\n\n": cortaría un JSON con sangría a mitad del objeto
+# (`format` ya acota la salida).
+SQL_NUM_PREDICT = 64
+SQL_STOP_SEQUENCES = ["```", "</SQL>"]
+
+# 1c. TOOL CALLING (modo alternativo a la generación de SQL)
+# El modelo elige una función tipada; cada una está respaldada por una
+# consulta parametrizada e indexada en SQLDirectoryRepository.
+TOOLS_SYSTEM_PROMPT = (
+    "You are Nexa, the hospital directory assistant. "
+    "Always answer by calling exactly one tool. "
+    "Use search_directory for people, offices and phone extensions (anexos), "
+    "find_location for where a unit or service is, and list_units_on_floor "
+    "for what is on a given floor. Pass short search terms without articles."
+)
+
+AGENT_TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "search_directory",
+            "description": "Find phone extensions (anexos) by person, office or unit name.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string", "description": "Name or partial name to search"},
+                },
+                "required": ["name"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "find_location",
+            "description": "Find the building and floor where a hospital unit or service is.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "unit_name": {"type": "string", "description": "Unit or service name"},
+                },
+                "required": ["unit_name"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "list_units_on_floor",
+            "description": "List the units on a floor (-1 is the basement/Zócalo).",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "floor_level": {"type": "integer", "description": "Floor number"},
+                    "building": {"type": "string", "description": "Optional building name or code"},
+                },
+                "required": ["floor_level"],
+            },
+        },
+    },
+]
+
+# Una llamada a función cabe de sobra en 96 tokens.
+TOOLS_NUM_PREDICT = 96
+
 # 2. RESPONSE FORMATTING (EL CAMBIO QUIRÚRGICO)
 # Eliminamos el "If []". Asumimos que si llega aquí, HAY datos.
-RESPONSE_FORMATTING_TEMPLATE = PromptTemplate.from_template(
-"""Role: Hospital Assistant (Nexa).
+# Igual que el intent: instrucciones fijas en el system, datos en el user.
+RESPONSE_SYSTEM_PROMPT = """Role: Hospital Assistant (Nexa).
 Task: Present the found data to the user in Spanish.
 
-User Question: {question}
-Found Data:
-{result}
-
 Instructions:
 1. The 'Found Data' contains the correct answer. DO NOT say "not found".
 2. Start with a polite phrase like "Encontré la siguiente información:" or "Aquí tienes los datos coincidentes:".
-3. Display the 'Found Data' clearly as a list.
+3. Display the 'Found Data' clearly as a list."""
+
+RESPONSE_USER_TEMPLATE = PromptTemplate.from_template(
+"""User Question: {question}
+Found Data:
+{result}
 
 Answer:""")
 
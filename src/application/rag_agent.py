@@ -2,15 +2,70 @@
 RAG Agent implementation using explicit 3-step workflow (Generate -> Execute -> Format).
 Refactored to fix context loss and improve reliability.
 """
+import os
 import re
 import ast
-from typing import Dict, Any, Optional
+import json
+from typing import Dict, Any, Optional, Tuple
 from langchain_community.utilities import SQLDatabase
-from langchain_ollama import OllamaLLM
+from sqlalchemy import column, select, table
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.sql import Select
 from src.infrastructure.llm_client import OllamaClient
 from src.infrastructure.exceptions import LLMConnectionError
-from src.infrastructure.database import DATABASE_URL
-from .prompts import SQL_GENERATION_TEMPLATE, RESPONSE_FORMATTING_TEMPLATE
+from src.infrastructure.metrics import QUESTIONS, timed_stage
+from src.infrastructure.tracing import start_trace
+from src.infrastructure.database import DATABASE_URL, DatabaseManager, get_engine, get_read_engine
+from src.infrastructure.repositories import SQLDirectoryRepository, unaccent_ilike
+from src.domain.entities import DirectoryEntry
+from src.domain.interfaces import DirectoryRepository
+from .follow_up import (
+    DIRECTORY_TABLE,
+    LOCATION_TABLE,
+    ConversationContext,
+    detect_follow_up,
+    render_rows,
+)
+from .prompts import (
+    AGENT_TOOLS,
+    TOOLS_SYSTEM_PROMPT,
+    TOOLS_NUM_PREDICT,
+    SQL_INTENT_SYSTEM_PROMPT,
+    SQL_INTENT_USER_TEMPLATE,
+    SQL_INTENT_SCHEMA,
+    SQL_NUM_PREDICT,
+    SQL_STOP_SEQUENCES,
+    RESPONSE_SYSTEM_PROMPT,
+    RESPONSE_USER_TEMPLATE,
+)
+
+# Tablas consultables por el agente, con sus columnas en lista blanca y la
+# columna sobre la que se busca el término.
+QUERYABLE_TABLES = {
+    "directorio_telefonico": (
+        table("directorio_telefonico", column("nombre_referencia"), column("numero_anexo")),
+        "nombre_referencia",
+    ),
+    "vista_ubicaciones_maestra": (
+        table(
+            "vista_ubicaciones_maestra",
+            column("nombre_unidad"), column("nombre_piso"), column("nombre_edificio"),
+        ),
+        "nombre_unidad",
+    ),
+}
+RESULT_LIMIT = 5
+
+# Herramienta (y argumento) que busca por nombre en cada tabla
+FOLLOW_UP_TOOLS = {
+    DIRECTORY_TABLE: ("search_directory", "name"),
+    LOCATION_TABLE: ("find_location", "unit_name"),
+}
+
+# "sql": el modelo emite un intent JSON y se arma la consulta (por defecto).
+# "tools": el modelo llama a una función tipada del directorio.
+AGENT_MODES = ("sql", "tools")
+DEFAULT_AGENT_MODE = os.getenv("NEXA_AGENT_MODE", "sql")
 
 
 class RAGAgent:
@@ -22,22 +77,56 @@ class RAGAgent:
     def __init__(
         self,
         database_uri: str = DATABASE_URL,
-        model_name: str = "qwen2.5-coder:1.5b"
+        model_name: str = "qwen2.5-coder:1.5b",
+        mode: str = DEFAULT_AGENT_MODE,
+        directory_repo: Optional[DirectoryRepository] = None
     ):
+        if mode not in AGENT_MODES:
+            raise ValueError(f"Modo de agente desconocido: {mode!r} (use {AGENT_MODES})")
         self.ollama_client = OllamaClient(model_name=model_name)
         self.model_name = model_name
         self.database_uri = database_uri
+        self.mode = mode
 
         try:
-            self.db = SQLDatabase.from_uri(database_uri, view_support=True)
-            self.llm = OllamaLLM(model=model_name, temperature=0)
-            self.prompt_sql = SQL_GENERATION_TEMPLATE
-            self.prompt_response = RESPONSE_FORMATTING_TEMPLATE
+            self.directory_repo = directory_repo or SQLDirectoryRepository(
+                DatabaseManager(database_uri)
+            )
+            # Engine compartido: from_uri crearía un pool nuevo por agente (sesión).
+            # SQLite (benchmarks) no implementa la reflexión de vistas materializadas
+            self._primary_engine = get_engine(database_uri)
+            self.db = SQLDatabase(
+                self._primary_engine, view_support=not database_uri.startswith("sqlite")
+            )
+            # SQLDatabase por réplica de lectura (se crea al primer uso)
+            self._read_dbs: Dict[str, SQLDatabase] = {}
+            # Prefijo fijo (system) + sufijo con la pregunta (user)
+            self.prompt_sql_system = SQL_INTENT_SYSTEM_PROMPT
+            self.prompt_sql = SQL_INTENT_USER_TEMPLATE
+            self.prompt_response_system = RESPONSE_SYSTEM_PROMPT
+            self.prompt_response = RESPONSE_USER_TEMPLATE
+            self._prefixes_warm = False
+            # Última entidad respondida (el agente vive en la sesión de Streamlit)
+            self.context = ConversationContext()
         except Exception as e:
             raise LLMConnectionError(
                 f"Error CRÍTICO al conectar Agente con PostgreSQL: {e}"
             )
 
+    def _read_db(self) -> SQLDatabase:
+        """
+        SQLDatabase para ejecutar la consulta: una réplica al día si hay
+        NEXA_DB_REPLICA_URLS (ver get_read_engine), si no el primario.
+        """
+        engine = get_read_engine(self.database_uri)
+        if engine is self._primary_engine:
+            return self.db
+        key = str(engine.url)
+        db = self._read_dbs.get(key)
+        if db is None:
+            db = self._read_dbs[key] = SQLDatabase(engine, view_support=engine.dialect.name != "sqlite")
+        return db
+
     # ------------------------------------------------------------------
     #  LIMPIADOR DE SQL
     # ------------------------------------------------------------------
@@ -62,81 +151,396 @@ class RAGAgent:
         )
         return text.strip()
 
+    # ------------------------------------------------------------------
+    #  CONSTRUCTOR DE SQL (salida estructurada)
+    # ------------------------------------------------------------------
+    @staticmethod
+    def parse_intent(raw_intent: str) -> Optional[Tuple[str, str]]:
+        """(tabla, término) del JSON emitido por el modelo, o None si no sirve."""
+        try:
+            intent = json.loads(raw_intent)
+        except (TypeError, ValueError):
+            return None
+        if not isinstance(intent, dict):
+            return None
+
+        table_name = str(intent.get("table", "")).strip()
+        term = str(intent.get("term") or "").strip()
+        if table_name not in QUERYABLE_TABLES or not term:
+            return None
+        return table_name, term
+
+    def build_query(self, raw_intent: str) -> Optional[Select]:
+        """
+        Convierte el JSON {table, term} emitido por el modelo en una
+        consulta parametrizada. Devuelve None si el JSON no es utilizable.
+        """
+        intent = self.parse_intent(raw_intent)
+        return self.query_for(*intent) if intent else None
+
+    @staticmethod
+    def query_for(table_name: str, term: str) -> Select:
+        """Consulta parametrizada de `term` sobre una tabla de QUERYABLE_TABLES."""
+        tbl, search_column = QUERYABLE_TABLES[table_name]
+        # Las columnas se fijan por tabla (el formateo depende de su orden)
+        return (
+            select(*tbl.c)
+            .where(unaccent_ilike(tbl.c[search_column], term))
+            .limit(RESULT_LIMIT)
+        )
+
+    @staticmethod
+    def render_sql(query: Select) -> str:
+        """SQL legible (con literales) para el panel de depuración."""
+        return str(
+            query.compile(
+                dialect=postgresql.dialect(paramstyle="named"),
+                compile_kwargs={"literal_binds": True},
+            )
+        )
+
+    # ------------------------------------------------------------------
+    #  HERRAMIENTAS (modo "tools")
+    # ------------------------------------------------------------------
+    def run_tool(self, name: str, arguments: Dict[str, Any]) -> list:
+        """
+        Ejecuta la herramienta pedida por el modelo contra el repositorio.
+
+        Raises:
+            ValueError/KeyError/TypeError: herramienta o argumentos inválidos.
+        """
+        if name == "search_directory":
+            return self.directory_repo.search_directory(
+                str(arguments["name"]).strip(), limit=RESULT_LIMIT
+            )
+        if name == "find_location":
+            return self.directory_repo.find_location(
+                str(arguments["unit_name"]).strip(), limit=RESULT_LIMIT
+            )
+        if name == "list_units_on_floor":
+            building = arguments.get("building")
+            return self.directory_repo.list_units_on_floor(
+                int(arguments["floor_level"]),
+                building=str(building).strip() if building else None,
+            )
+        raise ValueError(f"Herramienta desconocida: {name}")
+
+    @staticmethod
+    def render_tool_call(call: Dict[str, Any]) -> str:
+        args = ", ".join(f"{k}={v!r}" for k, v in call["arguments"].items())
+        return f"{call['name']}({args})"
+
+    @staticmethod
+    def rows_to_text(rows: list) -> str:
+        lines = []
+        for row in rows:
+            if isinstance(row, DirectoryEntry):
+                lines.append(f"• {row.name} - anexo {row.extension}")
+            else:
+                lines.append(f"• {row.unit_name} está en {row.building_name}, {row.floor_name}")
+        return "\n".join(lines)
+
+    @staticmethod
+    def entity_rows(rows: list) -> Tuple[str, list]:
+        """Entidades del repositorio como (tabla, filas) en el orden de QUERYABLE_TABLES."""
+        if isinstance(rows[0], DirectoryEntry):
+            return DIRECTORY_TABLE, [(row.name, row.extension) for row in rows]
+        return LOCATION_TABLE, [(row.unit_name, row.floor_name, row.building_name) for row in rows]
+
+    def _answer_with_tools(self, question: str, result_package: Dict[str, Any]) -> Dict[str, Any]:
+        timings = result_package["timings"]
+        with timed_stage(timings, "tool_call"):
+            calls = self.ollama_client.chat_with_tools(
+                [
+                    {"role": "system", "content": TOOLS_SYSTEM_PROMPT},
+                    {"role": "user", "content": question},
+                ],
+                tools=AGENT_TOOLS,
+                temperature=0,
+                num_predict=TOOLS_NUM_PREDICT,
+            )
+        result_package["llm_stats"]["tool_call"] = self.ollama_client.last_stats
+        if not calls:
+            result_package["raw_data"] = "[]"
+            result_package["answer"] = "No pude generar una consulta válida para tu pregunta."
+            result_package["outcome"] = "invalid"
+            return result_package
+
+        call = calls[0]
+        result_package["tool_call"] = call
+        result_package["sql"] = self.render_tool_call(call)
+
+        # ---- EJECUCIÓN ----
+        try:
+            with timed_stage(timings, "exec"):
+                rows = self.run_tool(call["name"], call["arguments"])
+            result_package["row_count"] = len(rows)
+        except (KeyError, TypeError, ValueError):
+            result_package["raw_data"] = "[]"
+            result_package["answer"] = "No pude generar una consulta válida para tu pregunta."
+            result_package["outcome"] = "invalid"
+            return result_package
+        except Exception as db_err:
+            result_package["raw_data"] = f"Error ejecutando consulta: {str(db_err)}"
+            result_package["error"] = str(db_err)
+            result_package["error_class"] = type(db_err).__name__
+            result_package["answer"] = "Hubo un error técnico al consultar la base de datos."
+            result_package["outcome"] = "error"
+            return result_package
+
+        if not rows:
+            result_package["raw_data"] = "[]"
+            result_package["answer"] = "No encontré información exacta."
+            result_package["outcome"] = "empty"
+            return result_package
+
+        with timed_stage(timings, "parse"):
+            result_text = self.rows_to_text(rows)
+        result_package["raw_data"] = result_text
+        table_name, context_rows = self.entity_rows(rows)
+        term = call["arguments"].get("name") or call["arguments"].get("unit_name")
+        self.context.remember(table_name, str(term).strip() if term else None, context_rows)
+        return self._format_answer(question, result_text, result_package)
+
+    def _format_answer(self, question: str, result_text: str, result_package: Dict[str, Any]) -> Dict[str, Any]:
+        filled_prompt_response = self.prompt_response.format(
+            question=question,
+            result=result_text
+        )
+        with timed_stage(result_package["timings"], "format"):
+            result_package["answer"] = self.ollama_client.chat(
+                [
+                    {"role": "system", "content": self.prompt_response_system},
+                    {"role": "user", "content": filled_prompt_response},
+                ],
+                temperature=0,
+                prefix="format",
+            )
+        result_package["llm_stats"]["format"] = self.ollama_client.last_stats
+        return result_package
+
+    # ------------------------------------------------------------------
+    #  SEGUIMIENTO (sin LLM)
+    # ------------------------------------------------------------------
+    def reset_context(self) -> None:
+        """Olvidar la última entidad (p. ej. al limpiar el chat)."""
+        self.context.clear()
+
+    def _fetch_follow_up(self, table_name: str, term: str) -> list:
+        """Una consulta indexada (trigramas sobre f_unaccent) por el mismo término."""
+        if self.mode == "tools":
+            name, arg = FOLLOW_UP_TOOLS[table_name]
+            entities = self.run_tool(name, {arg: term})
+            return self.entity_rows(entities)[1] if entities else []
+        db_result = self._read_db().run(self.query_for(table_name, term))
+        return ast.literal_eval(db_result) if db_result else []
+
+    def _answer_follow_up(self, question: str, result_package: Dict[str, Any]) -> bool:
+        """
+        Responder un seguimiento sobre la última entidad, desde las filas en
+        contexto o con una sola consulta. False = usar el flujo completo.
+        """
+        table_name = detect_follow_up(question)
+        if not table_name or not self.context:
+            return False
+
+        if table_name == self.context.table:
+            subject, rows, source = self.context.subject, self.context.rows, "context"
+        else:
+            subject = self.context.subject
+            if not subject:
+                return False  # varias filas sin término común: que decida el modelo
+            try:
+                with timed_stage(result_package["timings"], "exec"):
+                    rows = self._fetch_follow_up(table_name, subject)
+            except Exception as db_err:
+                result_package["raw_data"] = f"Error ejecutando SQL: {str(db_err)}"
+                result_package["error"] = str(db_err)
+                result_package["error_class"] = type(db_err).__name__
+                result_package["answer"] = "Hubo un error técnico al consultar la base de datos."
+                result_package["outcome"] = "error"
+                return True
+            source = "query"
+            if self.mode == "tools":
+                name, arg = FOLLOW_UP_TOOLS[table_name]
+                result_package["sql"] = self.render_tool_call({"name": name, "arguments": {arg: subject}})
+            else:
+                result_package["sql"] = self.render_sql(self.query_for(table_name, subject))
+
+        result_package["follow_up"] = {"table": table_name, "subject": subject, "source": source}
+        result_package["row_count"] = len(rows)
+        if not rows:
+            result_package["raw_data"] = "[]"
+            result_package["answer"] = "No encontré información exacta."
+            result_package["outcome"] = "empty"
+            return True
+
+        result_text = render_rows(table_name, rows)
+        header = f"Sobre «{subject}»:" if subject else "Según lo anterior:"
+        result_package["raw_data"] = result_text
+        result_package["answer"] = f"{header}\n{result_text}"
+        self.context.remember(table_name, self.context.term or subject, rows)
+        return True
+
+    # ------------------------------------------------------------------
+    #  PREFIJOS EN CACHÉ
+    # ------------------------------------------------------------------
+    def _warm_prefixes(self, timings: Dict[str, float]) -> None:
+        """
+        Dejar los system prompts fijos en la caché KV de Ollama (una vez por
+        agente). Si falla se reintenta en la próxima pregunta.
+        """
+        if self._prefixes_warm:
+            return
+        prefixes = [("format", self.prompt_response_system)]
+        if self.mode == "sql":
+            prefixes.insert(0, ("sql_intent", self.prompt_sql_system))
+        try:
+            with timed_stage(timings, "warm"):
+                for name, system_prompt in prefixes:
+                    self.ollama_client.warm_prefix(name, system_prompt)
+        except LLMConnectionError:
+            return
+        self._prefixes_warm = True
+
     # ------------------------------------------------------------------
     #  FLUJO PRINCIPAL
     # ------------------------------------------------------------------
     def get_answer(self, question: str) -> Dict[str, Any]:
+        """
+        Responde `question` y devuelve el paquete de resultado.
+
+        Además de answer/sql/raw_data/error incluye:
+            - timings: milisegundos por etapa (health, sql_gen,
+              exec, parse, format, total; tool_call en modo "tools"; warm
+              la primera vez que se calientan los prefijos).
+            - llm_stats: contadores de Ollama por llamada al modelo, con
+              prefix_hit / prefix_tokens_saved para los prompts con prefijo fijo.
+            - request_id: id de la traza (y de la fila de historial_consultas).
+            - outcome: ok | empty | invalid | error | unavailable.
+            - follow_up: {table, subject, source} si se respondió como
+              seguimiento de la pregunta anterior sin llamar al modelo.
+            - model, row_count, error_class: modelo usado, filas obtenidas y
+              clase de la excepción (para historial_consultas).
+        """
         result_package = {
             "answer": "",
             "sql": "",
             "raw_data": "",
-            "error": None
+            "error": None,
+            "timings": {},
+            "llm_stats": {},
+            "request_id": None,
+            "outcome": "ok",
+            "follow_up": None,
+            "model": self.model_name,
+            "row_count": None,
+            "error_class": None,
         }
+        with start_trace("get_answer") as trace:
+            result_package["request_id"] = trace.request_id
+            with timed_stage(result_package["timings"], "total"):
+                self._run_pipeline(question, result_package)
+        QUESTIONS.inc(mode=self.mode, outcome=result_package["outcome"])
+        return result_package
+
+    def _run_pipeline(self, question: str, result_package: Dict[str, Any]) -> Dict[str, Any]:
+        timings = result_package["timings"]
 
-        if not self.ollama_client.is_available():
+        if self._answer_follow_up(question, result_package):
+            return result_package
+        # Pregunta nueva: el contexto se reemplaza sólo si hay respuesta
+        self.context.clear()
+
+        with timed_stage(timings, "health"):
+            available = self.ollama_client.is_available()
+        if not available:
             result_package["answer"] = "⚠️ Error: El servicio de IA (Ollama) no está disponible."
             result_package["error"] = "Ollama unavailable"
+            result_package["error_class"] = "LLMConnectionError"
+            result_package["outcome"] = "unavailable"
             return result_package
 
+        self._warm_prefixes(timings)
+
         try:
-            schema_info = self.db.get_table_info()
-            filled_prompt_sql = self.prompt_sql.format(
-                question=question,
-                schema=schema_info
-            )
+            if self.mode == "tools":
+                return self._answer_with_tools(question, result_package)
 
-            raw_generated = self.llm.invoke(filled_prompt_sql)
-            clean_query = self.clean_sql(raw_generated)
-            result_package["sql"] = clean_query
+            # El prompt no lleva el esquema: las tablas están en el system fijo
+            filled_prompt_sql = self.prompt_sql.format(question=question)
 
-            if not clean_query or "SELECT" not in clean_query.upper():
-                result_package["raw_data"] = "[]"
-                result_package["answer"] = "No pude generar una consulta válida para tu pregunta."
-                return result_package
+            with timed_stage(timings, "sql_gen"):
+                raw_generated = self.ollama_client.chat(
+                    [
+                        {"role": "system", "content": self.prompt_sql_system},
+                        {"role": "user", "content": filled_prompt_sql},
+                    ],
+                    temperature=0,
+                    format=SQL_INTENT_SCHEMA,
+                    num_predict=SQL_NUM_PREDICT,
+                    stop=SQL_STOP_SEQUENCES,
+                    prefix="sql_intent",
+                )
+            result_package["llm_stats"]["sql_gen"] = self.ollama_client.last_stats
+            intent = self.parse_intent(raw_generated)
+            query = self.query_for(*intent) if intent else None
+            if query is not None:
+                result_package["sql"] = self.render_sql(query)
+            else:
+                # Respaldo: el modelo devolvió texto libre en vez de JSON
+                query = self.clean_sql(raw_generated)
+                result_package["sql"] = query
+                if not query or "SELECT" not in query.upper():
+                    result_package["raw_data"] = "[]"
+                    result_package["answer"] = "No pude generar una consulta válida para tu pregunta."
+                    result_package["outcome"] = "invalid"
+                    return result_package
 
             # ---- EJECUCIÓN ----
             try:
-                db_result = self.db.run(clean_query)
+                with timed_stage(timings, "exec"):
+                    db_result = self._read_db().run(query)
             except Exception as db_err:
                 result_package["raw_data"] = f"Error ejecutando SQL: {str(db_err)}"
                 result_package["error"] = str(db_err)
+                result_package["error_class"] = type(db_err).__name__
                 result_package["answer"] = "Hubo un error técnico al consultar la base de datos."
+                result_package["outcome"] = "error"
                 return result_package
 
             # ---- DETECCIÓN DE LISTA VACÍA ----
-            try:
-                data = ast.literal_eval(db_result) if db_result else []
-            except Exception:
-                data = []
+            with timed_stage(timings, "parse"):
+                try:
+                    data = ast.literal_eval(db_result) if db_result else []
+                except Exception:
+                    data = []
+
+                # ---- CONVERSIÓN A TEXTO BONITO ----
+                if not data:
+                    result_text = ""
+                else:
+                    table_name = DIRECTORY_TABLE if len(data[0]) == 2 else LOCATION_TABLE
+                    result_text = render_rows(table_name, data)
 
+            result_package["row_count"] = len(data)
             if not data:                       # <-- aquí la prueba correcta
                 result_package["raw_data"] = "[]"
                 result_package["answer"] = "No encontré información exacta."
+                result_package["outcome"] = "empty"
                 return result_package
 
-            # ---- CONVERSIÓN A TEXTO BONITO ----
-            if len(data[0]) == 2:          # directorio_telefonico
-                result_text = "\n".join(f"• {name} - anexo {ext}" for name, ext in data)
-            else:                          # vista_ubicaciones_maestra
-                result_text = "\n".join(
-                    f"• {unit} está en {building}, {floor}"
-                    for unit, floor, building in data
-                )
-
             result_package["raw_data"] = result_text
+            self.context.remember(table_name, intent[1] if intent else None, data)
 
             # ---- FORMATO FINAL ----
-            filled_prompt_response = self.prompt_response.format(
-                question=question,
-                result=result_text
-            )
-            final_answer = self.llm.invoke(filled_prompt_response)
-            result_package["answer"] = final_answer
-            return result_package
+            return self._format_answer(question, result_text, result_package)
 
         except Exception as e:
             result_package["error"] = str(e)
+            result_package["error_class"] = type(e).__name__
             result_package["answer"] = "Lo siento, ocurrió un error inesperado al procesar tu solicitud."
+            result_package["outcome"] = "error"
             return result_package
 
     # ------------------------------------------------------------------
@@ -151,6 +555,14 @@ class RAGAgent:
             "sql": result.get("sql"),
             "raw_data": result.get("raw_data"),
             "final_answer": result.get("answer"),
-            "error": result.get("error")
+            "error": result.get("error"),
+            "timings": result.get("timings", {}),
+            "llm_stats": result.get("llm_stats", {}),
+            "request_id": result.get("request_id"),
+            "outcome": result.get("outcome"),
+            "follow_up": result.get("follow_up"),
+            "model": result.get("model"),
+            "row_count": result.get("row_count"),
+            "error_class": result.get("error_class"),
         }
         return result["answer"], debug_info
\ No newline at end of file
@@ -1,36 +1,56 @@
 """
 Application layer use cases for the Hospital Assistant.
 """
+import logging
 from typing import Optional
 from src.infrastructure.database import DatabaseManager, DATABASE_URL
 from src.infrastructure.repositories import SQLPatientRepository, SQLHospitalAreaRepository, SQLUserRepository
 from src.infrastructure.llm_client import OllamaClient
 from src.infrastructure.exceptions import LLMConnectionError, DatabaseConnectionError
-from src.infrastructure.security import verify_password
+from src.infrastructure.security import LOGIN_THROTTLE, hash_password, needs_rehash, verify_password
 from src.domain.entities import User
 from .rag_agent import RAGAgent
 
+logger = logging.getLogger("nexa.auth")
+
 class AuthUseCase:
     """
     Use case for user authentication.
     """
-    def __init__(self, database_uri: str = DATABASE_URL):
+    def __init__(self, database_uri: str = DATABASE_URL, throttle=LOGIN_THROTTLE):
         self.db_manager = DatabaseManager(database_uri)
         self.user_repo = SQLUserRepository(self.db_manager)
+        self.throttle = throttle
 
-    def login(self, email: str, password: str) -> Optional[User]:
+    def login(self, email: str, password: str, client_ip: Optional[str] = None) -> Optional[User]:
         """
         Validate user credentials and return User entity if successful.
+
+        Raises:
+            LoginThrottledError: la cuenta o la IP superaron los intentos permitidos.
         """
-        user = self.user_repo.get_user_by_email(email)
-        if not user or not user.is_active:
+        # Antes de tocar la base o bcrypt
+        self.throttle.check(email, client_ip)
+
+        # Usuario, rol y hash en un solo round-trip
+        record = self.user_repo.get_login_record(email)
+        user, hashed_password = record if record else (None, None)
+        if not user or not user.is_active or not hashed_password \
+                or not verify_password(password, hashed_password):
+            self.throttle.record_failure(email, client_ip)
             return None
-        
-        hashed_password = self.user_repo.get_password_hash(user.id)
-        if hashed_password and verify_password(password, hashed_password):
-            return user
-        
-        return None
+
+        self.throttle.record_success(email, client_ip)
+        if needs_rehash(hashed_password):
+            self._rehash(user, password)
+        return user
+
+    def _rehash(self, user: User, password: str) -> None:
+        """Actualizar el hash al costo actual; un fallo aquí no impide el login."""
+        try:
+            self.user_repo.update_password_hash(user.id, hash_password(password))
+        except Exception as e:
+            logger.warning("No se pudo actualizar el hash de %s: %s", user.email, e)
 
 class HospitalAssistantUseCase:
     """
@@ -39,3 +39,19 @@ class User(BaseModel):
     email: str
     role: UserRole
     is_active: bool = True
+
+class DirectoryEntry(BaseModel):
+    """
+    Entidad de dominio que representa un anexo del directorio telefónico.
+    """
+    name: str = Field(..., description="Person, office or unit the extension belongs to")
+    extension: int = Field(..., description="Phone extension number (anexo)")
+
+class UnitLocation(BaseModel):
+    """
+    Entidad de dominio que representa la ubicación física de una unidad.
+    """
+    unit_name: str = Field(..., description="Name of the hospital unit")
+    floor_name: Optional[str] = Field(None, description="Name of the floor (e.g., 'Piso 1')")
+    floor_level: int = Field(..., description="Floor level number (-1 for basement)")
+    building_name: str = Field(..., description="Name of the building")
@@ -1,5 +1,5 @@
-from .entities import Patient, HospitalArea, User
-from typing import Protocol, List, Optional
+from .entities import Patient, HospitalArea, User, DirectoryEntry, UnitLocation
+from typing import Protocol, List, Optional, Tuple
 
 class UserRepository(Protocol):
     """
@@ -17,6 +17,14 @@ class UserRepository(Protocol):
         """Retrieve the hashed password for a specific user."""
         ...
 
+    def get_login_record(self, email: str) -> Optional[Tuple[User, str]]:
+        """Retrieve a user and its password hash in a single lookup."""
+        ...
+
+    def update_password_hash(self, user_id: str, password_hash: str) -> None:
+        """Replace the stored password hash for a user."""
+        ...
+
 class PatientRepository(Protocol):
     """
     Interface for accessing Patient data.
@@ -44,3 +52,76 @@ class HospitalAreaRepository(Protocol):
     def get_area_by_name(self, name: str) -> Optional[HospitalArea]:
         """Retrieve a specific area by its name."""
         ...
+
+class DirectoryRepository(Protocol):
+    """
+    Interface for the lookups exposed to the assistant as tools.
+    """
+    def search_directory(self, name: str, limit: int = 5) -> List[DirectoryEntry]:
+        """Find phone extensions by person/office name (partial, accent-insensitive)."""
+        ...
+
+    def find_location(self, unit_name: str, limit: int = 5) -> List[UnitLocation]:
+        """Find where a hospital unit is (building and floor)."""
+        ...
+
+    def list_units_on_floor(self, floor_level: int, building: Optional[str] = None,
+                            limit: int = 50) -> List[UnitLocation]:
+        """List the units located on a floor, optionally within one building."""
+        ...
+
+class AsyncUserRepository(Protocol):
+    """
+    Async interface for accessing User data (same methods as UserRepository).
+    """
+    async def get_user_by_email(self, email: str) -> Optional[User]:
+        ...
+
+    async def get_user_by_rut(self, rut: str) -> Optional[User]:
+        ...
+
+    async def get_password_hash(self, user_id: str) -> Optional[str]:
+        ...
+
+    async def get_login_record(self, email: str) -> Optional[Tuple[User, str]]:
+        ...
+
+    async def update_password_hash(self, user_id: str, password_hash: str) -> None:
+        ...
+
+class AsyncPatientRepository(Protocol):
+    """
+    Async interface for accessing Patient data (same methods as PatientRepository).
+    """
+    async def get_patient_by_id(self, id: int) -> Optional[Patient]:
+        ...
+
+    async def search_patients_by_name(self, name: str) -> List[Patient]:
+        ...
+
+    async def get_patients_by_status(self, status: str) -> List[Patient]:
+        ...
+
+class AsyncHospitalAreaRepository(Protocol):
+    """
+    Async interface for accessing Hospital Area data (same methods as HospitalAreaRepository).
+    """
+    async def get_all_areas(self) -> List[HospitalArea]:
+        ...
+
+    async def get_area_by_name(self, name: str) -> Optional[HospitalArea]:
+        ...
+
+class AsyncDirectoryRepository(Protocol):
+    """
+    Async interface for the directory lookups (same methods as DirectoryRepository).
+    """
+    async def search_directory(self, name: str, limit: int = 5) -> List[DirectoryEntry]:
+        ...
+
+    async def find_location(self, unit_name: str, limit: int = 5) -> List[UnitLocation]:
+        ...
+
+    async def list_units_on_floor(self, floor_level: int, building: Optional[str] = None,
+                                  limit: int = 50) -> List[UnitLocation]:
+        ...
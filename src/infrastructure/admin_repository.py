@@ -1,42 +1,722 @@
 # src/infrastructure/admin_repository.py
-import bcrypt
-from sqlalchemy import text
+import base64
+import hashlib
+import functools
+import json
+import logging
+import math
+import operator
+import os
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import (
+    DateTime, and_, bindparam, case, column, func, literal_column, or_, select, table,
+    text, tuple_,
+)
 from sqlalchemy.exc import IntegrityError
-from src.infrastructure.database import engine, DatabaseManager
+from src.infrastructure.database import DatabaseManager, get_read_engine
+from src.infrastructure.directory_import import (
+    ImportResult, clean_directory_rows, import_directory, read_directory_file
+)
+from src.infrastructure.metrics import instrumented, record_cache
+from src.infrastructure.models import BuildingModel, DirectoryModel, FloorModel, RoleModel, UnitModel, UserModel
+from src.infrastructure.repositories import forget_unknown_email, unaccent_ilike
+from src.infrastructure.security import hash_password as _hash_password
 
-def _hash_password(plain: str) -> str:
-    salt = bcrypt.gensalt()
-    return bcrypt.hashpw(plain.encode("utf-8"), salt).decode("utf-8")
+logger = logging.getLogger("nexa.audit")
 
+# ----------------------------------------------------------------------
+# Consultas de lectura (compartidas con AsyncAdminRepository)
+# ----------------------------------------------------------------------
+USERS_QUERY = text(
+    """
+    SELECT u.id, u.rut, u.nombre_completo, u.email,
+           r.id AS rol_id, r.nombre_rol, r.descripcion
+    FROM usuarios u
+    LEFT JOIN roles r ON u.rol_id = r.id
+    ORDER BY u.nombre_completo;
+    """
+)
+ROLES_QUERY = text("SELECT * FROM roles ORDER BY nombre_rol;")
+EDIFICIOS_QUERY = text("SELECT * FROM edificios ORDER BY nombre_edificio;")
+ALL_EDIFICIOS_QUERY = text("SELECT id, nombre_edificio FROM edificios ORDER BY nombre_edificio;")
+PISOS_QUERY = text("""
+    SELECT p.id, p.nivel_numero, p.nombre_piso,
+           e.id AS edificio_id, e.nombre_edificio
+    FROM pisos p
+    JOIN edificios e ON p.edificio_id = e.id
+    ORDER BY e.nombre_edificio, p.nivel_numero;
+""")
+UNIDADES_QUERY = text("""
+    SELECT u.id, u.nombre_unidad, u.tipo_servicio,
+           p.id AS piso_id, p.nivel_numero, e.id AS edificio_id,
+           e.nombre_edificio
+    FROM unidades_hospitalarias u
+    JOIN pisos p ON u.piso_id = p.id
+    JOIN edificios e ON p.edificio_id = e.id
+    ORDER BY e.nombre_edificio, p.nivel_numero, u.nombre_unidad;
+""")
+DIRECTORIO_QUERY = text(
+    "SELECT id, numero_anexo, nombre_referencia FROM directorio_telefonico ORDER BY numero_anexo;"
+)
+LOGS_QUERY = text("""
+    SELECT h.id, h.fecha, u.nombre_completo AS usuario,
+           h.pregunta, h.respuesta
+    FROM historial_consultas h
+    LEFT JOIN usuarios u ON h.usuario_id = u.id
+    ORDER BY h.fecha DESC
+    LIMIT :lim;
+""")
+INSERT_INTERACTION_SQL = text("""
+    INSERT INTO historial_consultas (
+        id, usuario_id, pregunta, respuesta, fecha,
+        sql_generado, sql_fingerprint, modelo, duraciones_ms, duracion_total_ms,
+        tokens_prompt, tokens_respuesta, filas, cache_hit, resultado, error_clase
+    )
+    VALUES (
+        :id, :uid, :preg, :resp, :fecha,
+        :sql, :fingerprint, :modelo, :duraciones, :total_ms,
+        :tokens_prompt, :tokens_respuesta, :filas, :cache_hit, :resultado, :error_clase
+    );
+""")
+
+# Literales de texto y números sueltos (no los que forman parte de un identificador)
+_SQL_STRING = re.compile(r"'(?:[^']|'')*'")
+_SQL_NUMBER = re.compile(r"(?<![\w.])[-+]?\d+(?:\.\d+)?\b")
+_SQL_VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Forma normalizada de una consulta: literales -> ?, listas IN (?, ?) -> (?),
+    espacios colapsados y minúsculas. Dos preguntas que sólo difieren en el
+    término buscado producen el mismo texto.
+    """
+    normalized = _SQL_NUMBER.sub("?", _SQL_STRING.sub("?", sql))
+    normalized = _SQL_VALUE_LIST.sub("(?)", normalized)
+    return " ".join(normalized.split()).rstrip(";").strip().lower()
+
+
+def sql_fingerprint(sql: str | None) -> str | None:
+    """Huella corta (16 hex) de normalize_sql(sql); None si no hubo consulta."""
+    if not sql or not sql.strip():
+        return None
+    return hashlib.sha1(normalize_sql(sql).encode("utf-8")).hexdigest()[:16]
+
+
+def _sum_stat(llm_stats: dict, key: str) -> int | None:
+    values = [stats.get(key) for stats in llm_stats.values() if stats]
+    values = [v for v in values if v is not None]
+    return int(sum(values)) if values else None
+
+
+def performance_params(result: dict | None) -> dict:
+    """
+    Columnas de rendimiento de historial_consultas a partir del paquete de
+    RAGAgent.get_answer (o del debug_info de query_with_debug).
+
+    cache_hit: True si se respondió desde el contexto de la conversación, o si
+    todas las llamadas al modelo reutilizaron el prefijo en caché; None si no
+    hay datos.
+    """
+    result = result or {}
+    sql = result.get("sql") or None
+    timings = result.get("timings") or {}
+    llm_stats = result.get("llm_stats") or {}
+
+    if result.get("follow_up"):
+        cache_hit = True
+    else:
+        hits = [stats.get("prefix_hit") for stats in llm_stats.values() if stats]
+        hits = [h for h in hits if h is not None]
+        cache_hit = all(hits) if hits else None
+
+    return {
+        "sql": sql[:10000] if sql else None,
+        "fingerprint": sql_fingerprint(sql),
+        "modelo": result.get("model"),
+        "duraciones": json.dumps({k: round(v, 3) for k, v in timings.items()}) if timings else None,
+        "total_ms": timings.get("total"),
+        "tokens_prompt": _sum_stat(llm_stats, "prompt_eval_count"),
+        "tokens_respuesta": _sum_stat(llm_stats, "eval_count"),
+        "filas": result.get("row_count"),
+        "cache_hit": cache_hit,
+        "resultado": result.get("outcome"),
+        "error_clase": result.get("error_class"),
+    }
+
+
+def interaction_params(usuario_id: str, pregunta: str, respuesta: str,
+                       request_id: str | None = None, result: dict | None = None) -> dict | None:
+    """
+    Parámetros de INSERT_INTERACTION_SQL, o None si no se debe guardar
+    (usuario invitado). `result` es el paquete de get_answer (ver
+    performance_params); sin él las columnas de rendimiento quedan en NULL.
+    """
+    if not usuario_id:
+        # Los invitados no dejan historial
+        return None
+    return {
+        # Reuse the trace request_id, or generate a new UUID
+        "id": request_id or (result or {}).get("request_id") or str(uuid.uuid4()),
+        "uid": usuario_id,
+        # Truncate for safety (prevent abuse)
+        "preg": (pregunta or "")[:2000],
+        "resp": (respuesta or "")[:10000],
+        "fecha": datetime.now(timezone.utc),
+        **performance_params(result),
+    }
+
+# ----------------------------------------------------------------------
+# 🗄️ Retención del historial (particiones mensuales en PostgreSQL,
+# ver database/08_historial_partitions.sql)
+# ----------------------------------------------------------------------
+# Meses completos de historial que se conservan además del actual (0 = sin límite)
+HISTORIAL_RETENTION_MONTHS = int(os.getenv("NEXA_HISTORIAL_RETENTION_MONTHS", "12"))
+# Particiones futuras que se crean por adelantado
+HISTORIAL_MONTHS_AHEAD = int(os.getenv("NEXA_HISTORIAL_MONTHS_AHEAD", "3"))
+
+
+def retention_cutoff(keep_months: int, today: date | None = None) -> date:
+    """Primer día del mes más antiguo que se conserva."""
+    today = today or date.today()
+    months = today.year * 12 + today.month - 1 - keep_months
+    return date(months // 12, months % 12 + 1, 1)
+
+# ----------------------------------------------------------------------
+# 📄 Listados paginados por keyset
+# ----------------------------------------------------------------------
+# Tamaño máximo de página aceptado por los get_*_page
+MAX_PAGE_SIZE = 500
+
+HISTORIAL = table(
+    "historial_consultas",
+    column("id"), column("usuario_id"), column("pregunta"), column("respuesta"),
+    column("fecha", DateTime),
+    column("sql_generado"), column("sql_fingerprint"), column("modelo"),
+    column("duraciones_ms"), column("duracion_total_ms"), column("tokens_prompt"), column("tokens_respuesta"),
+    column("filas"), column("cache_hit"), column("resultado"), column("error_clase"),
+)
+
+
+@dataclass
+class Page:
+    """
+    Una página de un listado.
+
+    Attributes:
+        items: filas de la página (dicts, mismas columnas que el get_* completo).
+        next_cursor: token para pedir la página siguiente; None si es la última.
+    """
+    items: List[dict]
+    next_cursor: Optional[str] = None
+
+
+# ----------------------------------------------------------------------
+# 📈 Resumen por hora del historial (database/10_historial_rollups.sql)
+# ----------------------------------------------------------------------
+# Las filas más recientes que esto no se resumen todavía. La `fecha` se fija al
+# encolar, así que el margen debe superar la espera máxima de una fila en el
+# AuditWriter (NEXA_AUDIT_FLUSH_MS en régimen normal; con la base caída el lote
+# se reintenta y la cola espera hasta que vuelva, así que tras una caída larga
+# sí llegan filas atrasadas). Esa espera se mide en nexa_audit_delay_seconds; una
+# fila que la supere llega detrás de la marca de agua, no entra al resumen y
+# late_rollup_rows() la reporta.
+ROLLUP_LAG_S = float(os.getenv("NEXA_AUDIT_ROLLUP_LAG_S", "60"))
+# Cada cuánto, como mucho, el Panel de Control actualiza el resumen
+ROLLUP_REFRESH_INTERVAL_S = float(os.getenv("NEXA_AUDIT_ROLLUP_INTERVAL_S", "60"))
+
+ROLLUP = table(
+    "historial_resumen_hora",
+    column("hora", DateTime), column("sql_fingerprint"), column("consultas"),
+    column("errores"), column("vacias"), column("aciertos_cache"), column("medidas"),
+    column("duracion_total_ms"), column("duracion_max_ms"),
+    column("tokens_prompt"), column("tokens_respuesta"), column("pregunta_ejemplo"),
+)
+ROLLUP_WATERMARK = table(
+    "historial_resumen_marca",
+    column("nombre"), column("procesado_hasta", DateTime),
+)
+
+# Última actualización del resumen en este proceso, por URL de base
+_ROLLUP_REFRESHED: Dict[str, float] = {}
+
+# ----------------------------------------------------------------------
+# 📦 Guardado masivo
+# ----------------------------------------------------------------------
+@dataclass
+class BulkResult:
+    """
+    Resultado de un save_many_* / delete_many_*.
+
+    Attributes:
+        saved: filas aplicadas.
+        errors: índice de la fila (en la lista recibida) -> mensaje de error.
+    """
+    saved: int = 0
+    errors: Dict[int, str] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+
+def _clean(value):
+    """Valores de una fila del editor (NaN de pandas -> None, numpy -> Python)."""
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if hasattr(value, "item") and not isinstance(value, (str, bytes)):
+        return _clean(value.item())
+    return value
+
+
+def _row(row: dict, *columns: str) -> dict:
+    """
+    Columnas de `row` a guardar (sólo las que trae: el editor manda la clave
+    y lo que cambió); el id sólo si viene (None = fila nueva).
+    """
+    params = {col: _clean(row[col]) for col in columns if col in row}
+    if _clean(row.get("id")) is not None:
+        params["id"] = _clean(row["id"])
+    return params
+
+
+def _integrity_message(e: IntegrityError, messages: Dict[str, str]) -> str:
+    """Primer mensaje cuya columna aparece en el error, o el genérico."""
+    error_msg = str(e.orig).lower()
+    for col, message in messages.items():
+        if col in error_msg:
+            return message
+    return f"❌ Error de integridad: {e.orig}"
+
+
+# ----------------------------------------------------------------------
+# 🗂️ Caché de datos de referencia
+# ----------------------------------------------------------------------
+# Antigüedad máxima de una entrada (cubre escrituras hechas fuera del proceso,
+# p. ej. cargar_anexos.py); las escrituras locales la invalidan al instante.
+REFERENCE_CACHE_TTL_S = float(os.getenv("NEXA_ADMIN_REFERENCE_TTL_S", "300"))
+
+
+class ReferenceCache:
+    """
+    Listados de referencia del Panel (roles, edificios, pisos, unidades) por
+    proceso, compartidos entre sesiones de Streamlit.
+
+    Cada tabla tiene un contador de versión por base de datos; toda escritura
+    de AdminRepository lo incrementa (ver _writes). Una entrada se guarda con
+    las versiones de sus tablas al momento de cargarla y deja de servirse en
+    cuanto alguna cambia, así una escritura local nunca deja datos viejos.
+    """
+
+    def __init__(self, ttl_s: float = REFERENCE_CACHE_TTL_S, clock=time.monotonic):
+        self.ttl_s = ttl_s
+        self.clock = clock
+        self._versions: Dict[Tuple[str, str], int] = {}
+        self._entries: Dict[Tuple[str, str], Tuple[Tuple[int, ...], float, List[dict]]] = {}
+        self._lock = threading.Lock()
+
+    def version(self, db: str, table: str) -> int:
+        return self._versions.get((db, table), 0)
+
+    def bump(self, db: str, *tables: str) -> None:
+        """Invalidar las entradas que dependen de `tables`."""
+        with self._lock:
+            for table in tables:
+                self._versions[(db, table)] = self.version(db, table) + 1
+
+    def get_or_load(self, db: str, name: str, tables: Tuple[str, ...], loader) -> List[dict]:
+        """Filas de `name`; llama a `loader()` si no hay entrada vigente."""
+        versions = tuple(self.version(db, t) for t in tables)
+        entry = self._entries.get((db, name))
+        if entry and entry[0] == versions and self.clock() - entry[1] < self.ttl_s:
+            record_cache("admin_reference", hit=True)
+            return [dict(row) for row in entry[2]]
+
+        record_cache("admin_reference", hit=False)
+        # Versiones leídas antes de cargar: si otra escritura llega mientras
+        # tanto, esta entrada ya nace vencida.
+        rows = loader()
+        with self._lock:
+            self._entries[(db, name)] = (versions, self.clock(), rows)
+        return [dict(row) for row in rows]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+
+# Caché del proceso (lo usan todas las instancias de AdminRepository)
+REFERENCE_CACHE = ReferenceCache()
+
+
+def _writes(*tables: str):
+    """Método de escritura: al terminar (aunque falle a medias) invalida `tables`."""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self.reference_cache.bump(self.db_manager.database_uri, *tables)
+        return wrapper
+    return decorator
+
+
+class KeysetListing:
+    """
+    Listado ordenado por (claves de orden..., id) y paginado por keyset:
+    la página siguiente empieza con `WHERE (orden, id) > (última fila)`, que
+    el índice resuelve sin recorrer ni descartar las filas anteriores (a
+    diferencia de OFFSET).
+
+    Args:
+        query: SELECT del listado (sin WHERE ni ORDER BY).
+        sorts: nombre del orden -> columnas del SELECT que lo forman.
+        default_sort: orden por defecto.
+        search: columnas donde buscar (ILIKE sin tildes, índices trigram).
+        filters: filtro -> columna comparada por igualdad, o (columna, operador).
+    """
+
+    def __init__(self, query, sorts: Dict[str, Tuple[str, ...]], default_sort: str,
+                 search: Tuple = (), filters: Dict[str, Any] | None = None):
+        self.query = query
+        self.sorts = sorts
+        self.default_sort = default_sort
+        self.search = search
+        self.filters = filters or {}
+
+    def _sort_columns(self, sort: str) -> List[str]:
+        if sort not in self.sorts:
+            raise ValueError(f"❌ Orden no soportado: {sort!r} (opciones: {', '.join(self.sorts)})")
+        return [*self.sorts[sort], "id"]
+
+    @staticmethod
+    def _fingerprint(sort: str, descending: bool, search, filters: dict) -> str:
+        state = json.dumps([sort, descending, search, sorted(filters.items())], default=str)
+        return hashlib.sha1(state.encode("utf-8")).hexdigest()[:12]
+
+    @staticmethod
+    def _encode_value(value):
+        return {"$dt": value.isoformat(" ")} if isinstance(value, datetime) else value
+
+    @staticmethod
+    def _decode_value(value):
+        return datetime.fromisoformat(value["$dt"]) if isinstance(value, dict) else value
+
+    def statement(self, limit: int, cursor: str | None = None, sort: str | None = None,
+                  descending: bool = False, search: str | None = None,
+                  filters: dict | None = None):
+        """SELECT de una página (pide limit + 1 filas para saber si hay más)."""
+        sort = sort or self.default_sort
+        names = self._sort_columns(sort)
+        filters = {k: v for k, v in (filters or {}).items() if v is not None}
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        columns = self.query.selected_columns
+
+        stmt = self.query
+        if search and search.strip():
+            term = search.strip()
+            stmt = stmt.where(or_(*(unaccent_ilike(col, term) for col in self.search)))
+        for name, value in filters.items():
+            if name not in self.filters:
+                raise ValueError(f"❌ Filtro no soportado: {name!r}")
+            target = self.filters[name]
+            if isinstance(target, tuple):
+                col, op = target
+                stmt = stmt.where(op(col, value))
+            else:
+                stmt = stmt.where(target == value)
+
+        # El cursor sólo vale para el mismo orden, búsqueda y filtros
+        fingerprint = self._fingerprint(sort, descending, search, filters)
+        if cursor:
+            try:
+                state = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+                after = [self._decode_value(v) for v in state["k"]]
+            except (ValueError, KeyError, TypeError):
+                raise ValueError("❌ Cursor de paginación inválido.")
+            if state.get("f") != fingerprint or len(after) != len(names):
+                raise ValueError("❌ El cursor no corresponde a este orden o filtro.")
+            keys = tuple_(*(columns[n] for n in names))
+            stmt = stmt.where(keys < tuple_(*after) if descending else keys > tuple_(*after))
+
+        order = [columns[n].desc() if descending else columns[n].asc() for n in names]
+        return stmt.order_by(*order).limit(limit + 1), limit, names, fingerprint
+
+    def page(self, rows, limit: int, names: List[str], fingerprint: str) -> Page:
+        """Page con las primeras `limit` filas y el cursor de la siguiente."""
+        items = [dict(row._mapping) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = items[-1]
+            state = {"k": [self._encode_value(last[n]) for n in names], "f": fingerprint}
+            next_cursor = base64.urlsafe_b64encode(json.dumps(state).encode("utf-8")).decode("ascii")
+        return Page(items=items, next_cursor=next_cursor)
+
+
+LISTINGS = {
+    "usuarios": KeysetListing(
+        select(
+            UserModel.id, UserModel.rut, UserModel.nombre_completo, UserModel.email,
+            RoleModel.id.label("rol_id"), RoleModel.nombre_rol, RoleModel.descripcion,
+        ).select_from(UserModel).outerjoin(RoleModel, UserModel.rol_id == RoleModel.id),
+        sorts={"nombre": ("nombre_completo",), "email": ("email",), "rut": ("rut",)},
+        default_sort="nombre",
+        search=(UserModel.nombre_completo, UserModel.email, UserModel.rut),
+        filters={"rol_id": UserModel.rol_id},
+    ),
+    "pisos": KeysetListing(
+        select(
+            FloorModel.id, FloorModel.nivel_numero, FloorModel.nombre_piso,
+            BuildingModel.id.label("edificio_id"), BuildingModel.nombre_edificio,
+        ).select_from(FloorModel).join(BuildingModel, FloorModel.edificio_id == BuildingModel.id),
+        sorts={"edificio": ("nombre_edificio", "nivel_numero"), "nivel": ("nivel_numero",)},
+        default_sort="edificio",
+        search=(FloorModel.nombre_piso, BuildingModel.nombre_edificio),
+        filters={"edificio_id": FloorModel.edificio_id, "nivel_numero": FloorModel.nivel_numero},
+    ),
+    "unidades": KeysetListing(
+        select(
+            UnitModel.id, UnitModel.nombre_unidad, UnitModel.tipo_servicio,
+            FloorModel.id.label("piso_id"), FloorModel.nivel_numero,
+            BuildingModel.id.label("edificio_id"), BuildingModel.nombre_edificio,
+        ).select_from(UnitModel)
+        .join(FloorModel, UnitModel.piso_id == FloorModel.id)
+        .join(BuildingModel, FloorModel.edificio_id == BuildingModel.id),
+        sorts={
+            "ubicacion": ("nombre_edificio", "nivel_numero", "nombre_unidad"),
+            "nombre": ("nombre_unidad",),
+        },
+        default_sort="ubicacion",
+        search=(UnitModel.nombre_unidad, UnitModel.tipo_servicio),
+        filters={
+            "piso_id": UnitModel.piso_id,
+            "edificio_id": FloorModel.edificio_id,
+            "tipo_servicio": UnitModel.tipo_servicio,
+        },
+    ),
+    "directorio": KeysetListing(
+        select(DirectoryModel.id, DirectoryModel.numero_anexo, DirectoryModel.nombre_referencia),
+        sorts={"anexo": ("numero_anexo",), "nombre": ("nombre_referencia",)},
+        default_sort="anexo",
+        search=(DirectoryModel.nombre_referencia,),
+        filters={"unidad_id": DirectoryModel.unidad_id, "numero_anexo": DirectoryModel.numero_anexo},
+    ),
+    "historial": KeysetListing(
+        select(
+            HISTORIAL.c.id, HISTORIAL.c.fecha, UserModel.nombre_completo.label("usuario"),
+            HISTORIAL.c.pregunta, HISTORIAL.c.respuesta,
+            HISTORIAL.c.duracion_total_ms, HISTORIAL.c.resultado,
+        ).select_from(HISTORIAL).outerjoin(UserModel, HISTORIAL.c.usuario_id == UserModel.id),
+        sorts={"fecha": ("fecha",)},
+        default_sort="fecha",
+        search=(HISTORIAL.c.pregunta, UserModel.nombre_completo),
+        filters={
+            "usuario_id": HISTORIAL.c.usuario_id,
+            "desde": (HISTORIAL.c.fecha, operator.ge),
+            "hasta": (HISTORIAL.c.fecha, operator.lt),
+        },
+    ),
+}
+
+
+@instrumented("admin")
 class AdminRepository:
     """
     Repositorio unificado para gestionar todas las entidades del sistema.
     CORRECCIÓN: Uso de row._mapping para compatibilidad con SQLAlchemy 2.0+
     """
 
-    def __init__(self, db_manager: DatabaseManager | None = None):
+    def __init__(self, db_manager: DatabaseManager | None = None,
+                 reference_cache: ReferenceCache | None = None):
         self.db_manager = db_manager or DatabaseManager()
-        self.engine = engine
+        self.reference_cache = reference_cache or REFERENCE_CACHE
+        # Engine compartido del proceso (mismo pool que RAGAgent y DatabaseManager).
+        # Escrituras (save_*, delete_*, log_interaction) siempre al primario.
+        self.engine = self.db_manager.engine
+
+    def _read_engine(self):
+        """Engine para los listados get_*: una réplica al día si hay."""
+        return get_read_engine(self.db_manager.database_uri)
+
+    def _reference(self, name: str, query, tables: Tuple[str, ...]) -> List[dict]:
+        """
+        Listado de referencia desde REFERENCE_CACHE. Se carga desde el
+        primario: una réplica atrasada podría guardar datos previos a la
+        escritura que acaba de invalidar la entrada.
+        """
+        def load():
+            with self.engine.connect() as conn:
+                return [dict(row._mapping) for row in conn.execute(query).fetchall()]
+        return self.reference_cache.get_or_load(self.db_manager.database_uri, name, tables, load)
+
+    def _page(self, listing: str, limit: int, cursor: str | None, sort: str | None,
+              descending: bool, search: str | None, filters: dict | None = None) -> Page:
+        spec = LISTINGS[listing]
+        stmt, limit, names, fingerprint = spec.statement(
+            limit, cursor, sort, descending, search, filters
+        )
+        with self._read_engine().connect() as conn:
+            rows = conn.execute(stmt).fetchall()
+        return spec.page(rows, limit, names, fingerprint)
+
+    def _bulk_statement(self, table, columns):
+        """
+        Sentencia para un grupo de filas con las mismas `columns`:
+
+        - sin id: INSERT;
+        - con id y todas las columnas obligatorias: INSERT ... ON CONFLICT (id)
+          DO UPDATE, que sólo actualiza `columns`;
+        - con id y sólo algunas columnas (cambios parciales del editor):
+          UPDATE ... WHERE id = :_id, que no exige las columnas NOT NULL.
+
+        Returns:
+            (sentencia, función que adapta los parámetros de cada fila).
+        """
+        required = {
+            col.name for col in table.columns
+            if not col.nullable and not col.primary_key
+            and col.default is None and col.server_default is None
+        }
+        if "id" in columns and not required <= set(columns):
+            stmt = table.update().where(table.c.id == bindparam("_id")).values(
+                {col: bindparam(col) for col in columns if col != "id"}
+            )
+            return stmt, lambda params: {
+                **{k: v for k, v in params.items() if k != "id"}, "_id": params["id"]
+            }
+        return self._upsert(table, columns), lambda params: params
+
+    def _upsert(self, table, columns):
+        """INSERT (sin id) o INSERT ... ON CONFLICT (id) DO UPDATE de `columns`."""
+        if self.engine.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table)
+        if "id" not in columns:
+            return stmt
+        return stmt.on_conflict_do_update(
+            index_elements=[table.c.id],
+            set_={col: stmt.excluded[col] for col in columns if col != "id"},
+        )
+
+    def _save_many(self, table, rows: List[dict], prepare, messages: Dict[str, str],
+                   missing_message: str = "❌ Error: El registro {id} no existe.") -> BulkResult:
+        """
+        Guardar `rows` en una sola transacción.
+
+        Las filas se agrupan por columnas y cada grupo va en un solo
+        executemany (ver _bulk_statement). Si un grupo choca con
+        una restricción, se reintenta fila por fila dentro de SAVEPOINTs para
+        informar cuáles fallan sin descartar el resto del lote. Un UPDATE que
+        no encuentra su id (borrado entretanto) se informa con `missing_message`.
+
+        Args:
+            table: tabla destino.
+            rows: filas recibidas (dicts con los nombres de columna).
+            prepare: fila -> parámetros; lanza ValueError si la fila no es válida.
+            messages: columna -> mensaje cuando un IntegrityError la menciona.
+            missing_message: mensaje para un id inexistente ({id}).
+        """
+        result = BulkResult()
+        groups: Dict[Tuple[str, ...], List[Tuple[int, dict]]] = {}
+        for index, row in enumerate(rows):
+            try:
+                params = prepare(row)
+            except ValueError as e:
+                result.errors[index] = str(e)
+                continue
+            groups.setdefault(tuple(sorted(params)), []).append((index, params))
+        if not groups:
+            return result
+
+        with self.engine.begin() as conn:
+            for columns, items in groups.items():
+                stmt, to_params = self._bulk_statement(table, columns)
+                # Sin rowcount fiable en executemany (psycopg2) los UPDATE van fila
+                # por fila: es la única forma de ver qué id ya no existe
+                if not stmt.is_update or conn.dialect.supports_sane_multi_rowcount:
+                    try:
+                        with conn.begin_nested():
+                            count = conn.execute(stmt, [to_params(params) for _, params in items]).rowcount
+                        if not stmt.is_update or count == len(items):
+                            result.saved += len(items)
+                            continue
+                    except IntegrityError:
+                        pass
+                # Aislar las filas que violan restricciones o cuyo id no existe
+                # (repetir un UPDATE ya aplicado no cambia nada)
+                for index, params in items:
+                    try:
+                        with conn.begin_nested():
+                            count = conn.execute(stmt, to_params(params)).rowcount
+                    except IntegrityError as e:
+                        result.errors[index] = _integrity_message(e, messages)
+                        continue
+                    if stmt.is_update and not count:
+                        result.errors[index] = missing_message.format(id=params["id"])
+                    else:
+                        result.saved += 1
+        return result
+
+    def _delete_many(self, table, ids: List[Any], fk_message: str) -> BulkResult:
+        """
+        Borrar `ids` en una transacción con un solo DELETE ... WHERE id IN (...).
+
+        Si algún id sigue referenciado (FK), se reintenta id por id dentro de
+        SAVEPOINTs: los que se pueden borrar se borran y los referenciados se
+        informan en BulkResult.errors (índice en `ids` -> `fk_message`).
+        """
+        ids = [_clean(i) for i in ids]
+        result = BulkResult()
+        if not ids:
+            return result
+
+        # IN con parámetros expandidos y no = ANY(ARRAY[...]): el array tomaría el
+        # tipo del modelo (usuarios.id es String en el ORM pero UUID en la base)
+        # y PostgreSQL no tiene operador uuid = text
+        batch = table.delete().where(table.c.id.in_(ids))
+        single = table.delete().where(table.c.id == bindparam("id"))
+
+        with self.engine.begin() as conn:
+            try:
+                with conn.begin_nested():
+                    result.saved = conn.execute(batch).rowcount
+                return result
+            except IntegrityError:
+                pass
+            # Aislar los ids que siguen referenciados
+            for index, record_id in enumerate(ids):
+                try:
+                    with conn.begin_nested():
+                        result.saved += conn.execute(single, {"id": record_id}).rowcount
+                except IntegrityError:
+                    result.errors[index] = fk_message
+        return result
 
     # ------------------------------------------------------------------
     # 1️⃣ Usuarios
     # ------------------------------------------------------------------
     def get_users(self):
-        with self.engine.connect() as conn:
-            rows = conn.execute(
-                text(
-                    """
-                    SELECT u.id, u.rut, u.nombre_completo, u.email,
-                           r.id AS rol_id, r.nombre_rol, r.descripcion
-                    FROM usuarios u
-                    LEFT JOIN roles r ON u.rol_id = r.id
-                    ORDER BY u.nombre_completo;
-                    """
-                )
-            ).fetchall()
+        with self._read_engine().connect() as conn:
+            rows = conn.execute(USERS_QUERY).fetchall()
             # CORRECCIÓN AQUÍ: ._mapping
             return [dict(row._mapping) for row in rows]
 
+    def get_users_page(self, limit: int = 50, cursor: str | None = None, search: str | None = None,
+                       rol_id: int | None = None, sort: str = "nombre", descending: bool = False) -> Page:
+        """Usuarios paginados; `search` busca en nombre, email y RUT."""
+        return self._page("usuarios", limit, cursor, sort, descending, search, {"rol_id": rol_id})
+
+    @_writes("usuarios")
     def save_user(self, id: int | None = None, rut: str = None, nombre_completo: str = None, email: str = None,
                   password: str | None = None, rol_id: int = None):
         """Guardar o actualizar usuario con validación de duplicados y soporte para ID."""
@@ -77,6 +757,8 @@ class AdminRepository:
                         ),
                         {"rut": rut, "nombre": nombre_completo, "email": email, "pwd": hashed, "rol": rol_id},
                     )
+            # El email puede estar en la caché negativa del login
+            forget_unknown_email(email)
         except IntegrityError as e:
             error_msg = str(e.orig).lower()
             if 'rut' in error_msg and 'unique' in error_msg:
@@ -86,18 +768,52 @@ class AdminRepository:
             else:
                 raise ValueError(f"❌ Error de integridad: {str(e)}")
 
+    @_writes("usuarios")
+    def save_many_users(self, rows: List[dict]) -> BulkResult:
+        """
+        Guardar varios usuarios en una transacción (ver _save_many). Las filas
+        con `password` la cambian; sin ella se conserva el hash actual: con id
+        y sin password_hash la fila es un UPDATE (ver _bulk_statement), y si
+        el usuario ya no existe se informa como error en vez de insertarlo.
+        """
+        def prepare(row):
+            params = _row(row, "rut", "nombre_completo", "email", "rol_id")
+            params["activo"] = True
+            password = row.get("password")
+            if password:
+                params["password_hash"] = _hash_password(password)
+            elif "id" not in params:
+                raise ValueError("La contraseña es obligatoria para usuarios nuevos.")
+            return params
+
+        result = self._save_many(UserModel.__table__, rows, prepare, {
+            "rut": "❌ Error: El RUT ya está registrado en el sistema.",
+            "email": "❌ Error: El email ya está en uso.",
+        }, missing_message="❌ Error: El usuario {id} no existe.")
+        for row in rows:
+            if row.get("email"):
+                forget_unknown_email(row["email"])
+        return result
+
+    @_writes("usuarios")
     def delete_user(self, user_id: str):
         with self.engine.begin() as conn:
             conn.execute(text("DELETE FROM usuarios WHERE id = :uid;"), {"uid": user_id})
 
+    @_writes("usuarios")
+    def delete_many_users(self, ids: List[str]) -> BulkResult:
+        """Borrar varios usuarios en una transacción (ver _delete_many)."""
+        return self._delete_many(
+            UserModel.__table__, ids, "❌ No se puede eliminar: el usuario tiene registros asociados."
+        )
+
     # ------------------------------------------------------------------
     # 2️⃣ Roles
     # ------------------------------------------------------------------
     def get_roles(self):
-        with self.engine.connect() as conn:
-            rows = conn.execute(text("SELECT * FROM roles ORDER BY nombre_rol;")).fetchall()
-            return [dict(row._mapping) for row in rows] # CORRECCIÓN
+        return self._reference("roles", ROLES_QUERY, ("roles",))
 
+    @_writes("roles")
     def save_role(self, id: int = None, nombre_rol: str = None, descripcion: str = None):
         """Guardar o actualizar rol usando ID como clave primaria."""
         try:
@@ -119,11 +835,21 @@ class AdminRepository:
                 raise ValueError(f"❌ Error: El rol '{nombre_rol}' ya existe.")
             raise ValueError(f"❌ Error de integridad: {str(e)}")
     
+    @_writes("roles")
+    def save_many_roles(self, rows: List[dict]) -> BulkResult:
+        """Guardar varios roles en una transacción (ver _save_many)."""
+        return self._save_many(
+            RoleModel.__table__, rows,
+            lambda row: _row(row, "nombre_rol", "descripcion"),
+            {"nombre_rol": "❌ Error: El rol ya existe."},
+        )
+
     # Alias for backward compatibility
     def create_role(self, nombre_rol: str, descripcion: str | None = None):
         """Alias para save_role (sin ID = INSERT)."""
         return self.save_role(id=None, nombre_rol=nombre_rol, descripcion=descripcion)
     
+    @_writes("roles")
     def delete_role(self, role_id: int):
         """Eliminar un rol. Verificar que no tenga usuarios asignados."""
         try:
@@ -132,22 +858,24 @@ class AdminRepository:
         except IntegrityError:
             raise ValueError("❌ No se puede eliminar: hay usuarios asignados a este rol.")
 
+    @_writes("roles")
+    def delete_many_roles(self, ids: List[int]) -> BulkResult:
+        """Borrar varios roles en una transacción (ver _delete_many)."""
+        return self._delete_many(
+            RoleModel.__table__, ids, "❌ No se puede eliminar: hay usuarios asignados a este rol."
+        )
+
     # ------------------------------------------------------------------
     # 3️⃣ Topología
     # ------------------------------------------------------------------
     def get_edificios(self):
-        with self.engine.connect() as conn:
-            rows = conn.execute(text("SELECT * FROM edificios ORDER BY nombre_edificio;")).fetchall()
-            return [dict(row._mapping) for row in rows] # CORRECCIÓN
+        return self._reference("edificios", EDIFICIOS_QUERY, ("edificios",))
 
     def get_all_edificios(self):
         """Obtener todos los edificios para dropdowns (sin JOIN)."""
-        with self.engine.connect() as conn:
-            rows = conn.execute(
-                text("SELECT id, nombre_edificio FROM edificios ORDER BY nombre_edificio;")
-            ).fetchall()
-            return [dict(row._mapping) for row in rows]
+        return self._reference("all_edificios", ALL_EDIFICIOS_QUERY, ("edificios",))
 
+    @_writes("edificios")
     def save_edificio(self, id: int = None, nombre_edificio: str = None, codigo_interno: str = None):
         """
         Guardar o actualizar edificio usando ID como clave primaria.
@@ -176,6 +904,17 @@ class AdminRepository:
                 raise ValueError(f"❌ Error: El código '{codigo_interno}' ya está en uso.")
             raise ValueError(f"❌ Error de integridad: {str(e)}")
     
+    @_writes("edificios")
+    def save_many_edificios(self, rows: List[dict]) -> BulkResult:
+        """Guardar varios edificios en una transacción (ver _save_many)."""
+        return self._save_many(
+            BuildingModel.__table__, rows,
+            lambda row: _row(row, "nombre_edificio", "codigo_interno"),
+            {"codigo_interno": "❌ Error: El código ya está en uso."},
+        )
+
+    # ON DELETE CASCADE: borrar un edificio borra sus pisos y unidades
+    @_writes("edificios", "pisos", "unidades_hospitalarias")
     def delete_edificio(self, edificio_id: int):
         """
         Eliminar un edificio. Verificar que no tenga pisos asociados.
@@ -190,19 +929,24 @@ class AdminRepository:
         except IntegrityError:
             raise ValueError("❌ No se puede eliminar: hay pisos asociados a este edificio.")
 
+    @_writes("edificios", "pisos", "unidades_hospitalarias")
+    def delete_many_edificios(self, ids: List[int]) -> BulkResult:
+        """Borrar varios edificios en una transacción (ver _delete_many)."""
+        return self._delete_many(
+            BuildingModel.__table__, ids, "❌ No se puede eliminar: hay pisos asociados a este edificio."
+        )
+
     def get_pisos(self):
-        with self.engine.connect() as conn:
-            rows = conn.execute(
-                text("""
-                    SELECT p.id, p.nivel_numero, p.nombre_piso,
-                           e.id AS edificio_id, e.nombre_edificio
-                    FROM pisos p
-                    JOIN edificios e ON p.edificio_id = e.id
-                    ORDER BY e.nombre_edificio, p.nivel_numero;
-                """)
-            ).fetchall()
-            return [dict(row._mapping) for row in rows] # CORRECCIÓN
+        return self._reference("pisos", PISOS_QUERY, ("pisos", "edificios"))
+
+    def get_pisos_page(self, limit: int = 50, cursor: str | None = None, search: str | None = None,
+                       edificio_id: int | None = None, nivel_numero: int | None = None,
+                       sort: str = "edificio", descending: bool = False) -> Page:
+        """Pisos paginados; `search` busca en el nombre del piso y del edificio."""
+        return self._page("pisos", limit, cursor, sort, descending, search,
+                          {"edificio_id": edificio_id, "nivel_numero": nivel_numero})
 
+    @_writes("pisos")
     def save_piso(self, id: int = None, nombre_piso: str = None, nivel_numero: int = None, edificio_id: int = None):
         """Guardar o actualizar piso usando ID como clave primaria."""
         try:
@@ -222,6 +966,16 @@ class AdminRepository:
         except IntegrityError as e:
             raise ValueError(f"❌ Error: Ya existe un piso con nivel {nivel_numero} en este edificio.")
     
+    @_writes("pisos")
+    def save_many_pisos(self, rows: List[dict]) -> BulkResult:
+        """Guardar varios pisos en una transacción (ver _save_many)."""
+        return self._save_many(
+            FloorModel.__table__, rows,
+            lambda row: _row(row, "nombre_piso", "nivel_numero", "edificio_id"),
+            {"nivel_numero": "❌ Error: Ya existe un piso con ese nivel en este edificio."},
+        )
+
+    @_writes("pisos", "unidades_hospitalarias")
     def delete_piso(self, piso_id: int):
         """Eliminar un piso. Verificar que no tenga unidades asociadas."""
         try:
@@ -230,21 +984,28 @@ class AdminRepository:
         except IntegrityError:
             raise ValueError("❌ No se puede eliminar: hay unidades hospitalarias en este piso.")
 
+    @_writes("pisos", "unidades_hospitalarias")
+    def delete_many_pisos(self, ids: List[int]) -> BulkResult:
+        """Borrar varios pisos en una transacción (ver _delete_many)."""
+        return self._delete_many(
+            FloorModel.__table__, ids, "❌ No se puede eliminar: hay unidades hospitalarias en este piso."
+        )
+
     def get_unidades(self):
-        with self.engine.connect() as conn:
-            rows = conn.execute(
-                text("""
-                    SELECT u.id, u.nombre_unidad, u.tipo_servicio,
-                           p.id AS piso_id, p.nivel_numero, e.id AS edificio_id,
-                           e.nombre_edificio
-                    FROM unidades_hospitalarias u
-                    JOIN pisos p ON u.piso_id = p.id
-                    JOIN edificios e ON p.edificio_id = e.id
-                    ORDER BY e.nombre_edificio, p.nivel_numero, u.nombre_unidad;
-                """)
-            ).fetchall()
-            return [dict(row._mapping) for row in rows] # CORRECCIÓN
+        return self._reference(
+            "unidades", UNIDADES_QUERY, ("unidades_hospitalarias", "pisos", "edificios")
+        )
+
+    def get_unidades_page(self, limit: int = 50, cursor: str | None = None, search: str | None = None,
+                          piso_id: int | None = None, edificio_id: int | None = None,
+                          tipo_servicio: str | None = None, sort: str = "ubicacion",
+                          descending: bool = False) -> Page:
+        """Unidades paginadas; `search` busca en el nombre y el tipo de servicio."""
+        return self._page("unidades", limit, cursor, sort, descending, search, {
+            "piso_id": piso_id, "edificio_id": edificio_id, "tipo_servicio": tipo_servicio,
+        })
 
+    @_writes("unidades_hospitalarias")
     def save_unidad(self, id: int = None, nombre_unidad: str = None, tipo_servicio: str = None, piso_id: int = None):
         """Guardar o actualizar unidad usando ID como clave primaria."""
         try:
@@ -264,19 +1025,54 @@ class AdminRepository:
         except IntegrityError as e:
             raise ValueError(f"❌ Error: La unidad '{nombre_unidad}' ya existe en este piso.")
     
+    @_writes("unidades_hospitalarias")
+    def save_many_unidades(self, rows: List[dict]) -> BulkResult:
+        """Guardar varias unidades en una transacción (ver _save_many)."""
+        def prepare(row):
+            params = _row(row, "nombre_unidad", "tipo_servicio", "piso_id")
+            if "nombre_unidad" in params and not (params["nombre_unidad"] or "").strip():
+                raise ValueError("El nombre de la unidad no puede estar vacío.")
+            return params
+
+        return self._save_many(UnitModel.__table__, rows, prepare, {
+            "nombre_unidad": "❌ Error: La unidad ya existe en este piso.",
+        })
+
+    @_writes("unidades_hospitalarias")
     def delete_unidad(self, unidad_id: int):
         """Eliminar una unidad hospitalaria."""
         with self.engine.begin() as conn:
             conn.execute(text("DELETE FROM unidades_hospitalarias WHERE id = :uid;"), {"uid": unidad_id})
 
+    @_writes("unidades_hospitalarias")
+    def delete_many_unidades(self, ids: List[int]) -> BulkResult:
+        """Borrar varias unidades en una transacción (ver _delete_many)."""
+        return self._delete_many(
+            UnitModel.__table__, ids, "❌ No se puede eliminar: la unidad tiene contactos del directorio asociados."
+        )
+
     # ------------------------------------------------------------------
     # 4️⃣ Directorio
     # ------------------------------------------------------------------
     def get_directorio(self):
-        with self.engine.connect() as conn:
-            rows = conn.execute(text("SELECT id, numero_anexo, nombre_referencia FROM directorio_telefonico ORDER BY numero_anexo;")).fetchall()
+        with self._read_engine().connect() as conn:
+            rows = conn.execute(DIRECTORIO_QUERY).fetchall()
             return [dict(row._mapping) for row in rows] # CORRECCIÓN
 
+    def get_directorio_page(self, limit: int = 50, cursor: str | None = None, search: str | None = None,
+                            unidad_id: int | None = None, sort: str = "anexo",
+                            descending: bool = False) -> Page:
+        """
+        Directorio paginado. `search` busca sin tildes en el nombre; si es
+        un número, filtra por ese anexo.
+        """
+        filters = {"unidad_id": unidad_id}
+        if search and search.strip().isdigit():
+            filters["numero_anexo"] = int(search.strip())
+            search = None
+        return self._page("directorio", limit, cursor, sort, descending, search, filters)
+
+    @_writes("directorio_telefonico")
     def save_contacto(self, id: int = None, nombre_referencia: str = None, numero_anexo: int = None):
         """Guardar o actualizar contacto usando ID como clave primaria."""
         try:
@@ -298,15 +1094,54 @@ class AdminRepository:
                 raise ValueError(f"❌ Error: El anexo {numero_anexo} ya está asignado.")
             raise ValueError(f"❌ Error de integridad: {str(e)}")
     
+    @_writes("directorio_telefonico")
+    def save_many_contactos(self, rows: List[dict]) -> BulkResult:
+        """Guardar varios contactos del directorio en una transacción (ver _save_many)."""
+        def prepare(row):
+            params = _row(row, "nombre_referencia", "numero_anexo")
+            if "nombre_referencia" in params and not (params["nombre_referencia"] or "").strip():
+                raise ValueError("El nombre/referencia no puede estar vacío.")
+            if "numero_anexo" in params:
+                try:
+                    params["numero_anexo"] = int(params["numero_anexo"])
+                except (TypeError, ValueError):
+                    raise ValueError("El anexo debe ser un número.")
+            return params
+
+        return self._save_many(DirectoryModel.__table__, rows, prepare, {
+            "numero_anexo": "❌ Error: El anexo ya está asignado.",
+        })
+
+    @_writes("directorio_telefonico")
+    def import_directorio(self, *paths, dry_run: bool = False) -> ImportResult:
+        """
+        Sincronizar el directorio con uno o más archivos (.csv / .xlsx) con
+        columnas ANEXO y DISPLAY, aplicando sólo las diferencias por
+        numero_anexo (ver directory_import). Si un anexo aparece en varios
+        archivos gana el último.
+        """
+        pairs = (pair for path in paths for pair in read_directory_file(path))
+        entries, skipped = clean_directory_rows(pairs)
+        return import_directory(self.engine, entries, skipped, dry_run=dry_run)
+
+    @_writes("directorio_telefonico")
     def delete_contacto(self, contacto_id: int):
         """Eliminar un contacto del directorio telefónico."""
         with self.engine.begin() as conn:
             conn.execute(text("DELETE FROM directorio_telefonico WHERE id = :cid;"), {"cid": contacto_id})
 
+    @_writes("directorio_telefonico")
+    def delete_many_contactos(self, ids: List[int]) -> BulkResult:
+        """Borrar varios contactos del directorio en una transacción (ver _delete_many)."""
+        return self._delete_many(
+            DirectoryModel.__table__, ids, "❌ No se puede eliminar: el contacto está referenciado."
+        )
+
     # ------------------------------------------------------------------
     # 5️⃣ Auditoría
     # ------------------------------------------------------------------
-    def log_interaction(self, usuario_id: str, pregunta: str, respuesta: str):
+    def log_interaction(self, usuario_id: str, pregunta: str, respuesta: str,
+                        request_id: str | None = None, result: dict | None = None):
         """
         Registrar interacción del chatbot en historial.
         
@@ -314,53 +1149,234 @@ class AdminRepository:
             usuario_id: UUID del usuario (puede ser None para invitados)
             pregunta: Pregunta del usuario (se truncará a 2000 chars)
             respuesta: Respuesta del AI (se truncará a 10000 chars)
+            request_id: request_id de la traza de la pregunta; se usa como id
+                        de la fila para poder cruzarla con la traza.
+            result: paquete de get_answer (SQL, tiempos, tokens...), opcional.
         """
-        import uuid
-        from datetime import datetime
-        
         try:
-            # Generate new UUID for this interaction
-            new_id = str(uuid.uuid4())
-            
-            # Truncate for safety (prevent abuse)
-            safe_pregunta = (pregunta or "")[:2000]
-            safe_respuesta = (respuesta or "")[:10000]
-            
             # Handle None usuario_id (guest users)
-            if not usuario_id:
-                print("⚠️ No se guardó historial: usuario_id es None (invitado)")
+            params = interaction_params(usuario_id, pregunta, respuesta, request_id, result)
+            if params is None:
                 return
             
             with self.engine.begin() as conn:
-                conn.execute(
-                    text("""
-                        INSERT INTO historial_consultas (id, usuario_id, pregunta, respuesta, fecha)
-                        VALUES (:id, :uid, :preg, :resp, :fecha);
-                    """),
-                    {
-                        "id": new_id,
-                        "uid": usuario_id,
-                        "preg": safe_pregunta,
-                        "resp": safe_respuesta,
-                        "fecha": datetime.now()
-                    },
-                )
+                conn.execute(INSERT_INTERACTION_SQL, params)
         except Exception as e:
             # No fallar el chatbot si falla el logging
-            print(f"⚠️ Error al guardar historial: {e}")
+            logger.warning("Error al guardar historial: %s", e)
+
+    def enqueue_interaction(self, usuario_id: str, pregunta: str, respuesta: str,
+                            request_id: str | None = None, result: dict | None = None) -> bool:
+        """
+        Como log_interaction, pero sin esperar a la base: encola la fila en el
+        AuditWriter del proceso, que la escribe en lote desde otro hilo.
+
+        Returns:
+            False si no se guardará (invitado o cola llena).
+        """
+        from src.infrastructure.audit_writer import get_audit_writer
+        return get_audit_writer(self.db_manager.database_uri).submit(
+            usuario_id, pregunta, respuesta, request_id, result
+        )
 
 
     def get_logs(self, limit: int = 100):
+        with self._read_engine().connect() as conn:
+            rows = conn.execute(LOGS_QUERY, {"lim": limit}).fetchall()
+            return [dict(row._mapping) for row in rows] # CORRECCIÓN
+
+    def get_logs_page(self, limit: int = 50, cursor: str | None = None, search: str | None = None,
+                      usuario_id: str | None = None, desde: datetime | None = None,
+                      hasta: datetime | None = None, descending: bool = True) -> Page:
+        """Historial paginado, del más reciente al más antiguo por defecto."""
+        return self._page("historial", limit, cursor, "fecha", descending, search,
+                          {"usuario_id": usuario_id, "desde": desde, "hasta": hasta})
+
+    def maintain_logs(self, keep_months: int = HISTORIAL_RETENTION_MONTHS,
+                      months_ahead: int = HISTORIAL_MONTHS_AHEAD, drop: bool = False,
+                      today: date | None = None) -> dict:
+        """
+        Mantenimiento periódico del historial (mantener_historial.py).
+
+        En PostgreSQL crea las particiones de los próximos `months_ahead` meses y
+        retira (DETACH, o DROP si `drop`) las anteriores al corte; en otras bases
+        borra las filas anteriores al corte.
+
+        Returns:
+            {"partitions": particiones vigentes, "retired": retiradas, "cutoff": corte}
+        """
+        cutoff = retention_cutoff(keep_months, today) if keep_months > 0 else None
+        result = {"partitions": [], "retired": [], "cutoff": cutoff}
+        with self.engine.begin() as conn:
+            if self.engine.dialect.name != "postgresql":
+                if cutoff is not None:
+                    conn.execute(HISTORIAL.delete().where(HISTORIAL.c.fecha < cutoff))
+                return result
+            result["partitions"] = list(conn.execute(
+                text("SELECT nexa_historial_crear_particiones(:n)"), {"n": months_ahead}
+            ).scalars())
+            if cutoff is not None:
+                result["retired"] = list(conn.execute(
+                    text("SELECT nexa_historial_retencion(:corte, :borrar)"),
+                    {"corte": cutoff, "borrar": drop},
+                ).scalars())
+        return result
+
+    def refresh_rollups(self, now: datetime | None = None, max_age_s: float = 0) -> int | None:
+        """
+        Sumar al resumen por hora (historial_resumen_hora) las filas del
+        historial posteriores a la marca de agua, y avanzar la marca.
+
+        Sólo lee las filas nuevas: el costo depende de lo ocurrido desde la
+        última ejecución, no del tamaño del historial. El resumen sobrevive a
+        la retención de particiones.
+
+        Args:
+            now: hora de referencia (tests); por defecto la actual (UTC).
+            max_age_s: no hacer nada si este proceso ya actualizó hace menos.
+
+        Returns:
+            Filas del historial resumidas, o None si se omitió por max_age_s.
+        """
+        url = self.db_manager.database_uri
+        if max_age_s and time.monotonic() - _ROLLUP_REFRESHED.get(url, float("-inf")) < max_age_s:
+            return None
+        upper = (now or datetime.now(timezone.utc)) - timedelta(seconds=ROLLUP_LAG_S)
+        postgres = self.engine.dialect.name == "postgresql"
+        if postgres:
+            from sqlalchemy.dialects.postgresql import insert
+            # Literales (no parámetros): el GROUP BY debe repetir la misma expresión
+            hour = func.date_trunc(literal_column("'hour'"), HISTORIAL.c.fecha)
+            greatest = func.greatest
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+            hour = func.strftime(literal_column("'%Y-%m-%d %H:00:00.000000'"), HISTORIAL.c.fecha)
+            greatest = func.max
+
+        with self.engine.begin() as conn:
+            conn.execute(insert(ROLLUP_WATERMARK).values(nombre="hora", procesado_hasta=None)
+                         .on_conflict_do_nothing(index_elements=["nombre"]))
+            # FOR UPDATE: dos procesos no suman las mismas filas
+            mark_query = select(ROLLUP_WATERMARK.c.procesado_hasta).where(
+                ROLLUP_WATERMARK.c.nombre == "hora"
+            )
+            lower = conn.execute(mark_query.with_for_update() if postgres else mark_query).scalar()
+            if lower is not None and lower >= upper:
+                return 0
+
+            window = HISTORIAL.c.fecha <= upper
+            if lower is not None:
+                window = and_(HISTORIAL.c.fecha > lower, window)
+            count = lambda condition: func.sum(case((condition, 1), else_=0))
+            fingerprint = func.coalesce(HISTORIAL.c.sql_fingerprint, literal_column("''"))
+            new_rows = select(
+                hour.label("hora"),
+                fingerprint.label("sql_fingerprint"),
+                func.count().label("consultas"),
+                count(HISTORIAL.c.resultado.in_(("error", "unavailable"))).label("errores"),
+                count(HISTORIAL.c.resultado == "empty").label("vacias"),
+                count(HISTORIAL.c.cache_hit.is_(True)).label("aciertos_cache"),
+                count(HISTORIAL.c.duracion_total_ms.is_not(None)).label("medidas"),
+                func.coalesce(func.sum(HISTORIAL.c.duracion_total_ms), 0).label("duracion_total_ms"),
+                func.max(HISTORIAL.c.duracion_total_ms).label("duracion_max_ms"),
+                func.coalesce(func.sum(HISTORIAL.c.tokens_prompt), 0).label("tokens_prompt"),
+                func.coalesce(func.sum(HISTORIAL.c.tokens_respuesta), 0).label("tokens_respuesta"),
+                func.min(HISTORIAL.c.pregunta).label("pregunta_ejemplo"),
+            ).where(window).group_by(hour, fingerprint)
+
+            names = [c.name for c in ROLLUP.columns]
+            stmt = insert(ROLLUP).from_select(names, new_rows)
+            added = ("consultas", "errores", "vacias", "aciertos_cache", "medidas",
+                     "duracion_total_ms", "tokens_prompt", "tokens_respuesta")
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["hora", "sql_fingerprint"],
+                set_={
+                    **{name: ROLLUP.c[name] + stmt.excluded[name] for name in added},
+                    "duracion_max_ms": func.coalesce(
+                        greatest(ROLLUP.c.duracion_max_ms, stmt.excluded.duracion_max_ms),
+                        stmt.excluded.duracion_max_ms, ROLLUP.c.duracion_max_ms,
+                    ),
+                    "pregunta_ejemplo": func.coalesce(
+                        ROLLUP.c.pregunta_ejemplo, stmt.excluded.pregunta_ejemplo
+                    ),
+                },
+            )
+            processed = conn.execute(select(func.count()).select_from(HISTORIAL).where(window)).scalar()
+            conn.execute(stmt)
+            conn.execute(ROLLUP_WATERMARK.update()
+                         .where(ROLLUP_WATERMARK.c.nombre == "hora")
+                         .values(procesado_hasta=upper))
+        _ROLLUP_REFRESHED[url] = time.monotonic()
+        return processed
+
+    def late_rollup_rows(self, hours: int = 24) -> int:
+        """
+        Filas del historial que llegaron detrás de la marca de agua y por lo
+        tanto no están en el resumen, en las `hours` horas previas a la marca.
+
+        Compara, hora por hora hasta la marca, lo que hay en historial_consultas
+        con lo sumado en historial_resumen_hora: la diferencia son filas que el
+        AuditWriter escribió con más de ROLLUP_LAG_S de atraso.
+        """
         with self.engine.connect() as conn:
-            rows = conn.execute(
-                text("""
-                    SELECT h.id, h.fecha, u.nombre_completo AS usuario,
-                           h.pregunta, h.respuesta
-                    FROM historial_consultas h
-                    LEFT JOIN usuarios u ON h.usuario_id = u.id
-                    ORDER BY h.fecha DESC
-                    LIMIT :lim;
-                """),
-                {"lim": limit},
-            ).fetchall()
-            return [dict(row._mapping) for row in rows] # CORRECCIÓN
\ No newline at end of file
+            upper = conn.execute(select(ROLLUP_WATERMARK.c.procesado_hasta).where(
+                ROLLUP_WATERMARK.c.nombre == "hora"
+            )).scalar()
+            if upper is None:
+                return 0
+            lower = (upper - timedelta(hours=hours)).replace(minute=0, second=0, microsecond=0)
+            stored = conn.execute(select(func.count()).select_from(HISTORIAL).where(
+                HISTORIAL.c.fecha >= lower, HISTORIAL.c.fecha <= upper
+            )).scalar()
+            summed = conn.execute(select(func.coalesce(func.sum(ROLLUP.c.consultas), 0)).where(
+                ROLLUP.c.hora >= lower, ROLLUP.c.hora <= upper
+            )).scalar()
+        return max(0, int(stored) - int(summed))
+
+    def get_audit_summary(self, hours: int = 24 * 7, shapes: int = 10,
+                          now: datetime | None = None) -> dict:
+        """
+        Indicadores del tab Auditoría, leídos sólo del resumen por hora.
+
+        "shapes" agrupa por forma de consulta (sql_fingerprint): normalize_sql
+        quita el término buscado, así que todas las búsquedas de anexo son una
+        sola forma. No son las preguntas más frecuentes; pregunta_ejemplo es
+        sólo una pregunta de muestra de esa forma.
+
+        Returns:
+            {"hourly": [{hora, consultas, errores, vacias, aciertos_cache, promedio_ms}],
+             "shapes": [{sql_fingerprint, pregunta_ejemplo, consultas, errores,
+                         promedio_ms, max_ms}],
+             "totals": {consultas, errores, vacias, aciertos_cache, tasa_error}}
+        """
+        since = (now or datetime.now(timezone.utc)) - timedelta(hours=hours)
+        in_window = ROLLUP.c.hora >= since
+        average = (func.sum(ROLLUP.c.duracion_total_ms)
+                   / func.nullif(func.sum(ROLLUP.c.medidas), 0)).label("promedio_ms")
+        hourly = select(
+            ROLLUP.c.hora,
+            func.sum(ROLLUP.c.consultas).label("consultas"),
+            func.sum(ROLLUP.c.errores).label("errores"),
+            func.sum(ROLLUP.c.vacias).label("vacias"),
+            func.sum(ROLLUP.c.aciertos_cache).label("aciertos_cache"),
+            average,
+        ).where(in_window).group_by(ROLLUP.c.hora).order_by(ROLLUP.c.hora)
+        by_shape = select(
+            ROLLUP.c.sql_fingerprint,
+            func.min(ROLLUP.c.pregunta_ejemplo).label("pregunta_ejemplo"),
+            func.sum(ROLLUP.c.consultas).label("consultas"),
+            func.sum(ROLLUP.c.errores).label("errores"),
+            average,
+            func.max(ROLLUP.c.duracion_max_ms).label("max_ms"),
+        ).where(in_window).group_by(ROLLUP.c.sql_fingerprint).order_by(
+            func.sum(ROLLUP.c.consultas).desc(), ROLLUP.c.sql_fingerprint
+        ).limit(shapes)
+
+        with self._read_engine().connect() as conn:
+            hourly_rows = [dict(r._mapping) for r in conn.execute(hourly)]
+            shape_rows = [dict(r._mapping) for r in conn.execute(by_shape)]
+
+        totals = {key: int(sum(r[key] or 0 for r in hourly_rows))
+                  for key in ("consultas", "errores", "vacias", "aciertos_cache")}
+        totals["tasa_error"] = totals["errores"] / totals["consultas"] if totals["consultas"] else 0.0
+        return {"hourly": hourly_rows, "shapes": shape_rows, "totals": totals}
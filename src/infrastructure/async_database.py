@@ -0,0 +1,116 @@
+"""
+Engine y sesiones asíncronas (SQLAlchemy asyncio) para servidores con event loop.
+
+Mismo esquema que database.py: un engine por URL en todo el proceso, con el
+pool configurado por las variables NEXA_DB_*, y una sesión nueva por
+operación. Requiere un driver asíncrono (asyncpg para PostgreSQL, aiosqlite
+para SQLite) y greenlet:
+
+    pip install -e ".[async]"
+"""
+import os
+import threading
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+
+from .database import (
+    DATABASE_URL,
+    DB_APPLICATION_NAME,
+    DB_CONNECT_TIMEOUT,
+    DB_MAX_OVERFLOW,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+)
+
+# Drivers asíncronos por backend
+ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+
+def to_async_url(url: str) -> str:
+    """`postgresql+psycopg2://...` -> `postgresql+asyncpg://...` (idem SQLite)."""
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No hay driver asíncrono configurado para {parsed.get_backend_name()!r}")
+    return parsed.set(drivername=f"{parsed.get_backend_name()}+{driver}").render_as_string(
+        hide_password=False
+    )
+
+
+ASYNC_DATABASE_URL = os.getenv("NEXA_DB_ASYNC_URL") or to_async_url(DATABASE_URL)
+
+_ASYNC_ENGINES: Dict[str, AsyncEngine] = {}
+_ASYNC_ENGINES_LOCK = threading.Lock()
+
+
+def _async_engine_options(url: str) -> dict:
+    backend = make_url(url).get_backend_name()
+    if backend == "sqlite":
+        return {}
+    options = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    if backend == "postgresql":
+        # asyncpg no entiende los parámetros de libpq
+        options["connect_args"] = {
+            "server_settings": {"application_name": DB_APPLICATION_NAME},
+            "timeout": DB_CONNECT_TIMEOUT,
+        }
+    return options
+
+
+def get_async_engine(url: str = ASYNC_DATABASE_URL) -> AsyncEngine:
+    """
+    AsyncEngine compartido para `url`. Una URL síncrona (psycopg2/pysqlite)
+    se traduce a su driver asíncrono.
+    """
+    parsed = make_url(url)
+    if parsed.get_driver_name() not in ASYNC_DRIVERS.values():
+        url = to_async_url(url)
+    key = str(url)
+    engine = _ASYNC_ENGINES.get(key)
+    if engine is None:
+        with _ASYNC_ENGINES_LOCK:
+            engine = _ASYNC_ENGINES.get(key)
+            if engine is None:
+                engine = create_async_engine(key, **_async_engine_options(key))
+                _ASYNC_ENGINES[key] = engine
+    return engine
+
+
+class AsyncDatabaseManager:
+    """
+    Fábrica de sesiones asíncronas: `async with db.get_session() as session:`
+    usa una sesión nueva, hace commit al salir, rollback si falla y la cierra.
+    """
+
+    def __init__(self, database_uri: str = ASYNC_DATABASE_URL):
+        self.engine = get_async_engine(database_uri)
+        # expire_on_commit=False: los objetos siguen legibles tras el commit
+        # (en asyncio no hay carga perezosa implícita).
+        self.session_factory = async_sessionmaker(
+            self.engine, autoflush=False, expire_on_commit=False
+        )
+
+    @asynccontextmanager
+    async def get_session(self) -> AsyncIterator[AsyncSession]:
+        async with self.session_factory() as session:
+            try:
+                yield session
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                raise
+
+    async def dispose(self) -> None:
+        """Cerrar las conexiones del pool (al apagar el servidor)."""
+        await self.engine.dispose()
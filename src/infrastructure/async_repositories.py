@@ -0,0 +1,230 @@
+"""
+Async counterparts of the SQLAlchemy repositories (SQLAlchemy asyncio).
+
+Same queries and entity mapping as repositories.py / admin_repository.py,
+awaited on an AsyncDatabaseManager so an event-loop server can run login,
+directory and topology reads concurrently over one pool.
+"""
+import logging
+from typing import List, Optional, Tuple
+from sqlalchemy import func, select, update
+from src.domain.entities import Patient, HospitalArea, User, DirectoryEntry, UnitLocation
+from .admin_repository import (
+    ALL_EDIFICIOS_QUERY,
+    DIRECTORIO_QUERY,
+    EDIFICIOS_QUERY,
+    INSERT_INTERACTION_SQL,
+    LISTINGS,
+    LOGS_QUERY,
+    PISOS_QUERY,
+    ROLES_QUERY,
+    UNIDADES_QUERY,
+    USERS_QUERY,
+    Page,
+    interaction_params,
+)
+from .async_database import AsyncDatabaseManager
+from .metrics import instrumented
+from .models import (
+    PatientModel, HospitalAreaModel, UserModel,
+    BuildingModel, FloorModel, UnitModel, DirectoryModel,
+)
+from .repositories import (
+    SQLDirectoryRepository, SQLHospitalAreaRepository, SQLPatientRepository,
+    SQLUserRepository, unaccent_ilike,
+)
+
+logger = logging.getLogger("nexa.audit")
+
+class AsyncSQLUserRepository:
+    """
+    Async SQLAlchemy implementation of AsyncUserRepository.
+    """
+    def __init__(self, db_manager: AsyncDatabaseManager):
+        self.db_manager = db_manager
+
+    async def _get_user(self, *criteria) -> Optional[User]:
+        async with self.db_manager.get_session() as session:
+            # El rol se carga en el mismo JOIN: en asyncio no hay lazy load
+            model = (await session.execute(
+                SQLUserRepository._user_query().where(*criteria).limit(1)
+            )).scalar_one_or_none()
+            return SQLUserRepository._model_to_entity(model) if model else None
+
+    async def get_user_by_email(self, email: str) -> Optional[User]:
+        return await self._get_user(UserModel.email == email)
+
+    async def get_user_by_rut(self, rut: str) -> Optional[User]:
+        return await self._get_user(UserModel.rut == rut)
+
+    async def get_login_record(self, email: str) -> Optional[Tuple[User, str]]:
+        """Usuario y hash en una consulta (sin la caché negativa del repositorio síncrono)."""
+        async with self.db_manager.get_session() as session:
+            model = (await session.execute(
+                SQLUserRepository._user_query().where(UserModel.email == email).limit(1)
+            )).scalar_one_or_none()
+            return (SQLUserRepository._model_to_entity(model), model.password_hash) if model else None
+
+    async def get_password_hash(self, user_id: str) -> Optional[str]:
+        async with self.db_manager.get_session() as session:
+            return (await session.execute(
+                select(UserModel.password_hash).where(UserModel.id == user_id)
+            )).scalar_one_or_none()
+
+    async def update_password_hash(self, user_id: str, password_hash: str) -> None:
+        async with self.db_manager.get_session() as session:
+            await session.execute(
+                update(UserModel).where(UserModel.id == user_id).values(password_hash=password_hash)
+            )
+
+class AsyncSQLPatientRepository:
+    """
+    Async SQLAlchemy implementation of AsyncPatientRepository.
+    """
+    def __init__(self, db_manager: AsyncDatabaseManager):
+        self.db_manager = db_manager
+
+    async def _fetch(self, query) -> List[Patient]:
+        async with self.db_manager.get_session() as session:
+            models = (await session.execute(query)).scalars().all()
+            return [SQLPatientRepository._model_to_entity(model) for model in models]
+
+    async def get_patient_by_id(self, id: int) -> Optional[Patient]:
+        patients = await self._fetch(select(PatientModel).where(PatientModel.id == id).limit(1))
+        return patients[0] if patients else None
+
+    async def search_patients_by_name(self, name: str) -> List[Patient]:
+        return await self._fetch(
+            select(PatientModel).where(PatientModel.nombre_completo.ilike(f"%{name}%"))
+        )
+
+    async def get_patients_by_status(self, status: str) -> List[Patient]:
+        return await self._fetch(select(PatientModel).where(PatientModel.estado == status))
+
+class AsyncSQLHospitalAreaRepository:
+    """
+    Async SQLAlchemy implementation of AsyncHospitalAreaRepository.
+    """
+    def __init__(self, db_manager: AsyncDatabaseManager):
+        self.db_manager = db_manager
+
+    async def _fetch(self, query) -> List[HospitalArea]:
+        async with self.db_manager.get_session() as session:
+            models = (await session.execute(query)).scalars().all()
+            return [SQLHospitalAreaRepository._model_to_entity(model) for model in models]
+
+    async def get_all_areas(self) -> List[HospitalArea]:
+        return await self._fetch(select(HospitalAreaModel))
+
+    async def get_area_by_name(self, name: str) -> Optional[HospitalArea]:
+        areas = await self._fetch(
+            select(HospitalAreaModel).where(HospitalAreaModel.nombre.ilike(name)).limit(1)
+        )
+        return areas[0] if areas else None
+
+class AsyncSQLDirectoryRepository:
+    """
+    Async SQLAlchemy implementation of AsyncDirectoryRepository.
+    """
+    def __init__(self, db_manager: AsyncDatabaseManager):
+        self.db_manager = db_manager
+
+    async def _rows(self, query):
+        async with self.db_manager.get_session() as session:
+            return (await session.execute(query)).all()
+
+    async def search_directory(self, name: str, limit: int = 5) -> List[DirectoryEntry]:
+        rows = await self._rows(
+            select(DirectoryModel.nombre_referencia, DirectoryModel.numero_anexo)
+            .where(unaccent_ilike(DirectoryModel.nombre_referencia, name))
+            .order_by(DirectoryModel.nombre_referencia)
+            .limit(limit)
+        )
+        return [DirectoryEntry(name=r.nombre_referencia, extension=r.numero_anexo) for r in rows]
+
+    async def find_location(self, unit_name: str, limit: int = 5) -> List[UnitLocation]:
+        rows = await self._rows(
+            SQLDirectoryRepository._location_query()
+            .where(unaccent_ilike(UnitModel.nombre_unidad, unit_name))
+            .order_by(UnitModel.nombre_unidad)
+            .limit(limit)
+        )
+        return [SQLDirectoryRepository._row_to_location(r) for r in rows]
+
+    async def list_units_on_floor(self, floor_level: int, building: Optional[str] = None,
+                                  limit: int = 50) -> List[UnitLocation]:
+        query = SQLDirectoryRepository._location_query().where(FloorModel.nivel_numero == floor_level)
+        if building:
+            query = query.where(
+                unaccent_ilike(BuildingModel.nombre_edificio, building)
+                | (func.upper(BuildingModel.codigo_interno) == building.strip().upper())
+            )
+        rows = await self._rows(
+            query.order_by(BuildingModel.nombre_edificio, UnitModel.nombre_unidad).limit(limit)
+        )
+        return [SQLDirectoryRepository._row_to_location(r) for r in rows]
+
+@instrumented("admin_async")
+class AsyncAdminRepository:
+    """
+    Lecturas del Panel de Control y registro del historial, en asíncrono.
+
+    Usa las mismas consultas que AdminRepository. Las escrituras del CRUD
+    (save_*/delete_*) siguen en AdminRepository: son poco frecuentes y
+    necesitan sus validaciones.
+    """
+
+    def __init__(self, db_manager: AsyncDatabaseManager | None = None):
+        self.db_manager = db_manager or AsyncDatabaseManager()
+        self.engine = self.db_manager.engine
+
+    async def _fetch_dicts(self, query, params: dict | None = None):
+        async with self.engine.connect() as conn:
+            rows = (await conn.execute(query, params or {})).fetchall()
+            return [dict(row._mapping) for row in rows]
+
+    async def get_users(self):
+        return await self._fetch_dicts(USERS_QUERY)
+
+    async def get_roles(self):
+        return await self._fetch_dicts(ROLES_QUERY)
+
+    async def get_edificios(self):
+        return await self._fetch_dicts(EDIFICIOS_QUERY)
+
+    async def get_all_edificios(self):
+        return await self._fetch_dicts(ALL_EDIFICIOS_QUERY)
+
+    async def get_pisos(self):
+        return await self._fetch_dicts(PISOS_QUERY)
+
+    async def get_unidades(self):
+        return await self._fetch_dicts(UNIDADES_QUERY)
+
+    async def get_directorio(self):
+        return await self._fetch_dicts(DIRECTORIO_QUERY)
+
+    async def get_logs(self, limit: int = 100):
+        return await self._fetch_dicts(LOGS_QUERY, {"lim": limit})
+
+    async def get_page(self, listing: str, limit: int = 50, cursor: str | None = None,
+                       sort: str | None = None, descending: bool = False,
+                       search: str | None = None, **filters) -> Page:
+        """Página de uno de los LISTINGS (mismos cursores que AdminRepository.get_*_page)."""
+        spec = LISTINGS[listing]
+        stmt, limit, names, fingerprint = spec.statement(limit, cursor, sort, descending, search, filters)
+        async with self.engine.connect() as conn:
+            rows = (await conn.execute(stmt)).fetchall()
+        return spec.page(rows, limit, names, fingerprint)
+
+    async def log_interaction(self, usuario_id: str, pregunta: str, respuesta: str,
+                              request_id: str | None = None, result: dict | None = None):
+        """Registrar interacción en historial_consultas (nunca lanza)."""
+        try:
+            params = interaction_params(usuario_id, pregunta, respuesta, request_id, result)
+            if params is None:
+                return
+            async with self.engine.begin() as conn:
+                await conn.execute(INSERT_INTERACTION_SQL, params)
+        except Exception as e:
+            logger.warning("Error al guardar historial: %s", e)
@@ -0,0 +1,246 @@
+"""
+Escritura en segundo plano del historial de consultas (historial_consultas).
+
+El chat encola la interacción y sigue; un hilo del proceso vacía la cola en
+lotes (un INSERT multi-fila por lote) cada AUDIT_BATCH_SIZE filas o cada
+AUDIT_FLUSH_MS milisegundos, lo que ocurra primero. Si la cola está llena el
+chat espera como máximo AUDIT_PUT_TIMEOUT_MS y luego la fila se descarta y
+se contabiliza: el historial nunca frena una respuesta.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import bindparam, insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DataError, IntegrityError, OperationalError
+
+from .admin_repository import HISTORIAL, interaction_params
+from .database import DATABASE_URL, get_engine
+from .metrics import QUEUE_DEPTH, REGISTRY
+
+logger = logging.getLogger("nexa.audit")
+
+AUDIT_QUEUE_SIZE = int(os.getenv("NEXA_AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("NEXA_AUDIT_BATCH_SIZE", "200"))
+AUDIT_FLUSH_MS = float(os.getenv("NEXA_AUDIT_FLUSH_MS", "500"))
+AUDIT_PUT_TIMEOUT_MS = float(os.getenv("NEXA_AUDIT_PUT_TIMEOUT_MS", "50"))
+# Reintentos con la base caída: espera inicial, duplicada hasta el máximo
+AUDIT_RETRY_MS = float(os.getenv("NEXA_AUDIT_RETRY_MS", "500"))
+AUDIT_RETRY_MAX_MS = float(os.getenv("NEXA_AUDIT_RETRY_MAX_MS", "30000"))
+
+# Columna -> clave de interaction_params. Con insert() (no text()) psycopg2
+# recibe el lote como INSERT ... VALUES multi-fila ("insertmanyvalues" de
+# SQLAlchemy); un text() con executemany sería una ida y vuelta por fila.
+INSERT_BATCH = insert(HISTORIAL).values({
+    column: bindparam(key) for column, key in (
+        ("id", "id"), ("usuario_id", "uid"), ("pregunta", "preg"), ("respuesta", "resp"),
+        ("fecha", "fecha"), ("sql_generado", "sql"), ("sql_fingerprint", "fingerprint"),
+        ("modelo", "modelo"), ("duraciones_ms", "duraciones"), ("duracion_total_ms", "total_ms"),
+        ("tokens_prompt", "tokens_prompt"), ("tokens_respuesta", "tokens_respuesta"),
+        ("filas", "filas"), ("cache_hit", "cache_hit"), ("resultado", "resultado"),
+        ("error_clase", "error_clase"),
+    )
+})
+
+AUDIT_ROWS = REGISTRY.counter(
+    "nexa_audit_rows_total",
+    "Filas del historial por resultado (written|overflow|error).",
+    ("result",),
+)
+AUDIT_FLUSH_DURATION = REGISTRY.histogram(
+    "nexa_audit_flush_seconds", "Duración de cada lote escrito en historial_consultas."
+)
+# Debe quedar bajo NEXA_AUDIT_ROLLUP_LAG_S (ver ROLLUP_LAG_S en admin_repository)
+AUDIT_DELAY = REGISTRY.histogram(
+    "nexa_audit_delay_seconds", "Espera de cada fila desde que se encola hasta que se escribe."
+)
+
+
+class AuditWriter:
+    """
+    Cola acotada + hilo que escribe el historial en lotes.
+
+    Args:
+        engine: engine del primario donde escribir.
+        max_queue: filas pendientes como máximo (back-pressure).
+        batch_size: filas por INSERT.
+        flush_ms: espera máxima antes de escribir un lote incompleto.
+        put_timeout_ms: cuánto puede esperar `submit` con la cola llena.
+        retry_ms / retry_max_ms: espera entre reintentos cuando la base no
+            responde (OperationalError); el lote se conserva y la cola se
+            llena hasta que vuelva, o hasta `close`.
+    """
+
+    def __init__(self, engine: Engine, max_queue: int = AUDIT_QUEUE_SIZE,
+                 batch_size: int = AUDIT_BATCH_SIZE, flush_ms: float = AUDIT_FLUSH_MS,
+                 put_timeout_ms: float = AUDIT_PUT_TIMEOUT_MS,
+                 retry_ms: float = AUDIT_RETRY_MS, retry_max_ms: float = AUDIT_RETRY_MAX_MS):
+        self.engine = engine
+        self.batch_size = max(1, batch_size)
+        self.flush_s = flush_ms / 1000
+        self.put_timeout_s = put_timeout_ms / 1000
+        self.retry_s = retry_ms / 1000
+        self.retry_max_s = max(retry_max_ms, retry_ms) / 1000
+        self._stopping = threading.Event()
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="nexa-audit", daemon=True)
+        self._thread.start()
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+    def submit(self, usuario_id: str, pregunta: str, respuesta: str,
+               request_id: str | None = None, result: dict | None = None) -> bool:
+        """Encolar una interacción. False si no se guardará (invitado o cola llena)."""
+        params = interaction_params(usuario_id, pregunta, respuesta, request_id, result)
+        if params is None:
+            return False
+        if self._closed:
+            AUDIT_ROWS.inc(result="overflow")
+            return False
+        try:
+            self._queue.put(params, timeout=self.put_timeout_s)
+        except queue.Full:
+            AUDIT_ROWS.inc(result="overflow")
+            return False
+        QUEUE_DEPTH.set(self._queue.qsize(), queue="audit")
+        return True
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Esperar a que se escriba todo lo encolado hasta ahora."""
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Escribir lo pendiente y detener el hilo (al apagar el proceso)."""
+        if self._closed:
+            return
+        self.flush(timeout)
+        self._closed = True
+        self._stopping.set()  # cortar la espera de un reintento
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    # ------------------------------------------------------------------
+    # Hilo de escritura
+    # ------------------------------------------------------------------
+    def _run(self) -> None:
+        batch: List[Dict] = []
+        waiters: List[threading.Event] = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = ...  # venció el plazo del lote
+
+            if isinstance(item, dict):
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_s
+                if len(batch) < self.batch_size:
+                    continue
+            elif isinstance(item, threading.Event):
+                waiters.append(item)
+
+            if batch:
+                self._write(batch)
+                batch = []
+            deadline = None
+            for waiter in waiters:
+                waiter.set()
+            waiters = []
+            QUEUE_DEPTH.set(self._queue.qsize(), queue="audit")
+            if item is None:
+                return
+
+    def _insert(self, batch: List[Dict]) -> List[Dict]:
+        written: List[Dict] = []
+        with self.engine.begin() as conn:
+            try:
+                with conn.begin_nested():
+                    conn.execute(INSERT_BATCH, batch)
+                return batch
+            except (IntegrityError, DataError):
+                # Una fila inválida (id repetido, valor fuera de rango) no
+                # descarta el lote: se reintenta fila por fila en SAVEPOINTs
+                for params in batch:
+                    try:
+                        with conn.begin_nested():
+                            conn.execute(INSERT_BATCH, params)
+                        written.append(params)
+                    except (IntegrityError, DataError) as e:
+                        logger.warning("Fila de historial descartada (%s): %s", params["id"], e.orig)
+        return written
+
+    def _write(self, batch: List[Dict]) -> None:
+        start = time.perf_counter()
+        delay = self.retry_s
+        while True:
+            try:
+                written = self._insert(batch)
+                break
+            except OperationalError as e:
+                # Base caída o sin conexiones: se conserva el lote y se espera;
+                # mientras tanto la cola se llena y `submit` descarta (overflow)
+                if self._closed:
+                    written = []
+                    logger.error("Historial descartado al cerrar (%d filas): %s", len(batch), e)
+                    break
+                logger.warning("Base no disponible; reintento del historial en %.1f s (%d filas): %s",
+                               delay, len(batch), e)
+                self._stopping.wait(delay)
+                delay = min(delay * 2, self.retry_max_s)
+            except Exception as e:
+                written = []
+                logger.error("Error al guardar historial (%d filas): %s", len(batch), e)
+                break
+        AUDIT_FLUSH_DURATION.observe(time.perf_counter() - start)
+        AUDIT_ROWS.inc(len(written), result="written")
+        if len(written) < len(batch):
+            AUDIT_ROWS.inc(len(batch) - len(written), result="error")
+        written_at = datetime.now(timezone.utc)
+        for params in written:
+            AUDIT_DELAY.observe((written_at - params["fecha"]).total_seconds())
+
+
+_WRITERS: Dict[str, AuditWriter] = {}
+_WRITERS_LOCK = threading.Lock()
+
+
+def get_audit_writer(url: str = DATABASE_URL) -> AuditWriter:
+    """AuditWriter compartido del proceso para `url` (se inicia al primer uso)."""
+    writer = _WRITERS.get(url)
+    if writer is None:
+        with _WRITERS_LOCK:
+            writer = _WRITERS.get(url)
+            if writer is None:
+                writer = AuditWriter(get_engine(url))
+                _WRITERS[url] = writer
+    return writer
+
+
+@atexit.register
+def close_audit_writers(timeout: Optional[float] = 5.0) -> None:
+    """Vaciar las colas al terminar el proceso."""
+    for writer in list(_WRITERS.values()):
+        writer.close(timeout)
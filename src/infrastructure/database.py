@@ -1,7 +1,16 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session, declarative_base, scoped_session, sessionmaker
+from sqlalchemy.pool import Pool, QueuePool
 import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
 from dotenv import load_dotenv
+from .metrics import REGISTRY
+from .tracing import record_span
 
 # 1. Cargar variables de entorno
 load_dotenv()
@@ -17,12 +26,350 @@ DB_NAME = os.getenv("POSTGRES_DB", "nexa_db")
 # Cadena de conexión (Explícitamente usando psycopg2)
 DATABASE_URL = f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-# 3. Crear Motor y Fábrica de Sesiones
-engine = create_engine(DATABASE_URL)
+# 3. Instrumentación (métricas + spans) de TODOS los engines del proceso,
+#    incluidos los que crean librerías como SQLDatabase.from_uri
+DB_QUERY_DURATION = REGISTRY.histogram(
+    "nexa_db_query_duration_seconds",
+    "Duración de las sentencias SQL por operación.",
+    ("operation",),
+)
+DB_ERRORS = REGISTRY.counter(
+    "nexa_db_errors_total", "Sentencias SQL que terminaron en error.", ("operation",)
+)
+DB_POOL_CHECKED_OUT = REGISTRY.gauge(
+    "nexa_db_pool_checked_out", "Conexiones prestadas por los pools en este momento."
+)
+DB_POOL_CHECKOUTS = REGISTRY.counter(
+    "nexa_db_pool_checkouts_total", "Préstamos de conexiones desde los pools."
+)
+DB_POOL_CONNECTS = REGISTRY.counter(
+    "nexa_db_pool_connections_opened_total", "Conexiones físicas abiertas por los pools."
+)
+
+
+def _statement_operation(statement: str) -> str:
+    words = statement.lstrip().split(None, 1)
+    return words[0].upper() if words else "UNKNOWN"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("nexa_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("nexa_query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    operation = _statement_operation(statement)
+    DB_QUERY_DURATION.observe(elapsed, operation=operation)
+    record_span("db.query", elapsed, operation=operation, executemany=executemany)
+
+
+def _handle_error(context):
+    starts = context.connection.info.get("nexa_query_start") if context.connection is not None else None
+    if starts:
+        starts.pop()
+    DB_ERRORS.inc(operation=_statement_operation(context.statement or ""))
+
+
+def _pool_checkout(dbapi_connection, connection_record, connection_proxy):
+    DB_POOL_CHECKED_OUT.inc()
+    DB_POOL_CHECKOUTS.inc()
+
+
+def _pool_checkin(dbapi_connection, connection_record):
+    DB_POOL_CHECKED_OUT.dec()
+
+
+def _pool_connect(dbapi_connection, connection_record):
+    DB_POOL_CONNECTS.inc()
+
+
+def instrument_sqlalchemy():
+    """Registrar (una sola vez) los listeners globales de Engine y Pool."""
+    listeners = [
+        (Engine, "before_cursor_execute", _before_cursor_execute),
+        (Engine, "after_cursor_execute", _after_cursor_execute),
+        (Engine, "handle_error", _handle_error),
+        (Pool, "checkout", _pool_checkout),
+        (Pool, "checkin", _pool_checkin),
+        (Pool, "connect", _pool_connect),
+    ]
+    for target, name, fn in listeners:
+        if not event.contains(target, name, fn):
+            event.listen(target, name, fn)
+
+
+instrument_sqlalchemy()
+
+# 4. Registro de engines: UN engine (y un pool) por URL en todo el proceso.
+#    RAGAgent, DatabaseManager y AdminRepository lo comparten vía get_engine().
+DB_POOL_SIZE = int(os.getenv("NEXA_DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("NEXA_DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("NEXA_DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("NEXA_DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("NEXA_DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_CONNECT_TIMEOUT = int(os.getenv("NEXA_DB_CONNECT_TIMEOUT", "5"))
+DB_APPLICATION_NAME = os.getenv("NEXA_DB_APPLICATION_NAME", "nexa-ai")
+
+DB_POOL_WAIT = REGISTRY.histogram(
+    "nexa_db_pool_wait_seconds",
+    "Tiempo esperando una conexión libre del pool.",
+    ("pool",),
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+DB_POOL_TIMEOUTS = REGISTRY.counter(
+    "nexa_db_pool_timeouts_total",
+    "Préstamos que agotaron NEXA_DB_POOL_TIMEOUT sin conseguir conexión.",
+    ("pool",),
+)
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool que mide la espera por una conexión (y los timeouts)."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            DB_POOL_TIMEOUTS.inc(pool=self._nexa_name)
+            raise
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - start, pool=self._nexa_name)
+
+
+_ENGINES: dict[str, Engine] = {}
+_ENGINES_LOCK = threading.Lock()
+
+
+def pool_name(url) -> str:
+    """Etiqueta del pool en las métricas (URL sin contraseña)."""
+    return make_url(url).render_as_string(hide_password=True)
+
+
+def _engine_options(url: str) -> dict:
+    backend = make_url(url).get_backend_name()
+    if backend == "sqlite":
+        # SQLite (benchmarks/pruebas): pool por defecto del dialecto
+        return {}
+    options = {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    if backend == "postgresql":
+        options["connect_args"] = {
+            "application_name": DB_APPLICATION_NAME,
+            "connect_timeout": DB_CONNECT_TIMEOUT,
+        }
+        if make_url(url).get_driver_name() == "psycopg2":
+            # executemany de UPDATE/DELETE en lotes (execute_batch), no fila a fila
+            options["executemany_mode"] = "values_plus_batch"
+    return options
+
+
+def get_engine(url: str = DATABASE_URL) -> Engine:
+    """
+    Engine compartido para `url` (se crea la primera vez con el pool
+    configurado por las variables NEXA_DB_*).
+    """
+    key = str(url)
+    engine = _ENGINES.get(key)
+    if engine is None:
+        with _ENGINES_LOCK:
+            engine = _ENGINES.get(key)
+            if engine is None:
+                engine = create_engine(key, **_engine_options(key))
+                engine.pool._nexa_name = pool_name(key)
+                _ENGINES[key] = engine
+    return engine
+
+
+def pool_stats() -> dict[str, dict[str, float]]:
+    """Estado de cada pool del registro: tamaño, prestadas, libres, overflow y esperas."""
+    stats = {}
+    for engine in list(_ENGINES.values()):
+        pool = engine.pool
+        name = pool_name(engine.url)
+        entry = {}
+        if isinstance(pool, QueuePool):
+            entry.update({
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": max(0, pool.overflow()),
+                "max_overflow": pool._max_overflow,
+            })
+        wait = DB_POOL_WAIT.labels(pool=name)
+        entry.update({
+            "waits": wait.count,
+            "wait_p95_ms": round(wait.quantile(0.95) * 1000, 2) if wait.count else None,
+            "timeouts": DB_POOL_TIMEOUTS.labels(pool=name).value,
+        })
+        stats[name] = entry
+    return stats
+
+
+def _pool_gauges():
+    values = {}
+    for name, entry in pool_stats().items():
+        for field in ("size", "checked_out", "checked_in", "overflow"):
+            if field in entry:
+                values[(("pool", name), ("state", field))] = entry[field]
+    return values
+
+
+REGISTRY.gauge_callback(
+    "nexa_db_pool_connections",
+    "Conexiones por pool del registro (state=size|checked_out|checked_in|overflow).",
+    _pool_gauges,
+)
+
+# 5. Réplicas de lectura (opcional). Las lecturas (consultas del RAG,
+#    listados get_*, login) van a una réplica con lag aceptable; si ninguna
+#    lo tiene, al primario. Las escrituras siempre van al primario.
+DB_REPLICA_URLS = [u.strip() for u in os.getenv("NEXA_DB_REPLICA_URLS", "").split(",") if u.strip()]
+DB_REPLICA_MAX_LAG_S = float(os.getenv("NEXA_DB_REPLICA_MAX_LAG_S", "5"))
+DB_REPLICA_CHECK_S = float(os.getenv("NEXA_DB_REPLICA_CHECK_S", "10"))
+
+DB_READS = REGISTRY.counter(
+    "nexa_db_reads_routed_total",
+    "Lecturas enrutadas (target=replica|primary; reason=ok|lag|down|none).",
+    ("target", "reason"),
+)
+
+# Segundos de retraso de una réplica PostgreSQL (0 si está al día o es primario)
+REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+class ReplicaRouter:
+    """
+    Elige el engine de lectura para un primario: réplicas en round-robin,
+    descartando las que superan `max_lag_s` o no responden. El lag de cada
+    réplica lo mide un hilo en segundo plano cada `check_interval_s` (0 = sin
+    hilo, sólo probe() manual): una réplica caída nunca hace esperar a una
+    lectura el connect_timeout.
+    """
+
+    def __init__(self, primary_url: str, replica_urls: list[str],
+                 max_lag_s: float = DB_REPLICA_MAX_LAG_S,
+                 check_interval_s: float = DB_REPLICA_CHECK_S):
+        self.primary_url = primary_url
+        self.replica_urls = list(replica_urls)
+        self.max_lag_s = max_lag_s
+        self.check_interval_s = check_interval_s
+        # url -> lag en s del último sondeo (None = caída); sin sondeo aún, no está
+        self._lag: dict[str, float | None] = {}
+        self._next = 0
+        self._lock = threading.Lock()
+        self._prober: threading.Thread | None = None
+
+    def measure_lag(self, url: str) -> float | None:
+        engine = get_engine(url)
+        if engine.dialect.name != "postgresql":
+            return 0.0
+        try:
+            with engine.connect() as conn:
+                return float(conn.exec_driver_sql(REPLICA_LAG_SQL).scalar() or 0)
+        except Exception:
+            return None
+
+    def probe(self) -> None:
+        """Medir el lag de todas las réplicas (fuera del lock: puede tardar)."""
+        for url in self.replica_urls:
+            lag = self.measure_lag(url)
+            with self._lock:
+                self._lag[url] = lag
+
+    def _probe_loop(self) -> None:
+        while True:
+            self.probe()
+            time.sleep(self.check_interval_s)
+
+    def lag(self, url: str) -> float | None:
+        """Último lag medido; None si la réplica no respondió o aún no se mide."""
+        with self._lock:
+            return self._lag.get(url)
+
+    def read_engine(self) -> Engine:
+        if not self.replica_urls:
+            return get_engine(self.primary_url)
+        with self._lock:
+            if self._prober is None and self.check_interval_s > 0:
+                self._prober = threading.Thread(
+                    target=self._probe_loop, name="nexa-replica-lag", daemon=True
+                )
+                self._prober.start()
+            start = self._next
+            self._next = (self._next + 1) % len(self.replica_urls)
+        reason = "none"
+        for i in range(len(self.replica_urls)):
+            url = self.replica_urls[(start + i) % len(self.replica_urls)]
+            lag = self.lag(url)
+            if lag is None:
+                reason = "down"
+            elif lag > self.max_lag_s:
+                reason = "lag"
+            else:
+                DB_READS.inc(target="replica", reason="ok")
+                return get_engine(url)
+        DB_READS.inc(target="primary", reason=reason)
+        return get_engine(self.primary_url)
+
+    def lag_snapshot(self) -> dict[str, float | None]:
+        with self._lock:
+            return {pool_name(url): lag for url, lag in self._lag.items()}
+
+
+_ROUTERS: dict[str, ReplicaRouter] = {}
+
+
+def get_read_engine(url: str = DATABASE_URL) -> Engine:
+    """
+    Engine para lecturas de `url`. Con NEXA_DB_REPLICA_URLS, las lecturas
+    del primario DATABASE_URL se reparten entre las réplicas al día; en
+    cualquier otro caso es el mismo engine que get_engine(url).
+    """
+    if url != DATABASE_URL or not DB_REPLICA_URLS:
+        return get_engine(url)
+    router = _ROUTERS.get(url)
+    if router is None:
+        with _ENGINES_LOCK:
+            router = _ROUTERS.setdefault(url, ReplicaRouter(url, DB_REPLICA_URLS))
+    return router.read_engine()
+
+
+def _replica_lag_gauges():
+    values = {}
+    for router in list(_ROUTERS.values()):
+        for name, lag in router.lag_snapshot().items():
+            values[(("replica", name),)] = -1 if lag is None else lag
+    return values
+
+
+REGISTRY.gauge_callback(
+    "nexa_db_replica_lag_seconds",
+    "Último lag medido por réplica de lectura (-1 = sin respuesta).",
+    _replica_lag_gauges,
+)
+
+# 6. Motor por defecto y Fábrica de Sesiones
+engine = get_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
-# 4. Dependencia para FastAPI/Streamlit
+# 7. Dependencia para FastAPI/Streamlit
 def get_db():
     db = SessionLocal()
     try:
@@ -30,23 +377,63 @@ def get_db():
     finally:
         db.close()
 
-# 5. CLASE DE COMPATIBILIDAD (DatabaseManager)
+# 8. Fábrica de sesiones por operación (DatabaseManager)
 class DatabaseManager:
     """
-    Wrapper para mantener compatibilidad con use_cases antiguos.
+    Fábrica de sesiones sobre el engine compartido de `database_uri`.
+
+    Cada `with db_manager.get_session() as session:` usa una sesión nueva
+    (una conexión del pool), hace commit al salir sin errores, rollback si
+    hubo una excepción, y la cierra. Así ningún hilo de Streamlit comparte
+    una sesión con otro.
+
+    Con `scoped=True` la sesión es una por hilo (scoped_session): las
+    operaciones del mismo hilo la reutilizan hasta llamar a `remove()`.
+
+    `get_session(readonly=True)` usa una sesión propia ligada al engine de
+    lectura (réplica si hay), nunca la sesión con escrituras pendientes.
     """
-    def __init__(self, db_name=None):
-        self.db = SessionLocal()
 
-    def __enter__(self):
-        return self.db
+    def __init__(self, database_uri: str = DATABASE_URL, scoped: bool = False):
+        self.database_uri = database_uri
+        self.engine = get_engine(database_uri)
+        self.session_factory = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.scoped = scoped
+        self._scoped_session = scoped_session(self.session_factory) if scoped else None
+        # Sesiones abiertas con `with manager:`, por hilo (ver __enter__)
+        self._compat = threading.local()
 
-    def __exit__(self, exc_type, exc_value, traceback):
-        self.db.close()
-        
-    def get_session(self):
-        return self.db
+    @contextmanager
+    def get_session(self, readonly: bool = False) -> Iterator[Session]:
+        if readonly:
+            session = Session(bind=get_read_engine(self.database_uri), autoflush=False)
+        else:
+            session = self._scoped_session() if self.scoped else self.session_factory()
+        try:
+            yield session
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            if readonly or not self.scoped:
+                session.close()
+
+    def remove(self) -> None:
+        """Cerrar la sesión del hilo actual (sólo con scoped=True)."""
+        if self._scoped_session is not None:
+            self._scoped_session.remove()
 
+    # Compatibilidad: `with DatabaseManager() as session:`. El manager se
+    # comparte entre hilos, así que cada hilo apila sus propias sesiones.
+    def __enter__(self) -> Session:
+        context = self.get_session()
+        session = context.__enter__()
+        self._compat.__dict__.setdefault("stack", []).append(context)
+        return session
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._compat.stack.pop().__exit__(exc_type, exc_value, traceback)
 
 
 
@@ -0,0 +1,191 @@
+"""
+Importación del directorio telefónico (ANEXOS HCM.csv / .xlsx) por diferencias.
+
+En lugar de vaciar la tabla y volver a cargarla, las filas del archivo se
+cargan en una tabla temporal (COPY en PostgreSQL) y se aplican, en una sola
+transacción, sólo los cambios respecto a directorio_telefonico usando
+`numero_anexo` como clave:
+
+- anexos que ya no están en el archivo -> DELETE (y duplicados previos);
+- anexos cuyo nombre cambió -> UPDATE (conservan su id);
+- anexos nuevos -> INSERT.
+
+Las búsquedas siguen viendo el directorio anterior completo hasta el COMMIT.
+"""
+import csv
+import io
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+# Largo de directorio_telefonico.nombre_referencia
+NOMBRE_MAX = 150
+
+STAGE_DDL = (
+    "CREATE TEMPORARY TABLE directorio_import "
+    "(numero_anexo INTEGER PRIMARY KEY, nombre_referencia VARCHAR(150) NOT NULL)"
+)
+DIFF_SQL = {
+    # Anexos repetidos en la tabla (cargas antiguas con to_sql): queda el de menor id
+    "duplicates": """
+        DELETE FROM directorio_telefonico
+        WHERE id NOT IN (SELECT MIN(id) FROM directorio_telefonico GROUP BY numero_anexo)
+    """,
+    "removed": """
+        DELETE FROM directorio_telefonico
+        WHERE NOT EXISTS (SELECT 1 FROM directorio_import s
+                          WHERE s.numero_anexo = directorio_telefonico.numero_anexo)
+    """,
+    "changed": """
+        UPDATE directorio_telefonico
+        SET nombre_referencia = (SELECT s.nombre_referencia FROM directorio_import s
+                                 WHERE s.numero_anexo = directorio_telefonico.numero_anexo)
+        WHERE EXISTS (SELECT 1 FROM directorio_import s
+                      WHERE s.numero_anexo = directorio_telefonico.numero_anexo
+                        AND s.nombre_referencia <> directorio_telefonico.nombre_referencia)
+    """,
+    "added": """
+        INSERT INTO directorio_telefonico (numero_anexo, nombre_referencia)
+        SELECT s.numero_anexo, s.nombre_referencia FROM directorio_import s
+        WHERE NOT EXISTS (SELECT 1 FROM directorio_telefonico d
+                          WHERE d.numero_anexo = s.numero_anexo)
+    """,
+}
+
+
+@dataclass
+class ImportResult:
+    """Conteos de una importación (o de una simulación con dry_run)."""
+    added: int = 0
+    changed: int = 0
+    removed: int = 0
+    unchanged: int = 0
+    skipped: int = 0
+    elapsed_ms: float = 0.0
+
+
+# ----------------------------------------------------------------------
+# 📂 Lectura del archivo
+# ----------------------------------------------------------------------
+def _columns(rows: Iterator[Iterable[Any]]) -> Iterator[Tuple[Any, Any]]:
+    header = [str(cell or "").strip().upper() for cell in next(rows, [])]
+    try:
+        anexo_col, display_col = header.index("ANEXO"), header.index("DISPLAY")
+    except ValueError:
+        raise ValueError("❌ El archivo debe tener las columnas ANEXO y DISPLAY.")
+    for row in rows:
+        row = tuple(row)
+        yield (row[anexo_col] if anexo_col < len(row) else None,
+               row[display_col] if display_col < len(row) else None)
+
+
+def read_directory_file(path) -> Iterator[Tuple[Any, Any]]:
+    """
+    Pares (ANEXO, DISPLAY) sin validar de un .csv o .xlsx, leídos en streaming
+    (openpyxl en modo read_only: no carga la hoja completa en memoria).
+    """
+    path = Path(path)
+    if path.suffix.lower() in (".xlsx", ".xlsm"):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ValueError("❌ Para leer .xlsx instale openpyxl (pip install '.[xlsx]').")
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            yield from _columns(workbook.active.iter_rows(values_only=True))
+        finally:
+            workbook.close()
+    else:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            yield from _columns(csv.reader(f))
+
+
+def clean_directory_rows(pairs: Iterable[Tuple[Any, Any]]) -> Tuple[Dict[int, str], int]:
+    """
+    Validar los pares del archivo.
+
+    Returns:
+        ({numero_anexo: nombre}, filas descartadas). Las filas sin nombre o con
+        anexo no numérico se descartan; si un anexo se repite gana la última.
+    """
+    entries: Dict[int, str] = {}
+    skipped = 0
+    for anexo, nombre in pairs:
+        nombre = str(nombre).strip() if nombre is not None else ""
+        try:
+            anexo = int(float(str(anexo).strip()))
+        except (TypeError, ValueError):
+            anexo = None
+        if anexo is None or not nombre:
+            skipped += 1
+            continue
+        entries[anexo] = nombre[:NOMBRE_MAX]
+    return entries, skipped
+
+
+# ----------------------------------------------------------------------
+# 🔁 Aplicación de las diferencias
+# ----------------------------------------------------------------------
+def _stage(conn, entries: Dict[int, str]) -> None:
+    # La tabla temporal es de la conexión; puede quedar de un intento anterior
+    # (SQLite no deshace el DDL en un rollback)
+    conn.exec_driver_sql("DROP TABLE IF EXISTS directorio_import")
+    conn.exec_driver_sql(STAGE_DDL)
+    if conn.dialect.name == "postgresql":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(entries.items())
+        buffer.seek(0)
+        cursor = conn.connection.driver_connection.cursor()
+        try:
+            cursor.copy_expert(
+                "COPY directorio_import (numero_anexo, nombre_referencia) FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+        finally:
+            cursor.close()
+    else:
+        conn.execute(
+            text("INSERT INTO directorio_import (numero_anexo, nombre_referencia) VALUES (:a, :n)"),
+            [{"a": anexo, "n": nombre} for anexo, nombre in entries.items()],
+        )
+
+
+def import_directory(engine: Engine, entries: Dict[int, str], skipped: int = 0,
+                     dry_run: bool = False) -> ImportResult:
+    """
+    Dejar directorio_telefonico igual a `entries` en una transacción.
+
+    Args:
+        engine: engine del primario.
+        entries: {numero_anexo: nombre_referencia} (ver clean_directory_rows).
+        skipped: filas descartadas al leer (sólo para el reporte).
+        dry_run: calcular los conteos y deshacer los cambios.
+    """
+    if not entries:
+        # Un archivo vacío o mal leído no debe vaciar el directorio
+        raise ValueError("❌ El archivo no tiene anexos válidos.")
+    start = time.perf_counter()
+    result = ImportResult(skipped=skipped)
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            _stage(conn, entries)
+            result.removed = conn.execute(text(DIFF_SQL["duplicates"])).rowcount
+            result.removed += conn.execute(text(DIFF_SQL["removed"])).rowcount
+            result.changed = conn.execute(text(DIFF_SQL["changed"])).rowcount
+            result.added = conn.execute(text(DIFF_SQL["added"])).rowcount
+            result.unchanged = len(entries) - result.changed - result.added
+            conn.exec_driver_sql("DROP TABLE directorio_import")
+        except Exception:
+            trans.rollback()
+            raise
+        if dry_run:
+            trans.rollback()
+        else:
+            trans.commit()
+    result.elapsed_ms = (time.perf_counter() - start) * 1000
+    return result
@@ -25,3 +25,13 @@ class AreaNotFoundError(Exception):
 Se lanza cuando no se encuentra un área del hospital en la base de datos.
 """
     pass
+
+class LoginThrottledError(Exception):
+    """
+Se lanza cuando se rechaza un login por exceso de intentos (cuenta o IP)
+o porque el pool de bcrypt está saturado.
+"""
+    def __init__(self, scope: str, retry_after: float):
+        super().__init__(f"Demasiados intentos de login ({scope}); reintentar en {retry_after:.0f} s")
+        self.scope = scope
+        self.retry_after = retry_after
@@ -1,9 +1,37 @@
 """
 LLM client wrapper for Ollama integration.
 """
-from typing import Optional
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional, Union
 import ollama
 from .exceptions import LLMConnectionError
+from .metrics import REGISTRY
+from .tracing import span
+
+LLM_REQUESTS = REGISTRY.counter(
+    "nexa_llm_requests_total", "Llamadas a Ollama por tipo y estado.", ("call", "status")
+)
+LLM_DURATION = REGISTRY.histogram(
+    "nexa_llm_request_duration_seconds", "Duración de las llamadas a Ollama.", ("call",)
+)
+LLM_TOKENS = REGISTRY.counter(
+    "nexa_llm_tokens_total", "Tokens procesados por Ollama (kind=prompt|completion).", ("call", "kind")
+)
+PREFIX_CACHE = REGISTRY.counter(
+    "nexa_llm_prefix_cache_total",
+    "Llamadas con prefijo fijo cuyo prefijo ya estaba en la caché KV de Ollama (result=hit|miss).",
+    ("prefix", "result"),
+)
+PREFIX_TOKENS_SAVED = REGISTRY.counter(
+    "nexa_llm_prefix_tokens_saved_total",
+    "Tokens de prompt que Ollama no tuvo que re-evaluar gracias al prefijo en caché.",
+    ("prefix",),
+)
+
+# Tiempo que Ollama mantiene el modelo (y su caché KV) cargado entre llamadas.
+KEEP_ALIVE = os.getenv("NEXA_OLLAMA_KEEP_ALIVE", "30m")
 
 class OllamaClient:
     """
@@ -23,7 +51,66 @@ class OllamaClient:
                        Alternatives: "llama3.2", "mistral", etc.
         """
         self.model_name = model_name
+        # Contadores de la última llamada (prompt_eval_count, eval_count, ...).
+        # Cada sesión usa su propio cliente, así que no se comparte entre hilos.
+        self.last_stats: dict[str, Any] = {}
+        # Prefijos fijos (system prompt) calentados: nombre -> tokens y
+        # caracteres del prefijo y costo en frío por token, medidos en warm_prefix().
+        self.prefixes: dict[str, dict[str, float]] = {}
+    
+    @staticmethod
+    def _extract_stats(response: Any) -> dict[str, Any]:
+        """Token counts and durations (ns -> ms) reported by Ollama."""
+        def ms(key: str) -> Optional[float]:
+            value = response.get(key)
+            return round(value / 1_000_000, 2) if value is not None else None
+        
+        return {
+            "prompt_eval_count": response.get("prompt_eval_count"),
+            "eval_count": response.get("eval_count"),
+            "prompt_eval_duration_ms": ms("prompt_eval_duration"),
+            "eval_duration_ms": ms("eval_duration"),
+            "load_duration_ms": ms("load_duration"),
+            "total_duration_ms": ms("total_duration"),
+        }
+    
+    @contextmanager
+    def _observe(self, call: str) -> Iterator[None]:
+        """Count, time and trace one Ollama request."""
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            with span(f"llm.{call}", model=self.model_name):
+                yield
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            LLM_DURATION.observe(time.perf_counter() - start, call=call)
+            LLM_REQUESTS.inc(call=call, status=status)
+    
+    def _record_response(self, call: str, response: Any) -> None:
+        """Keep the stats of the last call and add its tokens to the counters."""
+        self.last_stats = self._extract_stats(response)
+        if self.last_stats["prompt_eval_count"]:
+            LLM_TOKENS.inc(self.last_stats["prompt_eval_count"], call=call, kind="prompt")
+        if self.last_stats["eval_count"]:
+            LLM_TOKENS.inc(self.last_stats["eval_count"], call=call, kind="completion")
     
+    @staticmethod
+    def _build_options(
+        temperature: float,
+        num_predict: Optional[int] = None,
+        stop: Optional[list[str]] = None,
+    ) -> dict[str, Any]:
+        """Build the Ollama `options` payload, omitting unset limits."""
+        options: dict[str, Any] = {"temperature": temperature}
+        if num_predict is not None:
+            options["num_predict"] = num_predict
+        if stop:
+            options["stop"] = stop
+        return options
+
     def is_available(self) -> bool:
         """
         Check if the Ollama service is available.
@@ -38,7 +125,14 @@ class OllamaClient:
         except Exception:
             return False
     
-    def generate(self, prompt: str, temperature: float = 0.7) -> str:
+    def generate(
+        self,
+        prompt: str,
+        temperature: float = 0.7,
+        format: Optional[Union[str, dict[str, Any]]] = None,
+        num_predict: Optional[int] = None,
+        stop: Optional[list[str]] = None,
+    ) -> str:
         """
         Generate a text completion using the configured model.
         
@@ -46,6 +140,10 @@ class OllamaClient:
             prompt: The input prompt for the LLM.
             temperature: Sampling temperature (0.0 to 1.0).
                         Lower values make output more deterministic.
+            format: Optional structured output constraint: "json" or a
+                    JSON schema dict. The model can only emit matching JSON.
+            num_predict: Optional cap on generated tokens.
+            stop: Optional stop sequences that end generation early.
         
         Returns:
             Generated text response.
@@ -65,18 +163,28 @@ class OllamaClient:
             )
         
         try:
-            response = ollama.generate(
-                model=self.model_name,
-                prompt=prompt,
-                options={
-                    "temperature": temperature
-                }
-            )
+            with self._observe("generate"):
+                response = ollama.generate(
+                    model=self.model_name,
+                    prompt=prompt,
+                    format=format,
+                    options=self._build_options(temperature, num_predict, stop),
+                    keep_alive=KEEP_ALIVE
+                )
+            self._record_response("generate", response)
             return response['response']
         except Exception as e:
             raise LLMConnectionError(f"Failed to generate response: {e}")
     
-    def chat(self, messages: list[dict[str, str]], temperature: float = 0.7) -> str:
+    def chat(
+        self,
+        messages: list[dict[str, str]],
+        temperature: float = 0.7,
+        format: Optional[Union[str, dict[str, Any]]] = None,
+        num_predict: Optional[int] = None,
+        stop: Optional[list[str]] = None,
+        prefix: Optional[str] = None,
+    ) -> str:
         """
         Generate a chat completion using conversation history.
         
@@ -84,6 +192,12 @@ class OllamaClient:
             messages: List of message dictionaries with 'role' and 'content' keys.
                      Example: [{"role": "user", "content": "Hello"}]
             temperature: Sampling temperature (0.0 to 1.0).
+            format: Optional structured output constraint ("json" or a JSON schema).
+            num_predict: Optional cap on generated tokens.
+            stop: Optional stop sequences that end generation early.
+            prefix: Name of a prefix registered with warm_prefix(). When the
+                    first message is that fixed system prompt, the call is
+                    scored as a prefix-cache hit or miss.
         
         Returns:
             Generated text response.
@@ -98,13 +212,148 @@ class OllamaClient:
             )
         
         try:
-            response = ollama.chat(
-                model=self.model_name,
-                messages=messages,
-                options={
-                    "temperature": temperature
-                }
-            )
+            with self._observe("chat"):
+                response = ollama.chat(
+                    model=self.model_name,
+                    messages=messages,
+                    format=format,
+                    options=self._build_options(temperature, num_predict, stop),
+                    keep_alive=KEEP_ALIVE
+                )
+            self._record_response("chat", response)
+            if prefix:
+                self._score_prefix(prefix, messages)
             return response['message']['content']
         except Exception as e:
             raise LLMConnectionError(f"Failed to generate chat response: {e}")
+
+    # ------------------------------------------------------------------
+    #  Prefijo fijo en caché (KV cache de Ollama)
+    # ------------------------------------------------------------------
+    def warm_prefix(self, name: str, system_prompt: str) -> None:
+        """
+        Evaluar `system_prompt` una vez para dejarlo en la caché KV de Ollama.
+
+        Ollama reutiliza el prefijo común más largo con lo último evaluado en
+        cada slot, así que las llamadas siguientes que empiezan con el mismo
+        mensaje system sólo pagan prompt-eval por la pregunta. Con dos
+        prefijos (SQL y formateo) se necesita OLLAMA_NUM_PARALLEL >= 2 para
+        que no se desalojen entre sí.
+
+        La llamada en frío mide cuántos tokens tiene el prefijo y cuánto cuesta
+        cada uno; esa es la línea base para estimar el ahorro.
+        """
+        try:
+            with self._observe("warm"):
+                response = ollama.chat(
+                    model=self.model_name,
+                    messages=[{"role": "system", "content": system_prompt}],
+                    options=self._build_options(0.0, num_predict=1),
+                    keep_alive=KEEP_ALIVE
+                )
+        except Exception as e:
+            raise LLMConnectionError(f"Failed to warm prompt prefix '{name}': {e}")
+        stats = self._extract_stats(response)
+        tokens = stats["prompt_eval_count"] or 0
+        known = self.prefixes.get(name)
+        # Si el servidor ya lo tenía en caché, la medición sale corta:
+        # se conserva la mayor observada.
+        if known is None or tokens > known["tokens"]:
+            ms_per_token = (stats["prompt_eval_duration_ms"] or 0) / tokens if tokens else 0.0
+            self.prefixes[name] = {
+                "tokens": tokens, "chars": len(system_prompt), "ms_per_token": ms_per_token,
+            }
+
+    def _score_prefix(self, name: str, messages: list[dict[str, str]]) -> None:
+        """
+        Marcar la última llamada como hit/miss del prefijo y su ahorro.
+
+        En un hit Ollama sólo evalúa lo que sigue al prefijo; en un miss evalúa
+        el prompt completo. El sufijo puede ser más largo que el prefijo (una
+        respuesta de la BD en el formateo), así que se compara contra el
+        tamaño del prompt completo, estimado con los tokens por carácter del
+        prefijo medido en warm_prefix(). El umbral queda a medio prefijo del
+        sufijo estimado para tolerar el error de esa estimación.
+        """
+        prefix = self.prefixes.get(name)
+        evaluated = self.last_stats.get("prompt_eval_count")
+        if not prefix or not prefix["tokens"] or not prefix.get("chars") or evaluated is None:
+            return
+        chars = sum(len(m.get("content") or "") for m in messages)
+        total = prefix["tokens"] * chars / prefix["chars"]
+        hit = evaluated <= total - prefix["tokens"] + prefix["tokens"] / 2
+        saved = int(prefix["tokens"]) if hit else 0
+        self.last_stats.update({
+            "prefix": name,
+            "prefix_hit": hit,
+            "prefix_tokens_saved": saved,
+            "prefix_ms_saved": round(saved * prefix["ms_per_token"], 2),
+        })
+        PREFIX_CACHE.inc(prefix=name, result="hit" if hit else "miss")
+        if saved:
+            PREFIX_TOKENS_SAVED.inc(saved, prefix=name)
+
+    def chat_with_tools(
+        self,
+        messages: list[dict[str, str]],
+        tools: list[dict[str, Any]],
+        temperature: float = 0.0,
+        num_predict: Optional[int] = None,
+    ) -> list[dict[str, Any]]:
+        """
+        Let the model pick one of the given tools instead of answering in text.
+        
+        Args:
+            messages: List of message dictionaries with 'role' and 'content' keys.
+            tools: Tool definitions in Ollama/OpenAI function format.
+            temperature: Sampling temperature (0.0 to 1.0).
+            num_predict: Optional cap on generated tokens.
+        
+        Returns:
+            Requested calls as [{"name": str, "arguments": dict}, ...];
+            empty if the model answered without calling a tool.
+            
+        Raises:
+            LLMConnectionError: If Ollama service is unavailable or generation fails.
+        """
+        if not self.is_available():
+            raise LLMConnectionError(
+                f"Ollama service is not available. "
+                f"Please ensure Ollama is running and model '{self.model_name}' is installed."
+            )
+        
+        try:
+            with self._observe("tools"):
+                response = ollama.chat(
+                    model=self.model_name,
+                    messages=messages,
+                    tools=tools,
+                    options=self._build_options(temperature, num_predict),
+                    keep_alive=KEEP_ALIVE
+                )
+            self._record_response("tools", response)
+            tool_calls = response['message'].get('tool_calls') or []
+            return [
+                {
+                    "name": call['function']['name'],
+                    "arguments": dict(call['function'].get('arguments') or {}),
+                }
+                for call in tool_calls
+            ]
+        except Exception as e:
+            raise LLMConnectionError(f"Failed to generate tool call: {e}")
+
+
+def prefix_cache_report() -> dict[str, dict[str, float]]:
+    """Aciertos y tokens ahorrados por prefijo fijo (acumulado del proceso)."""
+    report: dict[str, dict[str, float]] = {}
+    for labels, counter in PREFIX_CACHE.series():
+        entry = report.setdefault(labels["prefix"], {"hit": 0, "miss": 0, "tokens_saved": 0})
+        entry[labels["result"]] += counter.value
+    for labels, counter in PREFIX_TOKENS_SAVED.series():
+        entry = report.setdefault(labels["prefix"], {"hit": 0, "miss": 0, "tokens_saved": 0})
+        entry["tokens_saved"] = counter.value
+    for entry in report.values():
+        total = entry["hit"] + entry["miss"]
+        entry["hit_rate"] = round(entry["hit"] / total, 3) if total else 0.0
+    return report
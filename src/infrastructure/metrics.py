@@ -0,0 +1,453 @@
+"""
+Métricas en proceso para el pipeline del asistente.
+
+Un registro único (REGISTRY) agrupa contadores, gauges e histogramas con
+etiquetas. Se exporta en formato de texto de Prometheus mediante
+`render_prometheus()` o el endpoint HTTP de `start_metrics_server()`.
+
+Los tiempos por etapa de RAGAgent.get_answer se acumulan en el histograma
+`nexa_stage_duration_seconds{stage=...}`.
+"""
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Buckets en segundos: cubren desde consultas SQL (ms) hasta generaciones lentas.
+DEFAULT_LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+
+class Counter:
+    """Contador monotónico thread-safe."""
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+
+class Gauge:
+    """Valor instantáneo que puede subir o bajar."""
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self._value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.inc(-amount)
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+
+class Histogram:
+    """
+    Histograma acumulativo thread-safe con buckets fijos.
+    """
+
+    def __init__(self, name: str = "", buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        self.name = name
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # último = +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        """Registrar una observación (en segundos)."""
+        index = len(self.buckets)
+        for i, upper in enumerate(self.buckets):
+            if value <= upper:
+                index = i
+                break
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def sum(self) -> float:
+        return self._sum
+
+    def cumulative_counts(self) -> List[int]:
+        """Conteos acumulados por bucket (el último corresponde a +Inf)."""
+        with self._lock:
+            counts = list(self._counts)
+        total = 0
+        cumulative = []
+        for c in counts:
+            total += c
+            cumulative.append(total)
+        return cumulative
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Cuantil aproximado por interpolación lineal dentro del bucket.
+        Devuelve None si no hay observaciones.
+        """
+        cumulative = self.cumulative_counts()
+        total = cumulative[-1]
+        if total == 0:
+            return None
+        rank = q * total
+        lower = 0.0
+        previous = 0
+        for i, upper in enumerate(self.buckets):
+            if cumulative[i] >= rank:
+                in_bucket = cumulative[i] - previous
+                if in_bucket == 0:
+                    return upper
+                return lower + (upper - lower) * (rank - previous) / in_bucket
+            lower, previous = upper, cumulative[i]
+        # Cae en +Inf: lo mejor que sabemos es el último límite
+        return self.buckets[-1]
+
+    def snapshot(self) -> Dict[str, Optional[float]]:
+        """Resumen (segundos) para mostrar o exportar."""
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class MetricFamily:
+    """
+    Métrica con nombre, ayuda y etiquetas; cada combinación de valores de
+    etiquetas es una serie independiente creada bajo demanda.
+    """
+
+    def __init__(self, name: str, help: str, kind: str,
+                 labelnames: Sequence[str], factory: Callable[[], object]):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self._factory = factory
+        self._series: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **values: object):
+        key = tuple(str(values.get(label, "")) for label in self.labelnames)
+        child = self._series.get(key)
+        if child is None:
+            with self._lock:
+                child = self._series.setdefault(key, self._factory())
+        return child
+
+    # Atajos para familias sin etiquetas o con etiquetas por keyword
+    def inc(self, amount: float = 1.0, **labels: object) -> None:
+        self.labels(**labels).inc(amount)
+
+    def dec(self, amount: float = 1.0, **labels: object) -> None:
+        self.labels(**labels).dec(amount)
+
+    def set(self, value: float, **labels: object) -> None:
+        self.labels(**labels).set(value)
+
+    def observe(self, value: float, **labels: object) -> None:
+        self.labels(**labels).observe(value)
+
+    def series(self) -> List[Tuple[Dict[str, str], object]]:
+        with self._lock:
+            items = list(self._series.items())
+        return [(dict(zip(self.labelnames, key)), child) for key, child in items]
+
+
+class MetricsRegistry:
+    """
+    Registro de métricas del proceso. Registrar dos veces el mismo nombre
+    devuelve la familia existente (Streamlit re-ejecuta los módulos de la UI).
+    """
+
+    def __init__(self):
+        self._families: Dict[str, MetricFamily] = {}
+        self._callbacks: Dict[str, Tuple[str, Callable[[], Dict[Tuple[Tuple[str, str], ...], float]]]] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, name, help, kind, labelnames, factory) -> MetricFamily:
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = MetricFamily(name, help, kind, labelnames, factory)
+                self._families[name] = family
+            return family
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> MetricFamily:
+        return self._register(name, help, "counter", labelnames, Counter)
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> MetricFamily:
+        return self._register(name, help, "gauge", labelnames, Gauge)
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> MetricFamily:
+        return self._register(name, help, "histogram", labelnames,
+                              lambda: Histogram(name, buckets))
+
+    def gauge_callback(self, name: str, help: str,
+                       callback: Callable[[], Dict[Tuple[Tuple[str, str], ...], float]]) -> None:
+        """
+        Gauge calculado al momento del scrape. `callback` devuelve
+        {((etiqueta, valor), ...): valor}.
+        """
+        with self._lock:
+            self._callbacks[name] = (help, callback)
+
+    def family(self, name: str) -> Optional[MetricFamily]:
+        return self._families.get(name)
+
+    def render_prometheus(self) -> str:
+        """Exportar todas las métricas en formato de texto de Prometheus 0.0.4."""
+        with self._lock:
+            families = list(self._families.values())
+            callbacks = list(self._callbacks.items())
+        lines: List[str] = []
+        for family in families:
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for labels, child in family.series():
+                if family.kind == "histogram":
+                    cumulative = child.cumulative_counts()
+                    for upper, count in zip(list(child.buckets) + ["+Inf"], cumulative):
+                        le = upper if upper == "+Inf" else _format_value(upper)
+                        lines.append(
+                            f"{family.name}_bucket{_format_labels(labels, le=le)} {count}"
+                        )
+                    lines.append(f"{family.name}_sum{_format_labels(labels)} {_format_value(child.sum)}")
+                    lines.append(f"{family.name}_count{_format_labels(labels)} {child.count}")
+                else:
+                    lines.append(f"{family.name}{_format_labels(labels)} {_format_value(child.value)}")
+        for name, (help, callback) in callbacks:
+            try:
+                values = callback()
+            except Exception:
+                continue
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} gauge")
+            for label_items, value in values.items():
+                lines.append(f"{name}{_format_labels(dict(label_items))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_value(value: float) -> str:
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels: Dict[str, str], **extra: object) -> str:
+    items = {**labels, **{k: str(v) for k, v in extra.items()}}
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in items.items()) + "}"
+
+
+def _escape_label(value: object) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REGISTRY = MetricsRegistry()
+
+# ----------------------------------------------------------------------
+# Métricas compartidas del pipeline
+# ----------------------------------------------------------------------
+STAGE_DURATION = REGISTRY.histogram(
+    "nexa_stage_duration_seconds",
+    "Duración de cada etapa de RAGAgent.get_answer.",
+    ("stage",),
+)
+QUESTIONS = REGISTRY.counter(
+    "nexa_questions_total",
+    "Preguntas procesadas por el agente, por modo y resultado.",
+    ("mode", "outcome"),
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    "nexa_cache_requests_total",
+    "Consultas a cachés en proceso (result=hit|miss).",
+    ("cache", "result"),
+)
+QUEUE_DEPTH = REGISTRY.gauge(
+    "nexa_queue_depth",
+    "Elementos pendientes en colas internas.",
+    ("queue",),
+)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """Contabilizar un acierto/fallo de la caché `cache`."""
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def stage_histogram(stage: str) -> Histogram:
+    """Histograma de la etapa `stage`."""
+    return STAGE_DURATION.labels(stage=stage)
+
+
+def stage_histograms_snapshot() -> Dict[str, Dict[str, Optional[float]]]:
+    """Resumen de todas las etapas observadas en este proceso."""
+    return {labels["stage"]: h.snapshot() for labels, h in STAGE_DURATION.series()}
+
+
+@contextmanager
+def timed_stage(timings: Dict[str, float], stage: str) -> Iterator[None]:
+    """
+    Mide el bloque con un reloj monotónico, guarda la duración en
+    `timings[stage]` (milisegundos), la acumula en el histograma de la etapa
+    y la registra como span de la traza activa.
+    """
+    from .tracing import span
+
+    start = time.perf_counter()
+    try:
+        with span(stage):
+            yield
+    finally:
+        elapsed = time.perf_counter() - start
+        timings[stage] = round(elapsed * 1000, 2)
+        stage_histogram(stage).observe(elapsed)
+
+
+# ----------------------------------------------------------------------
+# Repositorios
+# ----------------------------------------------------------------------
+REPOSITORY_DURATION = REGISTRY.histogram(
+    "nexa_repository_operation_duration_seconds",
+    "Duración de las operaciones públicas de los repositorios.",
+    ("repository", "operation"),
+)
+REPOSITORY_ERRORS = REGISTRY.counter(
+    "nexa_repository_errors_total",
+    "Operaciones de repositorio que lanzaron una excepción.",
+    ("repository", "operation"),
+)
+
+
+def instrumented(repository: str):
+    """
+    Decorador de clase: mide, cuenta errores y traza cada método público.
+    """
+    def decorate(cls):
+        for name, attr in list(vars(cls).items()):
+            if name.startswith("_") or not inspect.isfunction(attr):
+                continue
+            setattr(cls, name, _instrument_method(attr, repository, name))
+        return cls
+    return decorate
+
+
+def _instrument_method(method, repository: str, operation: str):
+    from .tracing import span
+
+    if inspect.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def async_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                with span(f"{repository}.{operation}"):
+                    return await method(*args, **kwargs)
+            except Exception:
+                REPOSITORY_ERRORS.inc(repository=repository, operation=operation)
+                raise
+            finally:
+                REPOSITORY_DURATION.observe(
+                    time.perf_counter() - start, repository=repository, operation=operation
+                )
+        return async_wrapper
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            with span(f"{repository}.{operation}"):
+                return method(*args, **kwargs)
+        except Exception:
+            REPOSITORY_ERRORS.inc(repository=repository, operation=operation)
+            raise
+        finally:
+            REPOSITORY_DURATION.observe(
+                time.perf_counter() - start, repository=repository, operation=operation
+            )
+    return wrapper
+
+
+# ----------------------------------------------------------------------
+# Endpoint HTTP de scrape
+# ----------------------------------------------------------------------
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] == "/metrics":
+            body = REGISTRY.render_prometheus().encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path.split("?")[0] == "/traces":
+            from .tracing import recent_traces
+            body = json.dumps(recent_traces(), default=str).encode("utf-8")
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Silenciar el log por request del servidor HTTP
+        pass
+
+
+def start_metrics_server(port: Optional[int] = None, host: Optional[str] = None) -> Optional[int]:
+    """
+    Levantar (una sola vez por proceso) el endpoint /metrics en un hilo daemon.
+
+    Sin `port` se usa NEXA_METRICS_PORT; si no está definido no se levanta
+    nada. Devuelve el puerto en uso o None.
+    """
+    global _server
+    if port is None:
+        env_port = os.getenv("NEXA_METRICS_PORT")
+        if not env_port:
+            return None
+        port = int(env_port)
+    host = host or os.getenv("NEXA_METRICS_HOST", "127.0.0.1")
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            _server.daemon_threads = True
+            threading.Thread(
+                target=_server.serve_forever, name="nexa-metrics", daemon=True
+            ).start()
+        return _server.server_address[1]
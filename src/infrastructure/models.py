@@ -65,3 +65,50 @@ class HospitalAreaModel(Base):
     
     def __repr__(self) -> str:
         return f"<HospitalAreaModel(id={self.id}, nombre={self.nombre})>"
+
+class BuildingModel(Base):
+    """
+    ORM model for the 'edificios' table.
+    """
+    __tablename__ = "edificios"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    nombre_edificio = Column(String(50), nullable=False)
+    codigo_interno = Column(String(10), unique=True, nullable=False)
+    descripcion = Column(Text)
+
+class FloorModel(Base):
+    """
+    ORM model for the 'pisos' table.
+    """
+    __tablename__ = "pisos"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    edificio_id = Column(Integer, ForeignKey("edificios.id", ondelete="CASCADE"))
+    nivel_numero = Column(Integer, nullable=False)
+    nombre_piso = Column(String(50))
+
+class UnitModel(Base):
+    """
+    ORM model for the 'unidades_hospitalarias' table.
+    """
+    __tablename__ = "unidades_hospitalarias"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    piso_id = Column(Integer, ForeignKey("pisos.id", ondelete="CASCADE"))
+    nombre_unidad = Column(String(100), nullable=False)
+    tipo_servicio = Column(String(50))
+    horario_atencion = Column(String(100))
+    created_at = Column(DateTime, server_default=func.now())
+
+class DirectoryModel(Base):
+    """
+    ORM model for the 'directorio_telefonico' table.
+    """
+    __tablename__ = "directorio_telefonico"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    numero_anexo = Column(Integer, nullable=False)
+    nombre_referencia = Column(String(150), nullable=False)
+    unidad_id = Column(Integer, ForeignKey("unidades_hospitalarias.id"))
+    created_at = Column(DateTime, server_default=func.now())
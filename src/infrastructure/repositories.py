@@ -1,13 +1,60 @@
 """
 Concrete implementations of repository interfaces using SQLAlchemy.
 """
-from typing import List, Optional
-from sqlalchemy.orm import Session
-from src.domain.entities import Patient, HospitalArea, User, UserRole
-from src.domain.interfaces import PatientRepository, HospitalAreaRepository, UserRepository
-from .models import PatientModel, HospitalAreaModel, UserModel, RoleModel
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, joinedload
+from src.domain.entities import Patient, HospitalArea, User, UserRole, DirectoryEntry, UnitLocation
+from src.domain.interfaces import PatientRepository, HospitalAreaRepository, UserRepository, DirectoryRepository
+from .models import (
+    PatientModel, HospitalAreaModel, UserModel, RoleModel,
+    BuildingModel, FloorModel, UnitModel, DirectoryModel,
+)
 from .database import DatabaseManager
 from .exceptions import PatientNotFoundError, AreaNotFoundError
+from .metrics import record_cache
+
+def unaccent_ilike(column, term: str):
+    """
+    Accent- and case-insensitive partial match on `column`.
+
+    Uses the IMMUTABLE `f_unaccent` wrapper (database/06_rag_indexes.sql) so
+    PostgreSQL can serve it from the trigram expression indexes. LIKE
+    wildcards in `term` are escaped and matched literally.
+    """
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return func.f_unaccent(column).ilike(func.f_unaccent(f"%{escaped}%"), escape="\\")
+
+# Emails que no existen -> momento en que expira esa respuesta negativa.
+# Es del proceso (compartida entre sesiones) y se invalida al crear usuarios.
+LOGIN_NEGATIVE_TTL_S = float(os.getenv("NEXA_LOGIN_NEGATIVE_TTL_S", "30"))
+# Tope de emails recordados: un barrido de emails inventados no crece la memoria
+LOGIN_NEGATIVE_MAX = int(os.getenv("NEXA_LOGIN_NEGATIVE_MAX", "10000"))
+_unknown_emails: Dict[str, float] = {}
+_unknown_emails_lock = threading.Lock()
+
+def _remember_unknown_email(email: str, now: float) -> None:
+    with _unknown_emails_lock:
+        _unknown_emails.pop(email, None)
+        # TTL fijo: el orden de inserción es el de vencimiento. Se podan las
+        # vencidas y, si sigue lleno, las más antiguas.
+        while _unknown_emails:
+            oldest = next(iter(_unknown_emails))
+            if _unknown_emails[oldest] > now and len(_unknown_emails) < LOGIN_NEGATIVE_MAX:
+                break
+            del _unknown_emails[oldest]
+        _unknown_emails[email] = now + LOGIN_NEGATIVE_TTL_S
+
+def forget_unknown_email(email: Optional[str] = None) -> None:
+    """Invalidar la caché negativa de login para `email` (o completa)."""
+    with _unknown_emails_lock:
+        if email is None:
+            _unknown_emails.clear()
+        else:
+            _unknown_emails.pop(email, None)
 
 class SQLUserRepository:
     """
@@ -16,7 +63,13 @@ class SQLUserRepository:
     def __init__(self, db_manager: DatabaseManager):
         self.db_manager = db_manager
 
-    def _model_to_entity(self, model: UserModel) -> User:
+    @staticmethod
+    def _user_query():
+        # Usuario + rol en un solo JOIN (rol_id es NOT NULL): sin lazy load
+        return select(UserModel).options(joinedload(UserModel.role, innerjoin=True))
+
+    @staticmethod
+    def _model_to_entity(model: UserModel) -> User:
         return User(
             id=str(model.id),
             rut=model.rut,
@@ -31,20 +84,53 @@ class SQLUserRepository:
         )
 
     def get_user_by_email(self, email: str) -> Optional[User]:
-        with self.db_manager.get_session() as session:
-            model = session.query(UserModel).filter(UserModel.email == email).first()
+        with self.db_manager.get_session(readonly=True) as session:
+            model = session.scalars(self._user_query().where(UserModel.email == email).limit(1)).first()
             return self._model_to_entity(model) if model else None
 
     def get_user_by_rut(self, rut: str) -> Optional[User]:
-        with self.db_manager.get_session() as session:
-            model = session.query(UserModel).filter(UserModel.rut == rut).first()
+        with self.db_manager.get_session(readonly=True) as session:
+            model = session.scalars(self._user_query().where(UserModel.rut == rut).limit(1)).first()
             return self._model_to_entity(model) if model else None
 
-    def get_password_hash(self, user_id: str) -> Optional[str]:
+    def get_login_record(self, email: str) -> Optional[Tuple[User, str]]:
+        """
+        Usuario y hash de contraseña para `email` en una sola consulta
+        (usuarios JOIN roles por el índice único de email).
+
+        Los emails inexistentes se recuerdan LOGIN_NEGATIVE_TTL_S segundos
+        para que los reintentos no vuelvan a la base. Se lee del primario: en
+        una réplica atrasada un usuario recién creado quedaría como inexistente.
+        """
+        now = time.monotonic()
+        expires = _unknown_emails.get(email)
+        if expires is not None:
+            if expires > now:
+                record_cache("login_negative", hit=True)
+                return None
+            forget_unknown_email(email)
+        record_cache("login_negative", hit=False)
+
         with self.db_manager.get_session() as session:
+            model = session.scalars(self._user_query().where(UserModel.email == email).limit(1)).first()
+            if model is None:
+                if LOGIN_NEGATIVE_TTL_S > 0 and LOGIN_NEGATIVE_MAX > 0:
+                    _remember_unknown_email(email, now)
+                return None
+            return self._model_to_entity(model), model.password_hash
+
+    def get_password_hash(self, user_id: str) -> Optional[str]:
+        with self.db_manager.get_session(readonly=True) as session:
             model = session.query(UserModel).filter(UserModel.id == user_id).first()
             return model.password_hash if model else None
 
+    def update_password_hash(self, user_id: str, password_hash: str) -> None:
+        """Reemplazar el hash (rehash al loguear cuando cambia el costo de bcrypt)."""
+        with self.db_manager.get_session() as session:
+            session.query(UserModel).filter(UserModel.id == user_id).update(
+                {UserModel.password_hash: password_hash}, synchronize_session=False
+            )
+
 class SQLPatientRepository:
     """
     SQLAlchemy implementation of PatientRepository.
@@ -59,7 +145,8 @@ class SQLPatientRepository:
         """
         self.db_manager = db_manager
     
-    def _model_to_entity(self, model: PatientModel) -> Patient:
+    @staticmethod
+    def _model_to_entity(model: PatientModel) -> Patient:
         """
         Convert ORM model to domain entity.
         
@@ -88,7 +175,7 @@ class SQLPatientRepository:
         Returns:
             Patient entity if found, None otherwise.
         """
-        with self.db_manager.get_session() as session:
+        with self.db_manager.get_session(readonly=True) as session:
             model = session.query(PatientModel).filter(PatientModel.id == id).first()
             return self._model_to_entity(model) if model else None
     
@@ -102,7 +189,7 @@ class SQLPatientRepository:
         Returns:
             List of matching Patient entities.
         """
-        with self.db_manager.get_session() as session:
+        with self.db_manager.get_session(readonly=True) as session:
             models = session.query(PatientModel).filter(
                 PatientModel.nombre_completo.ilike(f"%{name}%")
             ).all()
@@ -118,7 +205,7 @@ class SQLPatientRepository:
         Returns:
             List of Patient entities with the specified status.
         """
-        with self.db_manager.get_session() as session:
+        with self.db_manager.get_session(readonly=True) as session:
             models = session.query(PatientModel).filter(
                 PatientModel.estado == status
             ).all()
@@ -138,7 +225,8 @@ class SQLHospitalAreaRepository:
         """
         self.db_manager = db_manager
     
-    def _model_to_entity(self, model: HospitalAreaModel) -> HospitalArea:
+    @staticmethod
+    def _model_to_entity(model: HospitalAreaModel) -> HospitalArea:
         """
         Convert ORM model to domain entity.
         
@@ -162,7 +250,7 @@ class SQLHospitalAreaRepository:
         Returns:
             List of all HospitalArea entities.
         """
-        with self.db_manager.get_session() as session:
+        with self.db_manager.get_session(readonly=True) as session:
             models = session.query(HospitalAreaModel).all()
             return [self._model_to_entity(model) for model in models]
     
@@ -176,8 +264,112 @@ class SQLHospitalAreaRepository:
         Returns:
             HospitalArea entity if found, None otherwise.
         """
-        with self.db_manager.get_session() as session:
+        with self.db_manager.get_session(readonly=True) as session:
             model = session.query(HospitalAreaModel).filter(
                 HospitalAreaModel.nombre.ilike(name)
             ).first()
             return self._model_to_entity(model) if model else None
+
+class SQLDirectoryRepository:
+    """
+    SQLAlchemy implementation of DirectoryRepository.
+
+    Every lookup is a fixed, parameterised query on indexed columns; these are
+    the only queries the tool-calling agent can trigger.
+    """
+    
+    def __init__(self, db_manager: DatabaseManager):
+        """
+        Initialize the repository with a database manager.
+        
+        Args:
+            db_manager: DatabaseManager instance for session handling.
+        """
+        self.db_manager = db_manager
+    
+    @staticmethod
+    def _location_query():
+        return (
+            select(
+                UnitModel.nombre_unidad,
+                FloorModel.nombre_piso,
+                FloorModel.nivel_numero,
+                BuildingModel.nombre_edificio,
+            )
+            .join(FloorModel, UnitModel.piso_id == FloorModel.id)
+            .join(BuildingModel, FloorModel.edificio_id == BuildingModel.id)
+        )
+    
+    @staticmethod
+    def _row_to_location(row) -> UnitLocation:
+        return UnitLocation(
+            unit_name=row.nombre_unidad,
+            floor_name=row.nombre_piso,
+            floor_level=row.nivel_numero,
+            building_name=row.nombre_edificio,
+        )
+    
+    def search_directory(self, name: str, limit: int = 5) -> List[DirectoryEntry]:
+        """
+        Find phone extensions by person/office name.
+        
+        Args:
+            name: Name or partial name (accents and case are ignored).
+            limit: Maximum number of entries.
+            
+        Returns:
+            List of matching DirectoryEntry entities.
+        """
+        with self.db_manager.get_session(readonly=True) as session:
+            rows = session.execute(
+                select(DirectoryModel.nombre_referencia, DirectoryModel.numero_anexo)
+                .where(unaccent_ilike(DirectoryModel.nombre_referencia, name))
+                .order_by(DirectoryModel.nombre_referencia)
+                .limit(limit)
+            ).all()
+            return [DirectoryEntry(name=r.nombre_referencia, extension=r.numero_anexo) for r in rows]
+    
+    def find_location(self, unit_name: str, limit: int = 5) -> List[UnitLocation]:
+        """
+        Find the building and floor of a hospital unit.
+        
+        Args:
+            unit_name: Name or partial name of the unit.
+            limit: Maximum number of locations.
+            
+        Returns:
+            List of matching UnitLocation entities.
+        """
+        with self.db_manager.get_session(readonly=True) as session:
+            rows = session.execute(
+                self._location_query()
+                .where(unaccent_ilike(UnitModel.nombre_unidad, unit_name))
+                .order_by(UnitModel.nombre_unidad)
+                .limit(limit)
+            ).all()
+            return [self._row_to_location(r) for r in rows]
+    
+    def list_units_on_floor(self, floor_level: int, building: Optional[str] = None,
+                            limit: int = 50) -> List[UnitLocation]:
+        """
+        List the units located on a floor.
+        
+        Args:
+            floor_level: Floor level number (e.g., -1 for 'Zócalo').
+            building: Optional building name or internal code to narrow the search.
+            limit: Maximum number of units.
+            
+        Returns:
+            List of UnitLocation entities on that floor.
+        """
+        query = self._location_query().where(FloorModel.nivel_numero == floor_level)
+        if building:
+            query = query.where(
+                unaccent_ilike(BuildingModel.nombre_edificio, building)
+                | (func.upper(BuildingModel.codigo_interno) == building.strip().upper())
+            )
+        with self.db_manager.get_session(readonly=True) as session:
+            rows = session.execute(
+                query.order_by(BuildingModel.nombre_edificio, UnitModel.nombre_unidad).limit(limit)
+            ).all()
+            return [self._row_to_location(r) for r in rows]
@@ -1,15 +1,204 @@
+"""
+Hashing de contraseñas (bcrypt) y limitación de intentos de login.
+
+bcrypt se ejecuta en un pool de procesos acotado: no compite por el GIL con
+los reruns de Streamlit y un pico de logins al inicio del turno se encola en
+lugar de ocupar todos los hilos del servidor.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
+
 import bcrypt
 
-def hash_password(password: str) -> str:
+from .exceptions import LoginThrottledError
+from .metrics import REGISTRY
+
+# Costo de bcrypt para hashes nuevos; los hashes con otro costo se rehashean al loguear
+BCRYPT_ROUNDS = int(os.getenv("NEXA_BCRYPT_ROUNDS", "12"))
+# Procesos del pool (0 = bcrypt en el hilo que llama)
+BCRYPT_WORKERS = int(os.getenv("NEXA_BCRYPT_WORKERS", str(max(1, min(4, (os.cpu_count() or 2) // 2)))))
+# Trabajos de bcrypt en vuelo (ejecutándose + en cola) antes de rechazar logins
+BCRYPT_MAX_PENDING = int(os.getenv("NEXA_BCRYPT_MAX_PENDING", str(max(1, BCRYPT_WORKERS) * 8)))
+
+# Fallos permitidos por cuenta / por IP dentro de la ventana antes de bloquear
+LOGIN_MAX_FAILURES_ACCOUNT = int(os.getenv("NEXA_LOGIN_MAX_FAILURES_ACCOUNT", "5"))
+LOGIN_MAX_FAILURES_IP = int(os.getenv("NEXA_LOGIN_MAX_FAILURES_IP", "20"))
+LOGIN_WINDOW_S = float(os.getenv("NEXA_LOGIN_WINDOW_S", "300"))
+LOGIN_LOCKOUT_S = float(os.getenv("NEXA_LOGIN_LOCKOUT_S", "300"))
+# Tope de cuentas/IPs seguidas: un barrido de emails inventados no crece la memoria
+LOGIN_THROTTLE_MAX_KEYS = int(os.getenv("NEXA_LOGIN_THROTTLE_MAX_KEYS", "10000"))
+
+BCRYPT_DURATION = REGISTRY.histogram(
+    "nexa_bcrypt_duration_seconds",
+    "Duración de hash/verify de bcrypt, incluida la espera en el pool.",
+    ("operation",),
+)
+LOGIN_THROTTLED = REGISTRY.counter(
+    "nexa_login_throttled_total", "Intentos de login rechazados por límite.", ("scope",)
+)
+
+# ----------------------------------------------------------------------
+# ⚙️ Pool de bcrypt
+# ----------------------------------------------------------------------
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_pending = threading.BoundedSemaphore(BCRYPT_MAX_PENDING)
+
+
+def _hashpw(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _checkpw(plain_password: str, hashed_password: str) -> bool:
+    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn: hacer fork desde un servidor con hilos no es seguro
+                _pool = ProcessPoolExecutor(
+                    max_workers=BCRYPT_WORKERS, mp_context=multiprocessing.get_context("spawn")
+                )
+    return _pool
+
+
+def _run(operation: str, fn, *args):
+    start = time.perf_counter()
+    try:
+        if BCRYPT_WORKERS <= 0:
+            return fn(*args)
+        if not _pending.acquire(blocking=False):
+            LOGIN_THROTTLED.inc(scope="busy")
+            raise LoginThrottledError("busy", retry_after=1.0)
+        try:
+            return _get_pool().submit(fn, *args).result()
+        finally:
+            _pending.release()
+    finally:
+        BCRYPT_DURATION.observe(time.perf_counter() - start, operation=operation)
+
+
+def shutdown_pool() -> None:
+    """Cerrar los procesos de bcrypt (al apagar el servidor)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
+
+
+def hash_password(password: str, rounds: Optional[int] = None) -> str:
     """
     Hash a password using bcrypt.
     """
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed.decode('utf-8')
+    return _run("hash", _hashpw, password, rounds or BCRYPT_ROUNDS)
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     Verify a plain password against a hashed password.
     """
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    return _run("verify", _checkpw, plain_password, hashed_password)
+
+
+def needs_rehash(hashed_password: str, rounds: Optional[int] = None) -> bool:
+    """True si el hash no usa el costo configurado (`$2b$<costo>$...`)."""
+    try:
+        cost = int(hashed_password.split("$")[2])
+    except (IndexError, ValueError):
+        return True
+    return cost != (rounds or BCRYPT_ROUNDS)
+
+
+# ----------------------------------------------------------------------
+# 🚦 Limitación de intentos
+# ----------------------------------------------------------------------
+class LoginThrottle:
+    """
+    Cuenta fallos de login por cuenta y por IP en una ventana deslizante.
+
+    Al superar el máximo, la cuenta (o la IP) queda bloqueada `lockout_s`
+    segundos: `check` lanza LoginThrottledError antes de tocar la base o
+    bcrypt, así un ataque no consume CPU del servidor.
+
+    Las entradas vencidas se podan al registrar fallos, y como mucho se
+    siguen `max_keys` claves por diccionario (se descartan las más antiguas).
+    """
+
+    def __init__(self, max_account_failures: int = LOGIN_MAX_FAILURES_ACCOUNT,
+                 max_ip_failures: int = LOGIN_MAX_FAILURES_IP,
+                 window_s: float = LOGIN_WINDOW_S, lockout_s: float = LOGIN_LOCKOUT_S,
+                 max_keys: int = LOGIN_THROTTLE_MAX_KEYS, clock=time.monotonic):
+        self.limits = {"account": max_account_failures, "ip": max_ip_failures}
+        self.window_s = window_s
+        self.lockout_s = lockout_s
+        self.max_keys = max(1, max_keys)
+        self.clock = clock
+        self._failures: Dict[Tuple[str, str], list] = {}
+        self._locked_until: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _keys(email: str, ip: Optional[str]):
+        keys = [("account", (email or "").strip().lower())]
+        if ip:
+            keys.append(("ip", ip))
+        return keys
+
+    def check(self, email: str, ip: Optional[str] = None) -> None:
+        """Lanza LoginThrottledError si la cuenta o la IP están bloqueadas."""
+        now = self.clock()
+        with self._lock:
+            for key in self._keys(email, ip):
+                until = self._locked_until.get(key)
+                if until is None:
+                    continue
+                if until > now:
+                    LOGIN_THROTTLED.inc(scope=key[0])
+                    raise LoginThrottledError(key[0], retry_after=until - now)
+                del self._locked_until[key]
+
+    def _prune(self, now: float) -> None:
+        # Ambos diccionarios están en orden de última actividad (se reinsertan
+        # al actualizar), así que lo vencido o más antiguo está al principio.
+        while self._failures:
+            key, times = next(iter(self._failures.items()))
+            if times and now - times[-1] < self.window_s and len(self._failures) < self.max_keys:
+                break
+            del self._failures[key]
+        while self._locked_until:
+            key, until = next(iter(self._locked_until.items()))
+            if until > now and len(self._locked_until) < self.max_keys:
+                break
+            del self._locked_until[key]
+
+    def record_failure(self, email: str, ip: Optional[str] = None) -> None:
+        now = self.clock()
+        with self._lock:
+            self._prune(now)
+            for key in self._keys(email, ip):
+                recent = [t for t in self._failures.pop(key, []) if now - t < self.window_s]
+                recent.append(now)
+                if len(recent) >= self.limits[key[0]]:
+                    self._locked_until.pop(key, None)
+                    self._locked_until[key] = now + self.lockout_s
+                    continue
+                self._failures[key] = recent
+
+    def record_success(self, email: str, ip: Optional[str] = None) -> None:
+        """Un login correcto limpia los fallos de la cuenta (no los de la IP)."""
+        key = self._keys(email, None)[0]
+        with self._lock:
+            self._failures.pop(key, None)
+            self._locked_until.pop(key, None)
+
+
+# Limitador del proceso (compartido por todas las sesiones de Streamlit)
+LOGIN_THROTTLE = LoginThrottle()
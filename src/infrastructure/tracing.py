@@ -0,0 +1,151 @@
+"""
+Trazas ligeras por pregunta.
+
+Cada pregunta abre una traza con un request_id (UUID) que se propaga por
+contextvars a todos los spans del pipeline: etapas de get_answer, llamadas a
+Ollama y consultas SQL. El mismo request_id se usa como id de la fila de
+`historial_consultas`, de modo que una fila de auditoría se puede cruzar con
+su traza.
+
+Las trazas terminadas se escriben como una línea JSON en el logger
+"nexa.trace" y se guardan en un buffer circular (ver `recent_traces()`).
+"""
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger("nexa.trace")
+
+_MAX_RECENT_TRACES = 200
+_recent: deque = deque(maxlen=_MAX_RECENT_TRACES)
+_recent_lock = threading.Lock()
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("nexa_trace", default=None)
+_current_span: ContextVar[Optional[str]] = ContextVar("nexa_span", default=None)
+
+
+class Trace:
+    """Conjunto de spans de una misma pregunta."""
+
+    def __init__(self, request_id: str, name: str):
+        self.request_id = request_id
+        self.name = name
+        self.started_at = time.time()
+        self.spans: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add_span(self, span: Dict[str, Any]) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            "request_id": self.request_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "spans": spans,
+        }
+
+
+def new_request_id() -> str:
+    return str(uuid.uuid4())
+
+
+def current_request_id() -> Optional[str]:
+    """request_id de la traza activa (None fuera de una pregunta)."""
+    trace = _current_trace.get()
+    return trace.request_id if trace else None
+
+
+@contextmanager
+def start_trace(name: str, request_id: Optional[str] = None) -> Iterator[Trace]:
+    """
+    Abrir la traza de una pregunta. Si ya hay una traza activa se reutiliza
+    (p. ej. el caso de uso abre la traza y el agente la continúa).
+    """
+    active = _current_trace.get()
+    if active is not None:
+        yield active
+        return
+
+    trace = Trace(request_id or new_request_id(), name)
+    token = _current_trace.set(trace)
+    try:
+        with span(name):
+            yield trace
+    finally:
+        _current_trace.reset(token)
+        data = trace.to_dict()
+        with _recent_lock:
+            _recent.append(data)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(data, default=str, ensure_ascii=False))
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Registrar un span hijo del span actual. Fuera de una traza no hace nada
+    (salvo devolver el dict de atributos, que se puede seguir completando).
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield attributes
+        return
+
+    span_id = uuid.uuid4().hex[:16]
+    parent_id = _current_span.get()
+    token = _current_span.set(span_id)
+    start = time.perf_counter()
+    started_at = time.time()
+    error = None
+    try:
+        yield attributes
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        _current_span.reset(token)
+        record = {
+            "span_id": span_id,
+            "parent_id": parent_id,
+            "name": name,
+            "start": started_at,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+        }
+        if attributes:
+            record["attributes"] = attributes
+        if error:
+            record["error"] = error
+        trace.add_span(record)
+
+
+def record_span(name: str, duration_s: float, **attributes: Any) -> None:
+    """Añadir a la traza activa un span ya medido (p. ej. desde eventos SQLAlchemy)."""
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    record = {
+        "span_id": uuid.uuid4().hex[:16],
+        "parent_id": _current_span.get(),
+        "name": name,
+        "start": time.time() - duration_s,
+        "duration_ms": round(duration_s * 1000, 3),
+    }
+    if attributes:
+        record["attributes"] = attributes
+    trace.add_span(record)
+
+
+def recent_traces() -> List[Dict[str, Any]]:
+    """Últimas trazas terminadas en este proceso (más reciente al final)."""
+    with _recent_lock:
+        return list(_recent)
@@ -2,7 +2,10 @@
 import streamlit as st
 import pandas as pd
 from typing import Callable, List, Dict, Any, Optional
-from src.infrastructure.admin_repository import AdminRepository
+from src.infrastructure.admin_repository import (
+    ROLLUP_REFRESH_INTERVAL_S, AdminRepository, BulkResult, Page
+)
+from src.ui.grid_diff import changed_rows
 
 # ----------------------------------------------------------------------
 # Helper – Repository Loading
@@ -13,6 +16,109 @@ def _load_repo():
         st.session_state.admin_repo = AdminRepository()
     return st.session_state.admin_repo
 
+# ----------------------------------------------------------------------
+# Helper – Paginación por keyset
+# ----------------------------------------------------------------------
+def _paged(key: str, fetch: Callable[..., Page], page_size: int = 50) -> Page:
+    """
+    Buscador + botones Anterior/Siguiente para un get_*_page del repositorio.
+
+    Guarda en session_state la pila de cursores de las páginas visitadas: cada
+    rerun sólo trae la página actual, no la tabla completa.
+    """
+    search = st.text_input("🔎 Buscar", key=f"{key}_search")
+    state = st.session_state.setdefault(f"{key}_pager", {"search": search, "cursors": [None]})
+    if state["search"] != search:
+        state.update(search=search, cursors=[None])
+
+    try:
+        page = fetch(limit=page_size, cursor=state["cursors"][-1], search=search or None)
+    except ValueError:
+        # Cursor de otro orden/filtro: volver a la primera página
+        state["cursors"] = [None]
+        page = fetch(limit=page_size, cursor=None, search=search or None)
+
+    col_prev, col_info, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        if st.button("◀ Anterior", key=f"{key}_prev", disabled=len(state["cursors"]) == 1):
+            state["cursors"].pop()
+            st.rerun()
+    with col_info:
+        st.caption(f"Página {len(state['cursors'])} · {len(page.items)} registros")
+    with col_next:
+        if st.button("Siguiente ▶", key=f"{key}_next", disabled=page.next_cursor is None):
+            state["cursors"].append(page.next_cursor)
+            st.rerun()
+    return page
+
+# ----------------------------------------------------------------------
+# Helper – Resumen de auditoría
+# ----------------------------------------------------------------------
+def _render_audit_summary(repo: AdminRepository):
+    """Indicadores de uso leídos sólo del resumen por hora (nunca del historial completo)."""
+    try:
+        repo.refresh_rollups(max_age_s=ROLLUP_REFRESH_INTERVAL_S)
+    except Exception as e:
+        st.warning(f"⚠️ No se pudo actualizar el resumen: {e}")
+
+    hours = st.selectbox("Periodo", [24, 24 * 7, 24 * 30], index=1, key="audit_hours",
+                         format_func=lambda h: f"Últimas {h} horas" if h <= 24 else f"Últimos {h // 24} días")
+    summary = repo.get_audit_summary(hours=hours)
+    totals = summary["totals"]
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Consultas", totals["consultas"])
+    col2.metric("Tasa de error", f"{totals['tasa_error']:.1%}")
+    col3.metric("Sin resultados", totals["vacias"])
+    col4.metric("Desde caché", totals["aciertos_cache"])
+
+    if summary["hourly"]:
+        hourly = pd.DataFrame(summary["hourly"]).set_index("hora")
+        st.caption("Volumen por hora")
+        st.bar_chart(hourly[["consultas", "errores"]])
+        st.caption("Latencia promedio por hora (ms)")
+        st.line_chart(hourly[["promedio_ms"]])
+    if summary["shapes"]:
+        st.caption("Consultas por forma de SQL (el término buscado no distingue filas; "
+                   "la pregunta es sólo un ejemplo)")
+        st.dataframe(summary["shapes"], hide_index=True, use_container_width=True)
+
+# ----------------------------------------------------------------------
+# Helper – Guardado en lote
+# ----------------------------------------------------------------------
+def _save_changed_rows(original_df: pd.DataFrame, edited_df: pd.DataFrame,
+                       save_many: Callable[[List[Dict[str, Any]]], BulkResult],
+                       key: str = "id"):
+    """
+    Guardar en una sola llamada (una transacción) las filas editadas.
+
+    Cada fila lleva sólo la clave y las columnas que cambiaron (ver
+    grid_diff.changed_rows), así el UPDATE no reescribe el resto.
+
+    Returns:
+        (changes_made, errors): si se guardó alguna fila y los errores por
+        fila ("Fila N: ...", numeradas como en la tabla).
+    """
+    changed = changed_rows(original_df, edited_df, key=key)
+    if not changed:
+        return False, []
+
+    result = save_many([row for _, row in changed])
+    errors = [f"Fila {changed[i][0] + 1}: {msg}" for i, msg in sorted(result.errors.items())]
+    return result.saved > 0, errors
+
+def _delete_ids(ids: List[Any], delete_many: Callable[[List[Any]], BulkResult]):
+    """
+    Borrar `ids` en una sola llamada (una transacción).
+
+    Returns:
+        (deleted_count, errors): filas borradas y "ID x: ..." por cada id
+        que no se pudo borrar (p. ej. referenciado por otra tabla).
+    """
+    result = delete_many(list(ids))
+    errors = [f"ID {ids[i]}: {msg}" for i, msg in sorted(result.errors.items())]
+    return result.saved, errors
+
 # ----------------------------------------------------------------------
 # GOLDEN SAMPLE: Buildings (Edificios) Tab
 # ----------------------------------------------------------------------
@@ -132,25 +238,8 @@ def render_edificios_tab():
             original_df = df.drop(columns=["Seleccionar"])
             edited_data_df = edited_df.drop(columns=["Seleccionar"])
             
-            changes_made = False
-            errors = []
-            
-            # Compare row by row
-            for idx in range(len(edited_data_df)):
-                original_row = original_df.iloc[idx].to_dict()
-                edited_row = edited_data_df.iloc[idx].to_dict()
-                
-                # If data changed, save it
-                if original_row != edited_row:
-                    try:
-                        repo.save_edificio(
-                            id=edited_row["id"],  # ⭐ CRITICAL: Pass ID for UPDATE
-                            nombre_edificio=edited_row["nombre_edificio"],
-                            codigo_interno=edited_row["codigo_interno"]
-                        )
-                        changes_made = True
-                    except Exception as e:
-                        errors.append(f"Fila {idx + 1}: {str(e)}")
+            # Changed rows go in one transaction (ID in each row => UPDATE)
+            changes_made, errors = _save_changed_rows(original_df, edited_data_df, repo.save_many_edificios)
             
             # Feedback
             if changes_made and not errors:
@@ -193,15 +282,7 @@ def render_edificios_tab():
         
         with col_yes:
             if st.button("✅ Sí, Eliminar", key="confirm_delete_yes", type="primary", use_container_width=True):
-                deleted_count = 0
-                errors = []
-                
-                for edificio_id in ids_to_delete:
-                    try:
-                        repo.delete_edificio(edificio_id)
-                        deleted_count += 1
-                    except Exception as e:
-                        errors.append(f"ID {edificio_id}: {str(e)}")
+                deleted_count, errors = _delete_ids(ids_to_delete, repo.delete_many_edificios)
                 
                 # Clear confirmation state
                 st.session_state["confirm_delete_edificios"] = False
@@ -287,10 +368,13 @@ def render_directorio_tab():
     # ============================================================
     # READ SECTION: Load and display existing contacts
     # ============================================================
-    contactos = repo.get_directorio()
+    contactos = _paged("directorio", repo.get_directorio_page).items
     
     if not contactos or len(contactos) == 0:
-        st.warning("⚠️ No hay contactos registrados. Crea uno usando el formulario de arriba.")
+        if st.session_state.get("directorio_search"):
+            st.info("🔎 Ningún contacto coincide con la búsqueda.")
+        else:
+            st.warning("⚠️ No hay contactos registrados. Crea uno usando el formulario de arriba.")
         return
     
     # Convert to DataFrame
@@ -361,30 +445,8 @@ def render_directorio_tab():
             original_df = df.drop(columns=["Seleccionar"])
             edited_data_df = edited_df.drop(columns=["Seleccionar"])
             
-            changes_made = False
-            errors = []
-            
-            # Compare row by row
-            for idx in range(len(edited_data_df)):
-                original_row = original_df.iloc[idx].to_dict()
-                edited_row = edited_data_df.iloc[idx].to_dict()
-                
-                # If data changed, save it
-                if original_row != edited_row:
-                    # Validate nombre_referencia
-                    if not edited_row["nombre_referencia"] or edited_row["nombre_referencia"].strip() == "":
-                        errors.append(f"Fila {idx + 1}: El nombre/referencia no puede estar vacío.")
-                        continue
-                    
-                    try:
-                        repo.save_contacto(
-                            id=edited_row["id"],  # ⭐ CRITICAL: Pass ID for UPDATE
-                            nombre_referencia=edited_row["nombre_referencia"],
-                            numero_anexo=int(edited_row["numero_anexo"])
-                        )
-                        changes_made = True
-                    except Exception as e:
-                        errors.append(f"Fila {idx + 1}: {str(e)}")
+            # Changed rows go in one transaction (ID in each row => UPDATE)
+            changes_made, errors = _save_changed_rows(original_df, edited_data_df, repo.save_many_contactos)
             
             # Feedback
             if changes_made and not errors:
@@ -427,15 +489,7 @@ def render_directorio_tab():
         
         with col_yes:
             if st.button("✅ Sí, Eliminar", key="confirm_delete_directorio_yes", type="primary", use_container_width=True):
-                deleted_count = 0
-                errors = []
-                
-                for contacto_id in ids_to_delete:
-                    try:
-                        repo.delete_contacto(contacto_id)
-                        deleted_count += 1
-                    except Exception as e:
-                        errors.append(f"ID {contacto_id}: {str(e)}")
+                deleted_count, errors = _delete_ids(ids_to_delete, repo.delete_many_contactos)
                 
                 # Clear confirmation state
                 st.session_state["confirm_delete_directorio"] = False
@@ -629,31 +683,8 @@ def render_unidades_tab():
             original_df = df.drop(columns=["Seleccionar"])
             edited_data_df = edited_df.drop(columns=["Seleccionar"])
             
-            changes_made = False
-            errors = []
-            
-            # Compare row by row
-            for idx in range(len(edited_data_df)):
-                original_row = original_df.iloc[idx].to_dict()
-                edited_row = edited_data_df.iloc[idx].to_dict()
-                
-                # If data changed, save it
-                if original_row != edited_row:
-                    # Validate nombre_unidad
-                    if not edited_row["nombre_unidad"] or edited_row["nombre_unidad"].strip() == "":
-                        errors.append(f"Fila {idx + 1}: El nombre de la unidad no puede estar vacío.")
-                        continue
-                    
-                    try:
-                        repo.save_unidad(
-                            id=edited_row["id"],  # ⭐ CRITICAL: Pass ID for UPDATE
-                            nombre_unidad=edited_row["nombre_unidad"],
-                            tipo_servicio=edited_row.get("tipo_servicio"),
-                            piso_id=edited_row["piso_id"]
-                        )
-                        changes_made = True
-                    except Exception as e:
-                        errors.append(f"Fila {idx + 1}: {str(e)}")
+            # Changed rows go in one transaction (ID in each row => UPDATE)
+            changes_made, errors = _save_changed_rows(original_df, edited_data_df, repo.save_many_unidades)
             
             # Feedback
             if changes_made and not errors:
@@ -696,15 +727,7 @@ def render_unidades_tab():
         
         with col_yes:
             if st.button("✅ Sí, Eliminar", key="confirm_delete_unidades_yes", type="primary", use_container_width=True):
-                deleted_count = 0
-                errors = []
-                
-                for unidad_id in ids_to_delete:
-                    try:
-                        repo.delete_unidad(unidad_id)
-                        deleted_count += 1
-                    except Exception as e:
-                        errors.append(f"ID {unidad_id}: {str(e)}")
+                deleted_count, errors = _delete_ids(ids_to_delete, repo.delete_many_unidades)
                 
                 # Clear confirmation state
                 st.session_state["confirm_delete_unidades"] = False
@@ -912,7 +935,9 @@ def render_crud_interface(
     column_config: Optional[Dict] = None,
     hidden_columns: Optional[List[str]] = None,
     read_only_columns: Optional[List[str]] = None,
-    tab_key: str = "crud"
+    tab_key: str = "crud",
+    save_many_callback: Optional[Callable] = None,
+    delete_many_callback: Optional[Callable] = None,
 ):
     """Generic CRUD interface for tabs.
     Parameters:
@@ -920,6 +945,10 @@ def render_crud_interface(
         data: List of records.
         primary_key: Field name of the primary key.
         save_callback: Function to call for saving a row (receives dict).
+        save_many_callback: Optional bulk variant (receives the list of changed
+            rows, returns a BulkResult); used instead of save_callback when given.
+        delete_many_callback: Optional bulk variant of delete_callback (receives
+            the list of ids, returns a BulkResult).
         delete_callback: Function to call for deleting a row by id.
         create_form_callback: Optional function to render a creation form.
         column_config: Optional Streamlit column config dict.
@@ -988,12 +1017,14 @@ def render_crud_interface(
         try:
             original_df = df.drop(columns=["Seleccionar"])
             edited_data_df = edited_df.drop(columns=["Seleccionar"])
-            changes_made = False
-            errors = []
-            for idx in range(len(edited_data_df)):
-                original_row = original_df.iloc[idx].to_dict()
-                edited_row = edited_data_df.iloc[idx].to_dict()
-                if original_row != edited_row:
+            if save_many_callback:
+                changes_made, errors = _save_changed_rows(
+                    original_df, edited_data_df, save_many_callback, key=primary_key
+                )
+            else:
+                changes_made = False
+                errors = []
+                for idx, edited_row in changed_rows(original_df, edited_data_df, key=primary_key, minimal=False):
                     try:
                         save_callback(edited_row)
                         changes_made = True
@@ -1025,14 +1056,18 @@ def render_crud_interface(
         with col_yes:
             if st.button("✅ Sí, Borrar", key=f"confirm_yes_{tab_key}", type="primary"):
                 try:
-                    deleted_count = 0
-                    errors = []
-                    for record_id in st.session_state[f"rows_to_delete_{tab_key}"]:
-                        try:
-                            delete_callback(record_id)
-                            deleted_count += 1
-                        except Exception as e:
-                            errors.append(f"ID {record_id}: {str(e)}")
+                    ids_to_delete = st.session_state[f"rows_to_delete_{tab_key}"]
+                    if delete_many_callback:
+                        deleted_count, errors = _delete_ids(ids_to_delete, delete_many_callback)
+                    else:
+                        deleted_count = 0
+                        errors = []
+                        for record_id in ids_to_delete:
+                            try:
+                                delete_callback(record_id)
+                                deleted_count += 1
+                            except Exception as e:
+                                errors.append(f"ID {record_id}: {str(e)}")
                     st.session_state[f"confirm_delete_{tab_key}"] = False
                     del st.session_state[f"rows_to_delete_{tab_key}"]
                     if deleted_count > 0 and not errors:
@@ -1080,8 +1115,11 @@ def render_admin_dashboard(user):
     # 1️⃣ Auditoría
     # ----------------------------------------------------------------------
     with tabs[0]:
+        st.subheader("📈 Resumen de Uso")
+        _render_audit_summary(repo)
+
         st.subheader("📊 Historial de Consultas")
-        logs = repo.get_logs()
+        logs = _paged("logs", repo.get_logs_page).items
         if logs:
             st.dataframe(logs, hide_index=True, use_container_width=True)
         else:
@@ -1104,7 +1142,9 @@ def render_admin_dashboard(user):
                 password=None,
                 rol_id=row["rol_id"]
             ),
+            save_many_callback=repo.save_many_users,
             delete_callback=lambda user_id: repo.delete_user(user_id),
+            delete_many_callback=repo.delete_many_users,
             create_form_callback=create_user_form,
             column_config={
                 "id": st.column_config.TextColumn("ID", disabled=True, width="small"),
@@ -1134,7 +1174,9 @@ def render_admin_dashboard(user):
                 nombre_rol=row["nombre_rol"],
                 descripcion=row.get("descripcion", "")
             ),
+            save_many_callback=repo.save_many_roles,
             delete_callback=lambda role_id: repo.delete_role(role_id) if hasattr(repo, 'delete_role') else None,
+            delete_many_callback=repo.delete_many_roles,
             create_form_callback=create_role_form,  # ⭐ ENABLED: Form for creating new roles
             column_config={
                 "id": st.column_config.NumberColumn("ID", disabled=True, width="small"),
@@ -1167,7 +1209,9 @@ def render_admin_dashboard(user):
                 nivel_numero=row["nivel_numero"],
                 edificio_id=row["edificio_id"]
             ),
+            save_many_callback=repo.save_many_pisos,
             delete_callback=lambda piso_id: repo.delete_piso(piso_id) if hasattr(repo, 'delete_piso') else None,
+            delete_many_callback=repo.delete_many_pisos,
             create_form_callback=create_piso_form,  # ⭐ ENABLED: Form for creating new pisos
             column_config={
                 "id": st.column_config.NumberColumn("ID", disabled=True, width="small"),
@@ -0,0 +1,62 @@
+# src/ui/grid_diff.py
+"""
+Detección de cambios entre la tabla original y la editada en st.data_editor.
+
+Compara las dos tablas completas con operaciones vectorizadas (una máscara
+booleana filas x columnas) en lugar de convertir cada fila a dict, y sólo
+recorre en Python las filas que cambiaron.
+"""
+from typing import Any, Dict, Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Columnas de la interfaz que no son datos (checkbox de selección)
+UI_COLUMNS = ("Seleccionar",)
+
+
+def changed_mask(original: pd.DataFrame, edited: pd.DataFrame) -> pd.DataFrame:
+    """
+    Máscara booleana (filas x columnas de `original`): True donde el valor
+    cambió. NaN, None y NaT se consideran iguales entre sí, y 5 == 5.0.
+    """
+    original = original.reset_index(drop=True)
+    edited = edited.reset_index(drop=True).reindex(columns=original.columns)
+    same = original.eq(edited) | (original.isna() & edited.isna())
+    return ~same
+
+
+def changed_rows(original: pd.DataFrame, edited: pd.DataFrame, key: str = "id",
+                 minimal: bool = True,
+                 ignore: Iterable[str] = UI_COLUMNS) -> List[Tuple[int, Dict[str, Any]]]:
+    """
+    Filas editadas, en orden de la tabla.
+
+    Args:
+        original: tabla mostrada al usuario.
+        edited: tabla devuelta por st.data_editor (mismas filas, num_rows="fixed").
+        key: columna clave; siempre se incluye en la fila devuelta.
+        minimal: True = sólo `key` y las columnas que cambiaron; False = fila completa.
+        ignore: columnas que no cuentan como cambio (p. ej. el checkbox).
+
+    Returns:
+        Lista de (posición de la fila, valores).
+    """
+    columns = [c for c in original.columns if c not in set(ignore)]
+    mask = changed_mask(original[columns], edited[columns]).to_numpy()
+    positions = np.flatnonzero(mask.any(axis=1))
+    if len(positions) == 0:
+        return []
+
+    values = edited[columns].to_numpy(dtype=object)
+    key_index = columns.index(key) if key in columns else None
+    rows = []
+    for pos in positions:
+        if minimal:
+            selected = np.flatnonzero(mask[pos])
+            if key_index is not None and key_index not in selected:
+                selected = np.append(selected, key_index)
+        else:
+            selected = range(len(columns))
+        rows.append((int(pos), {columns[i]: values[pos, i] for i in selected}))
+    return rows
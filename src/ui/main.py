@@ -1,7 +1,9 @@
 import streamlit as st
 import os
 from src.application.use_cases import HospitalAssistantUseCase, AuthUseCase
-from src.infrastructure.exceptions import LLMConnectionError, DatabaseConnectionError
+from src.infrastructure.exceptions import LLMConnectionError, DatabaseConnectionError, LoginThrottledError
+from src.infrastructure.audit_writer import get_audit_writer
+from src.infrastructure.metrics import start_metrics_server
 from src.ui.components import (
     display_chat_message, 
     display_example_questions, 
@@ -21,6 +23,9 @@ st.set_page_config(
 # --- Cargar Estilos ---
 load_css()
 
+# --- Métricas (/metrics y /traces; idempotente entre reruns) ---
+start_metrics_server()
+
 # --- Helpers ---
 def get_logo_path():
     path = "src/ui/assets/images/logo-Hospital-hori-xl.svg"
@@ -51,9 +56,29 @@ if "hospital_use_case" not in st.session_state:
         st.error(f"Error cargando IA: {e}")
 
 # --- Login Logic ---
+# Proxies inversos propios delante de Streamlit (0 = expuesto directamente)
+TRUSTED_PROXIES = int(os.getenv("NEXA_TRUSTED_PROXIES", "0"))
+
+def client_ip():
+    """
+    IP del navegador para el límite de intentos de login.
+
+    X-Forwarded-For sólo se respeta detrás de NEXA_TRUSTED_PROXIES proxies
+    propios, y se toma la entrada que agregó el más externo (la N-ésima desde
+    la derecha): las de la izquierda las puede escribir el cliente.
+    """
+    context = getattr(st, "context", None)
+    headers = getattr(context, "headers", None) or {}
+    forwarded = headers.get("X-Forwarded-For") if TRUSTED_PROXIES > 0 else None
+    if forwarded:
+        entries = [e.strip() for e in forwarded.split(",") if e.strip()]
+        if entries:
+            return entries[-min(TRUSTED_PROXIES, len(entries))]
+    return getattr(context, "ip_address", None)
+
 def handle_login(email, password):
     try:
-        user = st.session_state.auth_use_case.login(email, password)
+        user = st.session_state.auth_use_case.login(email, password, client_ip=client_ip())
         if user:
             st.session_state.authenticated = True
             st.session_state.user = user
@@ -61,6 +86,8 @@ def handle_login(email, password):
             st.rerun()
         else:
             st.error("Credenciales inválidas.")
+    except LoginThrottledError as e:
+        st.error(f"⏳ Demasiados intentos. Intenta nuevamente en {max(1, round(e.retry_after))} segundos.")
     except Exception as e:
         st.error(f"Error: {e}")
 
@@ -110,6 +137,8 @@ with st.sidebar:
             st.session_state.user = None
             st.session_state.messages = []
             st.session_state.show_admin_panel = False
+            if "hospital_use_case" in st.session_state:
+                st.session_state.hospital_use_case.rag_agent.reset_context()
             st.rerun()
             
         st.markdown("---")
@@ -118,6 +147,8 @@ with st.sidebar:
         if not st.session_state.show_admin_panel:
             if st.button("🗑️ Limpiar Chat", use_container_width=True):
                 st.session_state.messages = []
+                if "hospital_use_case" in st.session_state:
+                    st.session_state.hospital_use_case.rag_agent.reset_context()
                 st.rerun()
 
         # ⚙️ SELECTOR DE VISTAS (Solo Admin)
@@ -191,14 +222,15 @@ else:
                 if st.session_state.user and hasattr(st.session_state.user, 'id'):
                     user_id = str(st.session_state.user.id)
                 
-                # Log the interaction (non-blocking)
+                # Log the interaction (non-blocking: background batch writer)
                 if user_id:
-                    from src.infrastructure.admin_repository import AdminRepository
-                    repo = AdminRepository()
-                    repo.log_interaction(
+                    # AuditWriter compartido del proceso (mismo engine y pool)
+                    get_audit_writer().submit(
                         usuario_id=user_id,
                         pregunta=prompt,
-                        respuesta=answer
+                        respuesta=answer,
+                        request_id=debug_info.get('request_id'),
+                        result=debug_info
                     )
             except Exception as log_error:
                 # Don't break the chat if logging fails
@@ -208,6 +240,11 @@ else:
             with st.expander("🧠 Ver proceso de pensamiento (Debug SQL)", expanded=False):
                 if debug_info.get('error'):
                     st.error(f"Error: {debug_info['error']}")
+
+                follow_up = debug_info.get('follow_up')
+                if follow_up:
+                    origen = "filas de la respuesta anterior" if follow_up['source'] == "context" else "una consulta directa"
+                    st.info(f"↪️ Seguimiento sobre «{follow_up['subject']}» resuelto con {origen} (sin LLM).")
                 
                 st.caption("Consulta SQL Generada:")
                 st.code(debug_info.get('sql', 'No SQL generated'), language='sql')
@@ -221,7 +258,34 @@ else:
                     st.code(debug_info['fallback_sql'], language='sql')
                     st.caption("Fallback Data:")
                     st.text(debug_info.get('fallback_raw_data', 'No data'))
-                    
+
+                # Tiempos por etapa y contadores de Ollama
+                timings = debug_info.get('timings') or {}
+                if timings:
+                    st.divider()
+                    st.caption(f"⏱️ Tiempos por etapa (total {timings.get('total', 0):.0f} ms):")
+                    st.dataframe(
+                        [{"Etapa": stage, "ms": ms} for stage, ms in timings.items() if stage != "total"],
+                        hide_index=True,
+                        use_container_width=True
+                    )
+                llm_stats = debug_info.get('llm_stats') or {}
+                if llm_stats:
+                    st.caption("🔢 Tokens por llamada al modelo:")
+                    st.dataframe(
+                        [
+                            {
+                                "Llamada": call,
+                                "Prompt tokens": stats.get("prompt_eval_count"),
+                                "Tokens generados": stats.get("eval_count"),
+                                "Generación (ms)": stats.get("eval_duration_ms"),
+                            }
+                            for call, stats in llm_stats.items()
+                        ],
+                        hide_index=True,
+                        use_container_width=True
+                    )
+
         except Exception as e:
             st.error(f"Error: {e}")
                 
@@ -1,11 +1,22 @@
 """
 Pytest fixtures for database testing.
 """
+import unicodedata
 import pytest
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker
+from src.infrastructure.admin_repository import _ROLLUP_REFRESHED, REFERENCE_CACHE
 from src.infrastructure.database import Base, DatabaseManager
-from src.infrastructure.models import PatientModel, HospitalAreaModel
+from src.infrastructure.models import (
+    PatientModel, HospitalAreaModel, BuildingModel, FloorModel, UnitModel, DirectoryModel
+)
+
+def _strip_accents(value):
+    if value is None:
+        return None
+    return "".join(
+        c for c in unicodedata.normalize("NFKD", value) if not unicodedata.combining(c)
+    )
 
 @pytest.fixture
 def in_memory_db():
@@ -24,6 +35,8 @@ def in_memory_db():
     
     # Cleanup
     Base.metadata.drop_all(db_manager.engine)
+    # The next test reuses the same URL with different data
+    REFERENCE_CACHE.clear()
 
 @pytest.fixture
 def sample_patients(in_memory_db):
@@ -88,3 +101,78 @@ def sample_areas(in_memory_db):
         session.add_all(areas)
     
     return in_memory_db
+
+@pytest.fixture
+def sample_directory(in_memory_db):
+    """
+    Populate the in-memory database with topology and phone directory data.
+    
+    Registers an `f_unaccent` SQL function so the accent-insensitive
+    lookups used in PostgreSQL also work on SQLite.
+    
+    Args:
+        in_memory_db: DatabaseManager fixture.
+        
+    Returns:
+        DatabaseManager with populated data.
+    """
+    @event.listens_for(in_memory_db.engine, "connect")
+    def _register_unaccent(dbapi_connection, _):
+        dbapi_connection.create_function("f_unaccent", 1, _strip_accents)
+    # The in-memory connection may already be open
+    with in_memory_db.engine.connect() as conn:
+        conn.connection.driver_connection.create_function("f_unaccent", 1, _strip_accents)
+    
+    with in_memory_db.get_session() as session:
+        session.add_all([
+            BuildingModel(id=1, nombre_edificio="Edificio B (Beta)", codigo_interno="TORRE_B"),
+            FloorModel(id=1, edificio_id=1, nivel_numero=-1, nombre_piso="Zócalo"),
+            FloorModel(id=2, edificio_id=1, nivel_numero=1, nombre_piso="Piso 1"),
+            UnitModel(id=1, piso_id=1, nombre_unidad="Cafetería", tipo_servicio="Servicios"),
+            UnitModel(id=2, piso_id=1, nombre_unidad="Auditorio", tipo_servicio="Admin"),
+            UnitModel(id=3, piso_id=2, nombre_unidad="Imagenología", tipo_servicio="Apoyo"),
+            DirectoryModel(id=1, numero_anexo=613088, nombre_referencia="INFORMATICA JEFATURA"),
+            DirectoryModel(id=2, numero_anexo=613089, nombre_referencia="INFORMATICA SOPORTE"),
+            DirectoryModel(id=3, numero_anexo=613028, nombre_referencia="FARMACIA CENTRAL"),
+        ])
+    
+    return in_memory_db
+
+# historial_consultas has no ORM model (database/05, 08, 09 *.sql)
+HISTORIAL_DDL = (
+    "CREATE TABLE historial_consultas (id TEXT PRIMARY KEY, usuario_id TEXT, "
+    "pregunta TEXT, respuesta TEXT, fecha TIMESTAMP, sql_generado TEXT, "
+    "sql_fingerprint TEXT, modelo TEXT, duraciones_ms TEXT, duracion_total_ms REAL, "
+    "tokens_prompt INTEGER, tokens_respuesta INTEGER, filas INTEGER, cache_hit BOOLEAN, "
+    "resultado TEXT, error_clase TEXT)"
+)
+
+@pytest.fixture
+def historial_db(in_memory_db):
+    """
+    In-memory database with the audit table `historial_consultas` and its
+    hourly rollup tables.
+    
+    Args:
+        in_memory_db: DatabaseManager fixture.
+        
+    Yields:
+        DatabaseManager with empty audit tables.
+    """
+    with in_memory_db.engine.begin() as conn:
+        conn.execute(text(HISTORIAL_DDL))
+        conn.execute(text(
+            "CREATE TABLE historial_resumen_hora (hora TIMESTAMP NOT NULL, "
+            "sql_fingerprint TEXT NOT NULL DEFAULT '', consultas INTEGER, errores INTEGER, "
+            "vacias INTEGER, aciertos_cache INTEGER, medidas INTEGER, duracion_total_ms REAL, "
+            "duracion_max_ms REAL, tokens_prompt INTEGER, tokens_respuesta INTEGER, "
+            "pregunta_ejemplo TEXT, PRIMARY KEY (hora, sql_fingerprint))"
+        ))
+        conn.execute(text(
+            "CREATE TABLE historial_resumen_marca (nombre TEXT PRIMARY KEY, procesado_hasta TIMESTAMP)"
+        ))
+    yield in_memory_db
+    with in_memory_db.engine.begin() as conn:
+        for name in ("historial_consultas", "historial_resumen_hora", "historial_resumen_marca"):
+            conn.execute(text(f"DROP TABLE {name}"))
+    _ROLLUP_REFRESHED.clear()
@@ -0,0 +1,279 @@
+"""
+Unit tests for the keyset-paginated AdminRepository listings.
+"""
+from datetime import date, datetime, timedelta
+import pytest
+from sqlalchemy import text
+from src.infrastructure.admin_repository import HISTORIAL, AdminRepository, retention_cutoff
+
+def test_directorio_pages_follow_the_cursor(sample_directory):
+    """Pages do not overlap and the last one has no continuation token."""
+    repo = AdminRepository(sample_directory)
+
+    first = repo.get_directorio_page(limit=2)
+    second = repo.get_directorio_page(limit=2, cursor=first.next_cursor)
+
+    assert [r["numero_anexo"] for r in first.items] == [613028, 613088]
+    assert [r["numero_anexo"] for r in second.items] == [613089]
+    assert second.next_cursor is None
+
+    by_name = repo.get_directorio_page(limit=1, sort="nombre", descending=True)
+    assert by_name.items[0]["nombre_referencia"] == "INFORMATICA SOPORTE"
+
+def test_directorio_page_search_and_cursor_validation(sample_directory):
+    """Search runs in SQL; a cursor is only valid for its own query."""
+    repo = AdminRepository(sample_directory)
+
+    page = repo.get_directorio_page(limit=1, search="informática")
+    assert page.items[0]["nombre_referencia"] == "INFORMATICA JEFATURA"
+    assert [r["id"] for r in repo.get_directorio_page(search="613028").items] == [3]
+
+    with pytest.raises(ValueError):
+        repo.get_directorio_page(limit=1, cursor=page.next_cursor, search="farmacia")
+    with pytest.raises(ValueError):
+        repo.get_directorio_page(sort="piso")
+
+def test_logs_page_newest_first(historial_db):
+    """The audit log pages backwards in time, with date filters."""
+    repo = AdminRepository(historial_db)
+    start = datetime(2026, 3, 1, 8, 0)
+    with historial_db.engine.begin() as conn:
+        conn.execute(HISTORIAL.insert(), [
+            {"id": f"log-{i}", "pregunta": f"pregunta {i}", "respuesta": "r",
+             "fecha": start + timedelta(hours=i)}
+            for i in range(5)
+        ])
+
+    first = repo.get_logs_page(limit=2)
+    second = repo.get_logs_page(limit=2, cursor=first.next_cursor)
+    assert [r["id"] for r in first.items + second.items] == ["log-4", "log-3", "log-2", "log-1"]
+
+    window = repo.get_logs_page(desde=start + timedelta(hours=1), hasta=start + timedelta(hours=3))
+    assert [r["id"] for r in window.items] == ["log-2", "log-1"]
+
+def test_maintain_logs_applies_retention(historial_db):
+    """Rows older than the retention window are removed; recent months stay."""
+    assert retention_cutoff(2, date(2026, 1, 15)) == date(2025, 11, 1)
+    assert retention_cutoff(0, date(2026, 3, 31)) == date(2026, 3, 1)
+
+    repo = AdminRepository(historial_db)
+    with historial_db.engine.begin() as conn:
+        conn.execute(HISTORIAL.insert(), [
+            {"id": f"log-{month}", "pregunta": "p", "respuesta": "r",
+             "fecha": datetime(2026, month, 10)}
+            for month in range(1, 7)
+        ])
+
+    assert repo.maintain_logs(keep_months=0, today=date(2026, 6, 20))["cutoff"] is None
+    result = repo.maintain_logs(keep_months=2, today=date(2026, 6, 20))
+
+    assert result["cutoff"] == date(2026, 4, 1)
+    assert [r["id"] for r in repo.get_logs_page().items] == ["log-6", "log-5", "log-4"]
+
+def test_log_interaction_stores_pipeline_performance(historial_db):
+    """SQL, fingerprint, timings and token counts come from the answer package."""
+    repo = AdminRepository(historial_db)
+    result = {
+        "request_id": "req-1",
+        "sql": "SELECT nombre_referencia, numero_anexo FROM directorio_telefonico "
+               "WHERE f_unaccent(nombre_referencia) ILIKE f_unaccent('%farmacia%') LIMIT 10",
+        "timings": {"sql_gen": 812.4, "exec": 3.2, "total": 1290.0},
+        "llm_stats": {
+            "sql_gen": {"prompt_eval_count": 40, "eval_count": 25, "prefix_hit": True},
+            "format": {"prompt_eval_count": 30, "eval_count": 50, "prefix_hit": False},
+        },
+        "model": "qwen2.5-coder:1.5b", "row_count": 1, "outcome": "ok", "error_class": None,
+    }
+    repo.log_interaction("u-1", "anexo farmacia", "613028", result=result)
+    repo.log_interaction("u-1", "anexo de informática", "613088", result={
+        **result, "request_id": "req-2",
+        "sql": result["sql"].replace("'%farmacia%'", "'%informática%'").replace("10", "5"),
+    })
+
+    with historial_db.engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT id, sql_fingerprint, modelo, duracion_total_ms, tokens_prompt, "
+            "tokens_respuesta, filas, cache_hit, resultado, duraciones_ms "
+            "FROM historial_consultas ORDER BY id"
+        )).mappings().all()
+
+    assert [r["id"] for r in rows] == ["req-1", "req-2"]
+    assert rows[0]["sql_fingerprint"] == rows[1]["sql_fingerprint"]
+    assert (rows[0]["tokens_prompt"], rows[0]["tokens_respuesta"], rows[0]["filas"]) == (70, 75, 1)
+    assert rows[0]["duracion_total_ms"] == 1290.0 and not rows[0]["cache_hit"]
+    assert '"exec": 3.2' in rows[0]["duraciones_ms"]
+
+def test_rollups_only_add_rows_past_the_watermark(historial_db):
+    """Each refresh folds in just the new rows; the summary reads only the rollup."""
+    repo = AdminRepository(historial_db)
+    start = datetime(2026, 3, 1, 8, 0)
+    def insert(rows):
+        with historial_db.engine.begin() as conn:
+            conn.execute(HISTORIAL.insert(), [
+                {"pregunta": "anexo farmacia", "respuesta": "r", "sql_fingerprint": "fp-anexo",
+                 "duracion_total_ms": 100.0, "resultado": "ok", **row}
+                for row in rows
+            ])
+
+    insert([
+        {"id": "a", "fecha": start + timedelta(minutes=5)},
+        {"id": "b", "fecha": start + timedelta(minutes=50), "duracion_total_ms": 300.0},
+        {"id": "c", "fecha": start + timedelta(hours=1, minutes=10), "resultado": "error",
+         "sql_fingerprint": None, "pregunta": "hola", "duracion_total_ms": None},
+    ])
+    assert repo.refresh_rollups(now=start + timedelta(hours=3)) == 3
+    assert repo.refresh_rollups(now=start + timedelta(hours=3)) == 0
+
+    insert([{"id": "d", "fecha": start + timedelta(hours=3, minutes=30), "duracion_total_ms": 500.0}])
+    assert repo.refresh_rollups(now=start + timedelta(hours=4)) == 1
+    # Throttled: this process refreshed a moment ago
+    assert repo.refresh_rollups(max_age_s=60) is None
+
+    summary = repo.get_audit_summary(hours=24, now=start + timedelta(hours=4))
+    assert [(r["consultas"], r["errores"]) for r in summary["hourly"]] == [(2, 0), (1, 1), (1, 0)]
+    assert summary["hourly"][0]["promedio_ms"] == 200.0
+    assert summary["totals"]["consultas"] == 4
+    assert summary["totals"]["tasa_error"] == 0.25
+    shape = summary["shapes"][0]
+    assert (shape["sql_fingerprint"], shape["consultas"], shape["max_ms"]) == ("fp-anexo", 3, 500.0)
+    assert repo.late_rollup_rows() == 0
+
+    # Written after the watermark passed its `fecha` (a long AuditWriter queue)
+    insert([{"id": "e", "fecha": start + timedelta(hours=2)}])
+    assert repo.refresh_rollups(now=start + timedelta(hours=5)) == 0
+    assert repo.late_rollup_rows() == 1
+
+def test_save_many_reports_row_errors_without_aborting(sample_directory):
+    """Valid rows commit together; the duplicate and the invalid row are reported."""
+    from src.infrastructure.models import DirectoryModel
+
+    with sample_directory.get_session() as session:
+        # The SQLite test schema has no UNIQUE on numero_anexo; PostgreSQL does.
+        session.execute(text("CREATE UNIQUE INDEX ux_test_anexo ON directorio_telefonico(numero_anexo)"))
+    repo = AdminRepository(sample_directory)
+    try:
+        result = repo.save_many_contactos([
+            {"id": 1, "numero_anexo": 613090, "nombre_referencia": "INFORMATICA DESARROLLO"},
+            {"id": 2, "numero_anexo": 613028, "nombre_referencia": "INFORMATICA SOPORTE"},
+            {"id": None, "numero_anexo": 613500, "nombre_referencia": "ONCOLOGIA"},
+            {"id": 3, "numero_anexo": 613028, "nombre_referencia": "   "},
+        ])
+
+        assert result.saved == 2
+        assert set(result.errors) == {1, 3}
+        assert "anexo" in result.errors[1]
+        with sample_directory.get_session() as session:
+            anexos = {c.nombre_referencia: c.numero_anexo for c in session.query(DirectoryModel)}
+        assert anexos == {
+            "INFORMATICA DESARROLLO": 613090,
+            "INFORMATICA SOPORTE": 613089,
+            "FARMACIA CENTRAL": 613028,
+            "ONCOLOGIA": 613500,
+        }
+    finally:
+        with sample_directory.get_session() as session:
+            session.execute(text("DROP INDEX ux_test_anexo"))
+
+def test_delete_many_reports_referenced_ids(sample_directory):
+    """Unreferenced ids are deleted together; referenced ones are reported."""
+    with sample_directory.engine.begin() as conn:
+        conn.execute(text("UPDATE directorio_telefonico SET unidad_id = 1 WHERE id = 3"))
+    with sample_directory.engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA foreign_keys=ON")
+    repo = AdminRepository(sample_directory)
+    try:
+        result = repo.delete_many_unidades([2, 1])
+        assert result.saved == 1
+        assert list(result.errors) == [1]
+        assert "directorio" in result.errors[1]
+        assert [u["id"] for u in repo.get_unidades()] == [1, 3]
+
+        assert repo.delete_many_contactos([1, 2]).saved == 2
+        assert [c["id"] for c in repo.get_directorio()] == [3]
+    finally:
+        with sample_directory.engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA foreign_keys=OFF")
+
+def test_delete_many_users_compiles_without_a_typed_array(in_memory_db):
+    """usuarios.id is UUID in PostgreSQL: the ids must not be bound as text[]."""
+    from sqlalchemy import event
+    from sqlalchemy.dialects import postgresql
+
+    statements = []
+    @event.listens_for(in_memory_db.engine, "before_execute")
+    def _capture(conn, clauseelement, *args):
+        statements.append(clauseelement)
+    try:
+        AdminRepository(in_memory_db).delete_many_users(["u-1", "u-2"])
+    finally:
+        event.remove(in_memory_db.engine, "before_execute", _capture)
+
+    delete = next(s for s in statements if getattr(s, "is_delete", False))
+    sql = str(delete.compile(dialect=postgresql.dialect(),
+                                    compile_kwargs={"literal_binds": True}))
+    assert "usuarios.id IN ('u-1', 'u-2')" in sql
+    assert "ANY" not in sql and "ARRAY" not in sql
+
+def test_save_many_users_without_password_never_inserts(in_memory_db):
+    """A user deleted before the save is reported, not recreated with a fake hash."""
+    from src.infrastructure.models import RoleModel, UserModel
+
+    with in_memory_db.get_session() as session:
+        session.add_all([
+            RoleModel(id=1, nombre_rol="ADMIN", descripcion="Administrador"),
+            UserModel(id="u-1", rut="1-9", nombre_completo="Ana Admin", email="ana@nexa.ai",
+                      password_hash="hash", rol_id=1, activo=True),
+        ])
+    row = {"rut": "2-7", "nombre_completo": "Bea", "email": "bea@nexa.ai", "rol_id": 1}
+
+    result = AdminRepository(in_memory_db).save_many_users([
+        {"id": "u-1", "rut": "1-9", "nombre_completo": "Ana A.", "email": "ana@nexa.ai", "rol_id": 1},
+        {"id": "u-gone", **row},
+    ])
+
+    assert result.saved == 1
+    assert "no existe" in result.errors[1]
+    with in_memory_db.get_session() as session:
+        users = {u.id: (u.nombre_completo, u.password_hash) for u in session.query(UserModel)}
+    assert users == {"u-1": ("Ana A.", "hash")}
+
+def test_save_many_partial_rows_update_only_changed_columns(sample_directory):
+    """Rows carrying just the key and changed fields become plain UPDATEs."""
+    repo = AdminRepository(sample_directory)
+
+    result = repo.save_many_contactos([
+        {"id": 3, "nombre_referencia": "FARMACIA CENTRAL HCM"},
+        {"id": 1, "numero_anexo": 613001},
+    ])
+
+    assert result.saved == 2 and result.ok
+    rows = {c["id"]: (c["numero_anexo"], c["nombre_referencia"]) for c in repo.get_directorio()}
+    assert rows[3] == (613028, "FARMACIA CENTRAL HCM")
+    assert rows[1] == (613001, "INFORMATICA JEFATURA")
+
+def test_reference_data_is_cached_until_a_local_write(sample_directory):
+    """Dropdown lists are served from memory and reloaded right after a write."""
+    from sqlalchemy import event
+
+    repo = AdminRepository(sample_directory)
+    statements = []
+    @event.listens_for(sample_directory.engine, "before_cursor_execute")
+    def _count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    try:
+        assert [p["id"] for p in repo.get_pisos()] == [1, 2]
+        assert [p["id"] for p in repo.get_pisos()] == [1, 2]
+        assert len(statements) == 1
+
+        repo.save_piso(id=None, nombre_piso="Piso 2", nivel_numero=2, edificio_id=1)
+        statements.clear()
+        assert [p["nivel_numero"] for p in repo.get_pisos()] == [-1, 1, 2]
+        assert len(statements) == 1
+
+        # Units depend on floors too: the floor write already invalidated them
+        repo.get_unidades()
+        repo.delete_many_edificios([1])
+        assert repo.get_unidades() == [] and repo.get_pisos() == []
+    finally:
+        event.remove(sample_directory.engine, "before_cursor_execute", _count)
@@ -0,0 +1,68 @@
+"""
+Unit tests for the async repositories (skipped without greenlet/aiosqlite).
+"""
+import asyncio
+import pytest
+
+pytest.importorskip("greenlet")
+pytest.importorskip("aiosqlite")
+
+from sqlalchemy import event
+from src.infrastructure.database import Base, DatabaseManager
+from src.infrastructure.models import RoleModel, UserModel, DirectoryModel
+from src.infrastructure.async_database import AsyncDatabaseManager
+from src.infrastructure.async_repositories import (
+    AsyncAdminRepository, AsyncSQLDirectoryRepository, AsyncSQLUserRepository,
+)
+from tests.conftest import _strip_accents
+
+@pytest.fixture
+def async_db(tmp_path):
+    """
+    File-backed SQLite database populated through the sync manager and
+    opened with the async (aiosqlite) engine.
+    """
+    url = f"sqlite:///{tmp_path / 'async.sqlite'}"
+    sync_db = DatabaseManager(url)
+    Base.metadata.create_all(sync_db.engine)
+    with sync_db.get_session() as session:
+        session.add_all([
+            RoleModel(id=1, nombre_rol="ADMIN", descripcion="Administrador"),
+            UserModel(id="u-1", rut="1-9", nombre_completo="Ana Admin", email="ana@nexa.ai",
+                      password_hash="hash", rol_id=1, activo=True),
+            DirectoryModel(id=1, numero_anexo=613088, nombre_referencia="INFORMATICA JEFATURA"),
+            DirectoryModel(id=2, numero_anexo=613028, nombre_referencia="FARMACIA CENTRAL"),
+        ])
+
+    manager = AsyncDatabaseManager(url)
+    @event.listens_for(manager.engine.sync_engine, "connect")
+    def _register_unaccent(dbapi_connection, _):
+        dbapi_connection.create_function("f_unaccent", 1, _strip_accents)
+
+    return manager
+
+def test_async_repositories_run_concurrently(async_db):
+    """Login, directory and admin reads can be awaited together."""
+    users = AsyncSQLUserRepository(async_db)
+    directory = AsyncSQLDirectoryRepository(async_db)
+    admin = AsyncAdminRepository(async_db)
+
+    async def scenario():
+        try:
+            return await asyncio.gather(
+                users.get_user_by_email("ana@nexa.ai"),
+                users.get_password_hash("u-1"),
+                directory.search_directory("informática"),
+                admin.get_roles(),
+            )
+        finally:
+            # Las conexiones aiosqlite pertenecen a este event loop
+            await async_db.dispose()
+
+    user, password_hash, entries, roles = asyncio.run(scenario())
+
+    assert user.full_name == "Ana Admin"
+    assert user.role.name == "ADMIN"
+    assert password_hash == "hash"
+    assert [e.extension for e in entries] == [613088]
+    assert [r["nombre_rol"] for r in roles] == ["ADMIN"]
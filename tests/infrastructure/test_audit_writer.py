@@ -0,0 +1,105 @@
+"""
+Unit tests for the background audit-log writer.
+"""
+import threading
+from sqlalchemy import create_engine, event, text
+from src.infrastructure.audit_writer import AUDIT_ROWS, AuditWriter
+from tests.conftest import HISTORIAL_DDL
+
+def _engine(tmp_path):
+    # The writer thread needs its own connection to the same database
+    engine = create_engine(f"sqlite:///{tmp_path / 'audit.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(HISTORIAL_DDL))
+    return engine
+
+def test_rows_are_written_in_batches(tmp_path):
+    """Submitted rows land in a few multi-row INSERTs, not one per answer."""
+    engine = _engine(tmp_path)
+    inserts = []
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().startswith("INSERT"):
+            inserts.append(executemany)
+
+    writer = AuditWriter(engine, batch_size=4, flush_ms=10_000)
+    try:
+        assert not writer.submit(None, "pregunta", "respuesta")
+        for i in range(10):
+            assert writer.submit("u-1", f"pregunta {i}", "respuesta", request_id=f"req-{i}")
+        assert writer.flush()
+
+        with engine.connect() as conn:
+            ids = conn.execute(text("SELECT id FROM historial_consultas ORDER BY id")).scalars().all()
+        assert ids == sorted(f"req-{i}" for i in range(10))
+        assert inserts == [True, True, True]
+    finally:
+        writer.close()
+        engine.dispose()
+
+def test_one_bad_row_does_not_drop_the_batch(tmp_path):
+    """A duplicate id is retried row by row; the rest of the batch is kept."""
+    engine = _engine(tmp_path)
+    writer = AuditWriter(engine, batch_size=3, flush_ms=10_000)
+    before = AUDIT_ROWS.labels(result="error").value
+    try:
+        for request_id in ("req-1", "req-1", "req-2"):
+            assert writer.submit("u-1", "pregunta", "respuesta", request_id=request_id)
+        assert writer.flush()
+
+        with engine.connect() as conn:
+            ids = conn.execute(text("SELECT id FROM historial_consultas ORDER BY id")).scalars().all()
+        assert ids == ["req-1", "req-2"]
+        assert AUDIT_ROWS.labels(result="error").value - before == 1
+    finally:
+        writer.close()
+        engine.dispose()
+
+def test_batch_is_retried_while_the_database_is_down(tmp_path):
+    """An OperationalError keeps the batch and retries it with backoff."""
+    import sqlite3
+    engine = _engine(tmp_path)
+    failures = [2]
+    @event.listens_for(engine, "before_cursor_execute")
+    def _down(conn, cursor, statement, *args):
+        if statement.lstrip().startswith("INSERT") and failures[0]:
+            failures[0] -= 1
+            raise sqlite3.OperationalError("database is locked")
+
+    writer = AuditWriter(engine, batch_size=2, flush_ms=10_000, retry_ms=1, retry_max_ms=5)
+    before = AUDIT_ROWS.labels(result="error").value
+    try:
+        assert writer.submit("u-1", "pregunta", "respuesta", request_id="req-1")
+        assert writer.submit("u-1", "pregunta", "respuesta", request_id="req-2")
+        assert writer.flush()
+
+        with engine.connect() as conn:
+            written = conn.execute(text("SELECT COUNT(*) FROM historial_consultas")).scalar()
+        assert written == 2 and failures == [0]
+        assert AUDIT_ROWS.labels(result="error").value == before
+    finally:
+        writer.close()
+        engine.dispose()
+
+def test_full_queue_drops_and_counts_rows(tmp_path):
+    """With the writer stuck, extra rows are dropped instead of blocking the chat."""
+    engine = _engine(tmp_path)
+    release = threading.Event()
+    @event.listens_for(engine, "before_cursor_execute")
+    def _stall(*args):
+        release.wait(5)
+
+    writer = AuditWriter(engine, max_queue=2, batch_size=1, put_timeout_ms=1)
+    before = AUDIT_ROWS.labels(result="overflow").value
+    try:
+        accepted = [writer.submit("u-1", f"pregunta {i}", "respuesta") for i in range(6)]
+        assert accepted.count(False) >= 3
+        assert AUDIT_ROWS.labels(result="overflow").value - before == accepted.count(False)
+    finally:
+        release.set()
+        writer.close()
+
+    with engine.connect() as conn:
+        written = conn.execute(text("SELECT COUNT(*) FROM historial_consultas")).scalar()
+    assert written == accepted.count(True)
+    engine.dispose()
@@ -0,0 +1,56 @@
+"""
+Unit tests for the diff-based directory importer.
+"""
+import pytest
+from src.infrastructure.admin_repository import AdminRepository
+from src.infrastructure.directory_import import clean_directory_rows, read_directory_file
+
+def test_clean_rows_skips_invalid_and_keeps_last_duplicate(tmp_path):
+    """Blank names and non-numeric extensions are dropped; repeats collapse."""
+    source = tmp_path / "anexos.csv"
+    source.write_text(
+        "﻿ANEXO,DISPLAY\n611425,\n613000,CENTRAL\nabc,OTRO\n613000, Central HCM \n",
+        encoding="utf-8",
+    )
+
+    entries, skipped = clean_directory_rows(read_directory_file(source))
+
+    assert entries == {613000: "Central HCM"}
+    assert skipped == 2
+
+def test_import_applies_only_the_differences(sample_directory, tmp_path):
+    """Unchanged contacts keep their id; renamed, new and missing ones are counted."""
+    source = tmp_path / "anexos.csv"
+    source.write_text(
+        "ANEXO,DISPLAY\n"
+        "613088,INFORMATICA JEFATURA\n"
+        "613089,INFORMATICA MESA DE AYUDA\n"
+        "613500,ONCOLOGIA\n"
+        "613501,\n",
+        encoding="utf-8",
+    )
+    repo = AdminRepository(sample_directory)
+
+    preview = repo.import_directorio(source, dry_run=True)
+    assert (preview.added, preview.changed, preview.removed) == (1, 1, 1)
+    assert len(repo.get_directorio()) == 3
+
+    result = repo.import_directorio(source)
+
+    assert (result.added, result.changed, result.removed, result.unchanged, result.skipped) == (1, 1, 1, 1, 1)
+    rows = {c["numero_anexo"]: (c["id"], c["nombre_referencia"]) for c in repo.get_directorio()}
+    assert rows[613088] == (1, "INFORMATICA JEFATURA")
+    assert rows[613089] == (2, "INFORMATICA MESA DE AYUDA")
+    assert rows[613500][1] == "ONCOLOGIA" and 613028 not in rows
+
+    again = repo.import_directorio(source)
+    assert (again.added, again.changed, again.removed, again.unchanged) == (0, 0, 0, 3)
+
+def test_import_refuses_an_empty_file(sample_directory, tmp_path):
+    """A file without valid rows must not wipe the directory."""
+    source = tmp_path / "anexos.csv"
+    source.write_text("ANEXO,DISPLAY\n611425,\n", encoding="utf-8")
+
+    with pytest.raises(ValueError):
+        AdminRepository(sample_directory).import_directorio(source)
+    assert len(AdminRepository(sample_directory).get_directorio()) == 3
@@ -0,0 +1,37 @@
+"""
+Unit tests for the prefix-cache scoring in OllamaClient.
+"""
+from unittest.mock import patch
+from src.infrastructure.llm_client import OllamaClient
+
+SYSTEM = "x" * 400  # 100 tokens at the stub's ~4 chars per token
+
+def _chat(client, content, prompt_eval_count):
+    response = {"message": {"content": "ok"}, "prompt_eval_count": prompt_eval_count}
+    with patch.object(OllamaClient, "is_available", return_value=True), \
+         patch("src.infrastructure.llm_client.ollama.chat", return_value=response):
+        client.chat(
+            [{"role": "system", "content": SYSTEM}, {"role": "user", "content": content}],
+            prefix="format",
+        )
+    return client.last_stats
+
+def test_long_suffix_after_a_cached_prefix_is_a_hit():
+    """A suffix longer than the prefix (DB rows to format) must still score a hit."""
+    client = OllamaClient()
+    client.prefixes["format"] = {"tokens": 100, "chars": len(SYSTEM), "ms_per_token": 2.0}
+
+    stats = _chat(client, "y" * 1200, prompt_eval_count=300)
+
+    assert stats["prefix_hit"] is True
+    assert stats["prefix_tokens_saved"] == 100
+
+def test_full_prompt_evaluation_is_a_miss():
+    """Evaluating prefix + suffix means the prefix was not in the KV cache."""
+    client = OllamaClient()
+    client.prefixes["format"] = {"tokens": 100, "chars": len(SYSTEM), "ms_per_token": 2.0}
+
+    stats = _chat(client, "y" * 1200, prompt_eval_count=400)
+
+    assert stats["prefix_hit"] is False
+    assert stats["prefix_tokens_saved"] == 0
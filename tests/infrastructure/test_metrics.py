@@ -0,0 +1,68 @@
+"""
+Unit tests for the in-process metrics registry and per-question traces.
+"""
+from src.infrastructure.metrics import MetricsRegistry, instrumented, REGISTRY
+from src.infrastructure.tracing import start_trace, span, current_request_id, recent_traces
+
+def test_render_prometheus_histogram_and_counter():
+    """Histogram buckets are cumulative and labels are rendered."""
+    registry = MetricsRegistry()
+    hist = registry.histogram("t_latency_seconds", "Latency.", ("stage",), buckets=(0.1, 1.0))
+    hist.observe(0.05, stage="exec")
+    hist.observe(0.5, stage="exec")
+    registry.counter("t_total", "Total.", ("outcome",)).inc(outcome="ok")
+
+    text = registry.render_prometheus()
+
+    assert '# TYPE t_latency_seconds histogram' in text
+    assert 't_latency_seconds_bucket{stage="exec",le="0.1"} 1' in text
+    assert 't_latency_seconds_bucket{stage="exec",le="1"} 2' in text
+    assert 't_latency_seconds_bucket{stage="exec",le="+Inf"} 2' in text
+    assert 't_latency_seconds_count{stage="exec"} 2' in text
+    assert 't_total{outcome="ok"} 1' in text
+
+def test_trace_propagates_request_id_to_spans():
+    """Spans opened inside a trace share its request_id and nest under it."""
+    with start_trace("question", request_id="req-1") as trace:
+        assert current_request_id() == "req-1"
+        with span("exec", rows=3):
+            pass
+
+    assert current_request_id() is None
+    assert recent_traces()[-1]["request_id"] == "req-1"
+    names = [s["name"] for s in trace.spans]
+    assert names == ["exec", "question"]
+    assert trace.spans[0]["parent_id"] == trace.spans[1]["span_id"]
+    assert trace.spans[0]["attributes"] == {"rows": 3}
+
+def test_instrumented_counts_errors():
+    """The class decorator times public methods and counts failures."""
+    @instrumented("dummy")
+    class DummyRepository:
+        def ok(self):
+            return 1
+        def fail(self):
+            raise ValueError("boom")
+
+    repo = DummyRepository()
+    assert repo.ok() == 1
+    try:
+        repo.fail()
+    except ValueError:
+        pass
+
+    errors = REGISTRY.family("nexa_repository_errors_total")
+    assert errors.labels(repository="dummy", operation="fail").value == 1
+    duration = REGISTRY.family("nexa_repository_operation_duration_seconds")
+    assert duration.labels(repository="dummy", operation="ok").count == 1
+
+def test_gauge_family_shortcuts():
+    """Unlabelled gauge families can be moved up and down directly."""
+    registry = MetricsRegistry()
+    gauge = registry.gauge("t_in_use", "In use.")
+    gauge.inc()
+    gauge.inc()
+    gauge.dec()
+
+    assert gauge.labels().value == 1
+    assert "t_in_use 1" in registry.render_prometheus()
@@ -2,7 +2,7 @@
 Unit tests for Infrastructure layer repositories.
 """
 import pytest
-from src.infrastructure.repositories import SQLPatientRepository, SQLHospitalAreaRepository
+from src.infrastructure.repositories import SQLPatientRepository, SQLHospitalAreaRepository, SQLDirectoryRepository
 from src.domain.entities import Patient, HospitalArea
 
 def test_get_patient_by_id(sample_patients):
@@ -60,3 +60,83 @@ def test_get_area_by_name(sample_areas):
     assert area is not None
     assert area.name == "Urgencias"
     assert area.wait_time_minutes == 20
+
+def test_search_directory_is_accent_and_case_insensitive(sample_directory):
+    """Test directory lookups used by the search_directory tool."""
+    repo = SQLDirectoryRepository(sample_directory)
+    
+    entries = repo.search_directory("Informática")
+    
+    assert [e.extension for e in entries] == [613088, 613089]
+
+def test_find_location(sample_directory):
+    """Test unit location lookups used by the find_location tool."""
+    repo = SQLDirectoryRepository(sample_directory)
+    
+    locations = repo.find_location("cafeteria")
+    
+    assert len(locations) == 1
+    assert locations[0].building_name == "Edificio B (Beta)"
+    assert locations[0].floor_level == -1
+
+def test_list_units_on_floor(sample_directory):
+    """Test listing units by floor, optionally filtered by building code."""
+    repo = SQLDirectoryRepository(sample_directory)
+    
+    units = repo.list_units_on_floor(-1, building="torre_b")
+    
+    assert [u.unit_name for u in units] == ["Auditorio", "Cafetería"]
+    assert repo.list_units_on_floor(5) == []
+
+def test_login_record_is_one_query_and_unknown_emails_are_cached(in_memory_db):
+    """User, role and hash come from one statement; unknown emails skip the DB."""
+    from sqlalchemy import event
+    from src.infrastructure.models import RoleModel, UserModel
+    from src.infrastructure.repositories import SQLUserRepository, forget_unknown_email
+
+    with in_memory_db.get_session() as session:
+        session.add_all([
+            RoleModel(id=1, nombre_rol="ADMIN", descripcion="Administrador"),
+            UserModel(id="u-1", rut="1-9", nombre_completo="Ana Admin", email="ana@nexa.ai",
+                      password_hash="hash", rol_id=1, activo=True),
+        ])
+
+    statements = []
+    @event.listens_for(in_memory_db.engine, "before_cursor_execute")
+    def _count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    repo = SQLUserRepository(in_memory_db)
+    forget_unknown_email()
+    try:
+        user, password_hash = repo.get_login_record("ana@nexa.ai")
+        assert len(statements) == 1
+        assert user.role.name == "ADMIN"
+        assert password_hash == "hash"
+
+        statements.clear()
+        assert repo.get_login_record("nadie@nexa.ai") is None
+        assert repo.get_login_record("nadie@nexa.ai") is None
+        assert len(statements) == 1
+
+        forget_unknown_email("nadie@nexa.ai")
+        assert repo.get_login_record("nadie@nexa.ai") is None
+        assert len(statements) == 2
+    finally:
+        event.remove(in_memory_db.engine, "before_cursor_execute", _count)
+        forget_unknown_email()
+
+def test_unknown_email_cache_is_bounded(in_memory_db, monkeypatch):
+    """Past LOGIN_NEGATIVE_MAX the oldest unknown emails are evicted."""
+    from src.infrastructure import repositories
+    from src.infrastructure.repositories import SQLUserRepository, forget_unknown_email
+
+    monkeypatch.setattr(repositories, "LOGIN_NEGATIVE_MAX", 2)
+    repo = SQLUserRepository(in_memory_db)
+    forget_unknown_email()
+    try:
+        for email in ("a@nexa.ai", "b@nexa.ai", "c@nexa.ai"):
+            assert repo.get_login_record(email) is None
+        assert list(repositories._unknown_emails) == ["b@nexa.ai", "c@nexa.ai"]
+    finally:
+        forget_unknown_email()
@@ -0,0 +1,80 @@
+"""
+Unit tests for password hashing and login throttling.
+"""
+import pytest
+from src.application.use_cases import AuthUseCase
+from src.infrastructure import security
+from src.infrastructure.exceptions import LoginThrottledError
+from src.infrastructure.models import RoleModel, UserModel
+from src.infrastructure.security import LoginThrottle, hash_password, needs_rehash, verify_password
+
+def test_hash_and_verify_run_in_the_worker_pool():
+    """Hashes made off-thread verify and carry the requested cost."""
+    hashed = hash_password("secreto", rounds=4)
+
+    assert verify_password("secreto", hashed)
+    assert not verify_password("otro", hashed)
+    assert not needs_rehash(hashed, rounds=4)
+    assert needs_rehash(hashed, rounds=12)
+
+def test_throttle_locks_account_and_ip():
+    """Too many failures lock the account; a success clears it."""
+    now = [0.0]
+    throttle = LoginThrottle(max_account_failures=3, max_ip_failures=5,
+                             window_s=60, lockout_s=30, clock=lambda: now[0])
+
+    for _ in range(3):
+        throttle.check("ana@nexa.ai", "10.0.0.1")
+        throttle.record_failure("ana@nexa.ai", "10.0.0.1")
+    with pytest.raises(LoginThrottledError) as exc:
+        throttle.check("ANA@nexa.ai")
+    assert exc.value.scope == "account"
+
+    # Otra cuenta desde la misma IP sigue entrando hasta el límite de la IP
+    throttle.check("bea@nexa.ai", "10.0.0.1")
+    throttle.record_failure("bea@nexa.ai", "10.0.0.1")
+    throttle.record_failure("bea@nexa.ai", "10.0.0.1")
+    with pytest.raises(LoginThrottledError) as exc:
+        throttle.check("carla@nexa.ai", "10.0.0.1")
+    assert exc.value.scope == "ip"
+
+    now[0] = 31.0
+    throttle.check("ana@nexa.ai", "10.0.0.1")
+    throttle.record_failure("ana@nexa.ai")
+    throttle.record_success("ana@nexa.ai")
+    throttle.record_failure("ana@nexa.ai")
+    throttle.record_failure("ana@nexa.ai")
+    throttle.check("ana@nexa.ai")
+
+def test_throttle_forgets_expired_and_oldest_keys():
+    """A sweep of invented emails does not grow the throttle without limit."""
+    now = [0.0]
+    throttle = LoginThrottle(max_account_failures=3, max_ip_failures=100,
+                             window_s=60, lockout_s=30, max_keys=3, clock=lambda: now[0])
+
+    for i in range(5):
+        throttle.record_failure(f"user{i}@nexa.ai")
+    assert [key for _, key in throttle._failures] == ["user2@nexa.ai", "user3@nexa.ai", "user4@nexa.ai"]
+
+    now[0] = 61.0
+    throttle.record_failure("nueva@nexa.ai", "10.0.0.9")
+    assert set(throttle._failures) == {("account", "nueva@nexa.ai"), ("ip", "10.0.0.9")}
+
+def test_login_rehashes_when_cost_changes(in_memory_db, monkeypatch):
+    """A successful login upgrades a hash made with an older cost factor."""
+    with in_memory_db.get_session() as session:
+        session.add_all([
+            RoleModel(id=1, nombre_rol="ADMIN", descripcion="Administrador"),
+            UserModel(id="u-1", rut="1-9", nombre_completo="Ana Admin", email="ana@nexa.ai",
+                      password_hash=hash_password("secreto", rounds=4), rol_id=1, activo=True),
+        ])
+    monkeypatch.setattr(security, "BCRYPT_ROUNDS", 5)
+    auth = AuthUseCase("sqlite:///:memory:", throttle=LoginThrottle())
+
+    assert auth.login("ana@nexa.ai", "incorrecta") is None
+    user = auth.login("ana@nexa.ai", "secreto", client_ip="10.0.0.1")
+
+    assert user.full_name == "Ana Admin"
+    stored = auth.user_repo.get_password_hash("u-1")
+    assert not needs_rehash(stored)
+    assert verify_password("secreto", stored)
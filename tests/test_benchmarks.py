@@ -0,0 +1,76 @@
+"""
+Smoke test of the offline benchmark harness (stub Ollama + seeded SQLite).
+"""
+import pytest
+from benchmarks.run_benchmark import run_benchmark, percentile
+from benchmarks.seed import seed_database, register_sqlite_unaccent
+from benchmarks.stub_ollama import StubOllamaServer, point_ollama_at
+
+@pytest.fixture
+def stub_ollama(monkeypatch):
+    import ollama
+    monkeypatch.delenv("OLLAMA_HOST", raising=False)  # restored on teardown
+    previous = ollama._client._client.base_url
+    with StubOllamaServer() as stub:
+        point_ollama_at(stub.url)
+        yield stub
+    ollama._client._client.base_url = previous
+
+def test_percentile_interpolates():
+    assert percentile([1, 2, 3, 4], 50) == 2.5
+    assert percentile([5], 99) == 5
+    assert percentile([], 50) is None
+
+def test_benchmark_runs_end_to_end(tmp_path, stub_ollama):
+    """Every question reaches the seeded database and the report has all stages."""
+    db_url = f"sqlite:///{tmp_path / 'bench.sqlite'}"
+    assert seed_database(db_url) > 500
+
+    report = run_benchmark(db_url, concurrency=(1, 2), requests=7, stub=stub_ollama)
+
+    assert [lvl["concurrency"] for lvl in report["levels"]] == [1, 2]
+    for level in report["levels"]:
+        assert level["requests"] == 7
+        assert level["errors"] == []
+        assert level["outcomes"] == {"ok": 5, "empty": 2}
+        for stage in ("health", "sql_gen", "exec", "format", "total"):
+            assert level["stages_ms"][stage]["p95"] is not None
+    assert report["meta"]["stub"]["requests"]["chat"] > 0
+    # The fixed system prompts stay cached in the stub's slots
+    assert report["levels"][0]["prefix_cache"]["sql_gen"]["hit_rate"] == 1.0
+    assert report["levels"][0]["prefix_cache"]["format"]["tokens_saved"] > 0
+
+def test_replay_reports_latency_and_drift(tmp_path, stub_ollama):
+    """Stored rows are replayed in order and compared to the stored answer."""
+    from sqlalchemy import create_engine, text
+    from src.application.rag_agent import RAGAgent
+    from src.infrastructure.database import get_engine
+    from benchmarks.replay import replay, stream_history
+
+    db_url = f"sqlite:///{tmp_path / 'replay.sqlite'}"
+    seed_database(db_url)
+    register_sqlite_unaccent(get_engine(db_url))
+    engine = create_engine(db_url)
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT INTO historial_consultas (pregunta, respuesta, fecha) VALUES (:p, :r, :f)"),
+            [
+                {"p": "Necesito el anexo de farmacia", "r": "Farmacia Central: anexo 613028.",
+                 "f": "2025-03-01 10:00:00"},
+                {"p": "¿Dónde está la cafetería?", "r": "No sé.",
+                 "f": "2025-03-01 10:00:01"},
+            ],
+        )
+
+    rows = list(stream_history(engine, batch_size=1))
+    assert [r["pregunta"] for r in rows][0] == "Necesito el anexo de farmacia"
+
+    report = replay(iter(rows), lambda: RAGAgent(database_uri=db_url), speedup=10)
+    engine.dispose()
+
+    assert report["requests"] == 2
+    assert report["drift"]["exact"] == 1
+    assert report["drift"]["drifted"] == 1
+    assert report["drift"]["worst"][0]["respuesta"] == "No sé."
+    # The second question is scheduled 0.1 s after the first
+    assert report["wall_s"] >= 0.1
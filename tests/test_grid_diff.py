@@ -0,0 +1,44 @@
+"""
+Unit tests for the admin grid change detection.
+"""
+import numpy as np
+import pandas as pd
+from src.ui.grid_diff import changed_rows
+
+def _frames():
+    original = pd.DataFrame({
+        "Seleccionar": [False, False, False, False],
+        "id": [1, 2, 3, 4],
+        "numero_anexo": [613088, 613089, 613028, 613500],
+        "nombre_referencia": ["INFORMATICA", "SOPORTE", None, "ONCOLOGIA"],
+        "tipo": [np.nan, "A", "B", None],
+    })
+    return original, original.copy()
+
+def test_only_changed_rows_and_columns_are_returned():
+    """Row 2 changes its name, row 4 its extension; the checkbox is ignored."""
+    original, edited = _frames()
+    edited.loc[1, "nombre_referencia"] = "SOPORTE TI"
+    edited.loc[3, "numero_anexo"] = 613501
+    edited.loc[0, "Seleccionar"] = True
+
+    changes = changed_rows(original, edited)
+
+    assert changes == [
+        (1, {"id": 2, "nombre_referencia": "SOPORTE TI"}),
+        (3, {"id": 4, "numero_anexo": 613501}),
+    ]
+    assert changed_rows(original, edited, minimal=False)[0][1]["numero_anexo"] == 613089
+
+def test_missing_values_and_numeric_types_compare_equal():
+    """NaN/None and int/float round-trips from the editor are not changes."""
+    original, edited = _frames()
+    edited["numero_anexo"] = edited["numero_anexo"].astype(float)
+    edited.loc[0, "tipo"] = None
+    edited.loc[3, "tipo"] = np.nan
+    edited.loc[2, "nombre_referencia"] = np.nan
+
+    assert changed_rows(original, edited) == []
+
+    edited.loc[2, "nombre_referencia"] = "FARMACIA"
+    assert changed_rows(original, edited) == [(2, {"id": 3, "nombre_referencia": "FARMACIA"})]
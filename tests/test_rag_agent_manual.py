@@ -7,21 +7,19 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from src.application.rag_agent import RAGAgent
+from src.application.follow_up import detect_follow_up
+from src.domain.entities import DirectoryEntry
 
 class TestRAGAgentManual(unittest.TestCase):
     
     @patch('src.application.rag_agent.SQLDatabase')
-    @patch('src.application.rag_agent.OllamaLLM')
     @patch('src.application.rag_agent.OllamaClient')
-    def test_get_answer_workflow(self, mock_client_cls, mock_llm_cls, mock_db_cls):
+    def test_get_answer_workflow(self, mock_client_cls, mock_db_cls):
         # Setup Mocks
         mock_db = MagicMock()
-        mock_db_cls.from_uri.return_value = mock_db
+        mock_db_cls.return_value = mock_db
         mock_db.get_table_info.return_value = "SCHEMA_INFO"
         
-        mock_llm = MagicMock()
-        mock_llm_cls.return_value = mock_llm
-        
         mock_client = MagicMock()
         mock_client_cls.return_value = mock_client
         mock_client.is_available.return_value = True
@@ -30,11 +28,10 @@ class TestRAGAgentManual(unittest.TestCase):
         agent = RAGAgent()
         
         # --- TEST CHANGE 1: Empty Result from DB ---
-        # Mock LLM generating SQL
-        mock_llm.invoke.side_effect = [
-            "```sql\nSELECT * FROM table\n```", # 1st call: Generate SQL
-             # Expect NO 2nd call to LLM if DB returns empty
-        ]
+        # Mock LLM emitting a structured intent (JSON) instead of free SQL
+        mock_client.chat.return_value = (
+            '{"table": "directorio_telefonico", "term": "nadie"}'
+        )
         
         # Mock DB execution returning empty string
         mock_db.run.return_value = "" 
@@ -45,32 +42,165 @@ class TestRAGAgentManual(unittest.TestCase):
         print(f"Result: {result}")
         
         self.assertIn("No encontré información", result['answer'])
-        self.assertEqual(result['raw_data'], "") # Raw string from DB is empty
-        # Actually in the code: if not db_result... result_package["answer"] = ...
-        # logic: if not db_result or db_result == "" ...
+        self.assertEqual(result['raw_data'], "[]")
+        # Expect NO formatting call to the LLM if DB returns empty
+        self.assertEqual(mock_client.chat.call_count, 1)
+        self.assertNotIn("format", result['timings'])
+        for stage in ("health", "sql_gen", "exec", "parse", "total"):
+            self.assertIn(stage, result['timings'])
+        # The intent prompt carries no schema: no reflection per request and no
+        # near-zero "schema" stage stored in duraciones_ms
+        mock_db.get_table_info.assert_not_called()
+        self.assertNotIn("schema", result['timings'])
+        
+        # Structured output constraints are sent to Ollama
+        args, kwargs = mock_client.chat.call_args
+        self.assertIsInstance(kwargs["format"], dict)
+        self.assertEqual(kwargs["temperature"], 0)
+        self.assertIsNotNone(kwargs["num_predict"])
+        
+        # Fixed instructions go in the system message; only the question varies
+        system, user = args[0]
+        self.assertEqual(system["content"], agent.prompt_sql_system)
+        self.assertEqual(user["content"], "Question: Pregunta vacia")
+        self.assertEqual(kwargs["prefix"], "sql_intent")
+        self.assertIn("warm", result['timings'])
         
         # --- TEST CASE 2: Valid Result from DB ---
-        
-        # Reset side effects
-        mock_llm.invoke.side_effect = [
-            "SELECT * FROM farmacia",   # 1st call: SQL
+        mock_client.chat.side_effect = [
+            '{"table": "vista_ubicaciones_maestra", "term": "farmacia"}',  # 1st call: intent
             "La farmacia está en el piso 1." # 2nd call: Final Answer
         ]
+        mock_client.last_stats = {"prompt_eval_count": 42, "eval_count": 12}
         
-        mock_db.run.return_value = "[('Farmacia', 'Piso 1')]"
+        mock_db.run.return_value = "[('Farmacia', 'Piso 1', 'Edificio B')]"
         
         result2 = agent.get_answer("Donde esta la farmacia")
         
         print("\n--- TEST 2: Valid DB Result ---")
         print(f"Result: {result2}")
         
-        self.assertEqual(result2['sql'], "SELECT * FROM farmacia")
-        self.assertEqual(result2['raw_data'], "[('Farmacia', 'Piso 1')]")
+        self.assertIn("FROM vista_ubicaciones_maestra", result2['sql'])
+        self.assertIn("'%farmacia%'", result2['sql'])
+        self.assertIn("LIMIT 5", result2['sql'])
+        self.assertEqual(result2['raw_data'], "• Farmacia está en Edificio B, Piso 1")
         self.assertEqual(result2['answer'], "La farmacia está en el piso 1.")
+        self.assertIn("format", result2['timings'])
+        self.assertEqual(result2['llm_stats']['format']['eval_count'], 12)
+        
+        # Prefixes are warmed once per agent, not per question
+        self.assertEqual(mock_client.warm_prefix.call_count, 2)
+        self.assertNotIn("warm", result2['timings'])
+        
+        # --- TEST CASE 3: Free-text fallback still goes through clean_sql ---
+        mock_client.chat.side_effect = None
+        mock_client.chat.return_value = "<SQL>SELECT * FROM directorio_telefonico WHERE x</SQL>"
+        mock_db.run.return_value = ""
+        
+        result3 = agent.get_answer("anexo informatica")
+        
+        self.assertEqual(
+            result3['sql'],
+            "SELECT nombre_referencia, numero_anexo FROM directorio_telefonico WHERE x"
+        )
+
+    @patch('src.application.rag_agent.SQLDatabase')
+    @patch('src.application.rag_agent.OllamaClient')
+    def test_build_query_rejects_unknown_tables(self, mock_client_cls, mock_db_cls):
+        agent = RAGAgent()
+        
+        self.assertIsNone(agent.build_query('{"table": "usuarios", "term": "admin"}'))
+        self.assertIsNone(agent.build_query('{"table": "directorio_telefonico", "term": "  "}'))
+        self.assertIsNone(agent.build_query('not json'))
+        
+        query = agent.build_query('{"table": "directorio_telefonico", "term": "50%_off"}')
+        self.assertIn("'%50\\%\\_off%'", agent.render_sql(query))
+        
+    @patch('src.application.rag_agent.SQLDatabase')
+    @patch('src.application.rag_agent.OllamaClient')
+    def test_tools_mode_dispatches_to_repository(self, mock_client_cls, mock_db_cls):
+        mock_client = mock_client_cls.return_value
+        mock_client.is_available.return_value = True
+        mock_client.chat.return_value = "Informática está en el anexo 613088."
+        repo = MagicMock()
+        repo.search_directory.return_value = [DirectoryEntry(name="INFORMATICA JEFATURA", extension=613088)]
+        
+        agent = RAGAgent(mode="tools", directory_repo=repo)
         
-        # Verify calls
-        # 1. get_table_info (called twice, once per test/instantiation? No, instantiated once)
-        # We reused 'agent' but 'invoke' side_effect is continuous.
+        mock_client.chat_with_tools.return_value = [
+            {"name": "search_directory", "arguments": {"name": "informatica"}}
+        ]
+        result = agent.get_answer("¿Cuál es el anexo de informática?")
+        
+        repo.search_directory.assert_called_once_with("informatica", limit=5)
+        # Only the formatting step generates text; no SQL generation in this mode
+        self.assertEqual(mock_client.chat.call_count, 1)
+        self.assertNotIn("format", mock_client.chat.call_args.kwargs)
+        self.assertIn("tool_call", result['timings'])
+        mock_db_cls.return_value.run.assert_not_called()
+        self.assertEqual(result['sql'], "search_directory(name='informatica')")
+        self.assertEqual(result['raw_data'], "• INFORMATICA JEFATURA - anexo 613088")
+        self.assertEqual(result['answer'], "Informática está en el anexo 613088.")
+        
+        # Unknown tool / bad arguments never reach the database
+        mock_client.chat_with_tools.return_value = [
+            {"name": "list_units_on_floor", "arguments": {"floor_level": "tercero"}}
+        ]
+        result = agent.get_answer("¿Qué hay en el tercero?")
+        self.assertIn("No pude generar", result['answer'])
+        repo.list_units_on_floor.assert_not_called()
+
+    @patch('src.application.rag_agent.SQLDatabase')
+    @patch('src.application.rag_agent.OllamaClient')
+    def test_follow_up_reuses_last_entity(self, mock_client_cls, mock_db_cls):
+        mock_db = mock_db_cls.return_value
+        mock_client = mock_client_cls.return_value
+        mock_client.is_available.return_value = True
+        mock_client.chat.side_effect = [
+            '{"table": "vista_ubicaciones_maestra", "term": "farmacia"}',
+            "La farmacia está en el piso 1.",
+        ]
+        mock_db.run.return_value = "[('Farmacia', 'Piso 1', 'Edificio B')]"
         
+        agent = RAGAgent()
+        agent.get_answer("¿Dónde está la farmacia?")
+        self.assertEqual(mock_client.chat.call_count, 2)
+        
+        # Same attribute: answered from the cached rows, no LLM and no SQL
+        result = agent.get_answer("¿en qué piso?")
+        self.assertEqual(result['follow_up']['source'], "context")
+        self.assertEqual(result['answer'], "Sobre «farmacia»:\n• Farmacia está en Edificio B, Piso 1")
+        self.assertEqual(mock_db.run.call_count, 1)
+        
+        # Other attribute: one query for the same term, still no LLM
+        mock_db.run.return_value = "[('FARMACIA CENTRAL', 612345)]"
+        result = agent.get_answer("¿y su anexo?")
+        self.assertEqual(result['follow_up']['source'], "query")
+        self.assertIn("FROM directorio_telefonico", result['sql'])
+        self.assertIn("'%farmacia%'", result['sql'])
+        self.assertEqual(result['raw_data'], "• FARMACIA CENTRAL - anexo 612345")
+        self.assertEqual(mock_client.chat.call_count, 2)
+        mock_client.is_available.assert_called_once()
+        
+        # A question naming a new entity runs the full pipeline
+        mock_client.chat.side_effect = ['{"table": "directorio_telefonico", "term": "urgencia"}', "..."]
+        result = agent.get_answer("¿y el anexo de urgencia?")
+        self.assertIsNone(result['follow_up'])
+        self.assertEqual(mock_client.chat.call_count, 4)
+        
+        # Without context a follow-up also goes to the model
+        agent.reset_context()
+        mock_client.chat.side_effect = ['{"table": "directorio_telefonico", "term": "anexo"}', "..."]
+        result = agent.get_answer("¿y su anexo?")
+        self.assertIsNone(result['follow_up'])
+
+    def test_detect_follow_up(self):
+        self.assertEqual(detect_follow_up("¿Y su anexo?"), "directorio_telefonico")
+        self.assertEqual(detect_follow_up("¿en qué piso está?"), "vista_ubicaciones_maestra")
+        self.assertEqual(detect_follow_up("y dónde queda eso"), "vista_ubicaciones_maestra")
+        self.assertIsNone(detect_follow_up("¿cuál es el anexo de farmacia?"))
+        self.assertIsNone(detect_follow_up("¿dónde queda y cuál es su anexo?"))
+        self.assertIsNone(detect_follow_up("gracias"))
+
 if __name__ == '__main__':
     unittest.main()